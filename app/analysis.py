@@ -0,0 +1,138 @@
+# analysis.py
+from detector import analyze_video_chunk, get_video_total_frames
+
+# --- Configuration Parameters ---
+ANALYSIS_NUM_FRAMES = 30       # Default window analysed by /analyze_video
+ANALYSIS_MAX_FRAMES = 900      # Largest window the synchronous endpoint analyses; longer requests are clamped
+
+
+class AnalysisAccumulator:
+    """
+    Builds the analysis report from tracked frames: per-class detection counts,
+    unique track IDs and the longest uninterrupted streak per class.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.frames_analyzed = 0
+        # { class_name: { "all_ids": set(), "longest_tracking": {"track_id": 0, "frames": 0}, "current_streaks": {track_id: streak_len} } }
+        self.classes = {}
+
+    def add_frame(self, frame_detections):
+        """Adds the tracked detections of one frame, in frame order."""
+        self.frames_analyzed += 1
+        current_frame_track_ids = set()
+
+        for det in frame_detections:
+            class_name = det['class']
+            track_id = det['tracked_id']
+            self.counts[class_name] = self.counts.get(class_name, 0) + 1
+            if track_id is None:
+                continue
+            current_frame_track_ids.add(track_id)
+
+            # Initialize class in results if not present
+            if class_name not in self.classes:
+                self.classes[class_name] = {
+                    "all_ids": set(),
+                    "longest_tracking": {"track_id": 0, "frames": 0},
+                    "current_streaks": {}
+                }
+
+            class_data = self.classes[class_name]
+            class_data["all_ids"].add(track_id)
+
+            # Update current streak
+            class_data["current_streaks"][track_id] = class_data["current_streaks"].get(track_id, 0) + 1
+
+            # Check for new longest streak
+            if class_data["current_streaks"][track_id] > class_data["longest_tracking"]["frames"]:
+                class_data["longest_tracking"]["frames"] = class_data["current_streaks"][track_id]
+                class_data["longest_tracking"]["track_id"] = track_id
+
+        # Reset streaks for tracks that were not found in this frame
+        for class_data in self.classes.values():
+            lost_tracks = set(class_data["current_streaks"].keys()) - current_frame_track_ids
+            for track_id in lost_tracks:
+                class_data["current_streaks"][track_id] = 0
+
+    def report(self):
+        """Returns the per-class summary in the format the frontend displays."""
+        final_analysis = {}
+        for class_name, data in self.classes.items():
+            final_analysis[class_name] = {
+                "total_unique_birds": len(data["all_ids"]),
+                "total_detections": self.counts.get(class_name, 0),
+                "longest_tracking": {
+                    "track_id": int(data["longest_tracking"]["track_id"]),
+                    "frames": int(data["longest_tracking"]["frames"])
+                }
+            }
+        return final_analysis
+
+
+def analyze_video_range(video_path, start_frame, num_frames, model, average_wingspans_m, initial_tracking_state,
+                        decoder_pool=None, on_progress=None, cancel_event=None, detection_cache=None,
+                        motion_gate=None, detection_schedule=None, checkpoints=None, results=None):
+    """
+    Runs one detection + tracking pass over [start_frame, start_frame + num_frames)
+    (to the end of the video if num_frames is None)
+    with the shared model and a private snapshot of the tracking state, and
+    produces both the per-class counts and the unique-ID/longest-streak stats.
+    on_progress(frames_done, frames_total) is called after every frame and a set
+    cancel_event stops the pass early. Frames found in detection_cache skip
+    inference, as do static frames when a motion gate is given and frames
+    between scheduled detections when a detection schedule is given. A
+    checkpoints store is passed on to analyze_video_chunk, and every tracked
+    frame is recorded to a results store if given.
+    Returns (result, error_message).
+    """
+    total_frames = get_video_total_frames(video_path)
+    if total_frames is None:
+        return None, "Could not open video file."
+    start_frame = max(0, min(int(start_frame), total_frames - 1))
+    end_frame = total_frames if num_frames is None else min(start_frame + int(num_frames), total_frames)
+    frames_total = end_frame - start_frame
+    accumulator = AnalysisAccumulator()
+    # Track IDs are those of playback only for a full pass from an empty tracker.
+    canonical = (start_frame == 0 and len(initial_tracking_state) == 0 and motion_gate is None
+                 and detection_schedule is None)
+
+    def on_frame(frame_index, frame_detections):
+        accumulator.add_frame(frame_detections)
+        if results is not None:
+            results.record(video_path, frame_index, frame_detections, canonical=canonical)
+        if on_progress is not None:
+            on_progress(frame_index - start_frame + 1, frames_total)
+        return not (cancel_event is not None and cancel_event.is_set())
+
+    counts, _ = analyze_video_chunk(
+        video_path=video_path,
+        start_frame=start_frame,
+        num_frames=frames_total,
+        model=model,
+        average_wingspans_m=average_wingspans_m,
+        initial_tracking_state=initial_tracking_state,
+        decoder_pool=decoder_pool,
+        on_frame=on_frame,
+        detection_cache=detection_cache,
+        motion_gate=motion_gate,
+        detection_schedule=detection_schedule,
+        checkpoints=checkpoints
+    )
+    if "error" in counts:
+        return None, counts["error"]
+
+    result = {
+        "analysis": accumulator.report(),
+        "counts": counts,
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "frames_analyzed": accumulator.frames_analyzed,
+        "cancelled": bool(cancel_event is not None and cancel_event.is_set()),
+    }
+    if motion_gate is not None:
+        result["motion_gate"] = motion_gate.stats()
+    if detection_schedule is not None:
+        result["detection_schedule"] = detection_schedule.stats()
+    return result, None
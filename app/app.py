@@ -1,29 +1,84 @@
 import os
-import cv2
 import base64
+import time
 import uuid
-from flask import Flask, request, jsonify, render_template, session
+import json
+import functools
+from datetime import datetime
+import cv2
+from flask import Flask, Response, g, request, jsonify, render_template, send_file, session, stream_with_context
 from werkzeug.utils import secure_filename
 
 # Import the actual detector functions
 from detector import (
+    FRAME_IMAGE_FORMATS,
+    YOLO_MODEL_CONF_THRESHOLD,
+    YOLO_MODEL_IOU_THRESHOLD,
     analyze_video_chunk,
+    encode_frame,
+    load_model,
     load_model_and_wingspans,
+    load_wingspans,
+    new_tracking_state,
     process_video_frame_with_tracking,
+    read_video_frame,
 )
+from analysis import ANALYSIS_MAX_FRAMES, ANALYSIS_NUM_FRAMES, analyze_video_range
+from checkpoints import CHECKPOINT_INTERVAL, CheckpointStore
+from chunked_upload import UPLOAD_COMPLETE, UploadError, UploadManager
+from decoder_pool import DecoderPool
+from detection_cache import DetectionCache
+from detection_schedule import DETECT_EVERY_MAX_K, DetectionSchedule
+from inference_server import connect_inference_client
+from jobs import AnalysisJobQueue, QueueFullError
+from metrics import METRICS_ENABLED, end_trace, registry as metrics_registry, server_timing_header, span, start_trace
+from motion import MotionGate
+from parallel_analysis import PARALLEL_ANALYSIS_WORKERS, analyze_video_parallel
+from prefetch import PrefetchManager, decode_only
+from results_store import RESULTS_MAX_DETECTION_ROWS, ResultsStore
+from proxy import ProxyManager, proxy_frame_index
+from stream import LiveStream, StreamRegistry
+from tracking_store import TrackingStore
+from video_index import VIDEO_EXTENSIONS, VideoIndex
 
 # --- Flask App Initialization ---
 app = Flask(__name__, static_folder='static', template_folder='static')
 
-# --- In-memory cache for tracking state ---
-# This simple dictionary will hold the tracking state for each video session.
-# Key: video_filename, Value: tracking_state dictionary
-tracking_cache = {}
+# --- In-memory store for tracking state ---
+# One Tracker per (session, video), so viewers of the same file never share a
+# tracker. Requests on one state are serialized; states are evicted by
+# LRU, idle TTL and a total memory cap.
+tracking_store = TrackingStore(new_tracking_state)
 
 # --- Configuration ---
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 PERMANENT_VIDEO_FOLDER = os.path.join(APP_ROOT, 'videos')
 SESSION_UPLOAD_FOLDER = os.path.join(APP_ROOT, 'uploads')
+CACHE_FOLDER = os.path.join(APP_ROOT, 'cache')
+
+# --- Video metadata index ---
+# Frame count, fps, resolution, codec and keyframes per video, persisted and
+# keyed by path + mtime + size so listing videos does not open every file.
+video_index = VideoIndex(os.path.join(CACHE_FOLDER, 'video_index.sqlite3'))
+
+# --- Shared decoder pool ---
+# Keeps video captures open between /process_frame calls so that playing a
+# video frame by frame does not reopen and re-seek the file for every frame.
+decoder_pool = DecoderPool(keyframe_lookup=video_index.keyframes)
+
+# --- Scrubbing proxies ---
+# Low-resolution short-GOP (or all-intra) copies plus a thumbnail strip per
+# video, created in the background after upload (PROXY_ON_UPLOAD, default on)
+# or on request. Scrubbing and previews use the proxy; detection always reads
+# the original.
+PROXY_ON_UPLOAD = os.environ.get('PROXY_ON_UPLOAD', '1').lower() not in ('0', 'false', 'no')
+PREVIEW_JPEG_QUALITY = 75
+proxy_manager = ProxyManager(os.path.join(CACHE_FOLDER, 'proxies'))
+
+# --- Chunked uploads ---
+# Resumable uploads in raw chunks streamed straight to disk (see /uploads),
+# with the container probed while the file is still arriving.
+upload_manager = UploadManager(video_index)
 
 # Use a secret key for session management
 app.config['SECRET_KEY'] = os.urandom(24)
@@ -38,7 +93,260 @@ if not os.path.exists(SESSION_UPLOAD_FOLDER):
 MODEL_PATH = os.path.join(APP_ROOT, "weights/best.pt")
 WINGSPANS_FILE = os.path.join(APP_ROOT, "wingspans.txt")
 
-model, average_wingspans_m = load_model_and_wingspans(MODEL_PATH, WINGSPANS_FILE)
+# With INFERENCE_SERVER_ADDRESS set, the model lives in a separate inference
+# server process shared by all workers (see inference_server.py).
+INFERENCE_SERVER_ADDRESS = os.environ.get('INFERENCE_SERVER_ADDRESS')
+
+# CPU inference backend: 'torch' (default), or an exported 'onnx' / 'openvino'
+# model, INT8-quantized with INFERENCE_INT8=1 and the images and/or videos in
+# INFERENCE_CALIBRATION. Exports are cached under cache/backends.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')
+INFERENCE_INT8 = os.environ.get('INFERENCE_INT8', '').lower() in ('1', 'true', 'yes')
+INFERENCE_CALIBRATION = os.environ.get('INFERENCE_CALIBRATION', os.path.join(APP_ROOT, 'videos'))
+
+if INFERENCE_SERVER_ADDRESS:
+    model = connect_inference_client(INFERENCE_SERVER_ADDRESS)
+    average_wingspans_m = load_wingspans(WINGSPANS_FILE)
+else:
+    model, average_wingspans_m = load_model_and_wingspans(MODEL_PATH, WINGSPANS_FILE, INFERENCE_BACKEND,
+                                                          INFERENCE_INT8, INFERENCE_CALIBRATION)
+
+# --- Persistent detection cache ---
+# Raw model detections per frame, keyed by video content, model weights, backend
+# and thresholds, so revisiting a frame (seeking back, re-running an analysis)
+# skips inference. Swarm logic and tracking are always re-applied.
+detection_cache = None
+if model is not None and os.path.exists(MODEL_PATH):
+    detection_cache = DetectionCache(os.path.join(CACHE_FOLDER, 'detections.sqlite3'), MODEL_PATH,
+                                     YOLO_MODEL_CONF_THRESHOLD, YOLO_MODEL_IOU_THRESHOLD,
+                                     backend=getattr(model, 'inference_backend', 'torch'))
+
+# Identifies the model's results (weights, backend, thresholds) in stores shared across runs.
+MODEL_NAMESPACE = detection_cache.model_key if detection_cache is not None else \
+    f"{INFERENCE_SERVER_ADDRESS or MODEL_PATH}:{YOLO_MODEL_CONF_THRESHOLD}:{YOLO_MODEL_IOU_THRESHOLD}"
+
+# --- Detection results store ---
+# Tracked detections of every processed frame (playback and analyses) go to an
+# indexed SQLite store with per-class totals, unique tracks, per-minute
+# timelines and density grids kept up to date, queried through /results/*.
+# RESULTS_STORE=0 turns recording off.
+RESULTS_STORE = os.environ.get('RESULTS_STORE', '1').lower() not in ('0', 'false', 'no')
+results_store = None
+if RESULTS_STORE:
+    results_store = ResultsStore(os.path.join(CACHE_FOLDER, 'results.sqlite3'), model_key=MODEL_NAMESPACE,
+                                 metadata_lookup=video_index.get)
+
+# --- Motion gating ---
+# Skip inference on frames without motion and detect small motion regions on a
+# crop. Off by default; requests can turn it on with "motion_gate": true.
+MOTION_GATE_DEFAULT = os.environ.get('MOTION_GATE', '').lower() in ('1', 'true', 'yes')
+
+# --- Detect every k frames ---
+# Run the model only on every k-th frame of a sequential pass and let the
+# tracker predict the frames in between. "auto" adapts k to scene motion.
+# Off by default; requests can set "detect_every": k (at most
+# DETECT_EVERY_MAX_K, larger values are rejected) or "auto".
+DETECT_EVERY_DEFAULT = os.environ.get('DETECT_EVERY') or None
+
+
+def parse_detect_every(value):
+    """
+    Validates a detect_every value: None, 1 or 0 (every frame), a positive
+    k up to DETECT_EVERY_MAX_K, or 'auto'. Returns (k, error_message); k is
+    None for every frame and 'auto' for adaptive mode.
+    """
+    if value is None or value == 'auto':
+        return value, None
+    try:
+        k = int(value)
+    except (TypeError, ValueError):
+        return None, "detect_every must be a positive integer or 'auto'."
+    if k < 0:
+        return None, "detect_every must be a positive integer or 'auto'."
+    if k > DETECT_EVERY_MAX_K:
+        # Longer gaps would outlast the tracker's look-back window.
+        return None, f"detect_every must be at most {DETECT_EVERY_MAX_K} (or 'auto')."
+    return (k if k > 1 else None), None
+
+
+def parse_int_field(value, name, minimum, maximum=None, required=False):
+    """
+    Validates an integer request field. Returns (value, error_message); value
+    is None if an optional field was not given.
+    """
+    if value is None and not required:
+        return None, None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None, f"{name} must be an integer."
+    if maximum is not None and not minimum <= number <= maximum:
+        return None, f"{name} must be between {minimum} and {maximum}."
+    if number < minimum:
+        return None, f"{name} must be at least {minimum}."
+    return number, None
+
+
+def new_detection_schedule(detect_every):
+    """A DetectionSchedule for a value returned by parse_detect_every, or None."""
+    if detect_every is None:
+        return None
+    return DetectionSchedule(k=None if detect_every == 'auto' else detect_every)
+
+# --- Tracker checkpoints ---
+# Snapshots of the tracker every TRACKER_CHECKPOINT_INTERVAL frames of a full
+# pass from frame 0, written by playback and by analysis jobs from frame 0.
+# A seek restores the nearest checkpoint and replays the frames in between
+# (from the detection cache where possible), so the viewer sees the same
+# track IDs as in an uninterrupted pass. Seeks further than
+# TRACKER_REPLAY_MAX_FRAMES from any checkpoint keep the current tracker.
+# TRACKER_CHECKPOINTS=0 turns this off.
+TRACKER_CHECKPOINTS = os.environ.get('TRACKER_CHECKPOINTS', '1').lower() not in ('0', 'false', 'no')
+TRACKER_CHECKPOINT_INTERVAL = int(os.environ.get('TRACKER_CHECKPOINT_INTERVAL', CHECKPOINT_INTERVAL))
+TRACKER_REPLAY_MAX_FRAMES = int(os.environ.get('TRACKER_REPLAY_MAX_FRAMES', 4 * TRACKER_CHECKPOINT_INTERVAL))
+tracker_checkpoints = None
+if TRACKER_CHECKPOINTS:
+    tracker_checkpoints = CheckpointStore(os.path.join(CACHE_FOLDER, 'checkpoints'), namespace=MODEL_NAMESPACE,
+                                          interval=TRACKER_CHECKPOINT_INTERVAL)
+
+
+def restore_tracker(tracking_entry, video_path, frame_index):
+    """
+    Brings tracking_entry to the state of an uninterrupted pass just before
+    frame_index, by replaying the frames from the closest of its own state,
+    the nearest checkpoint and frame 0. Returns {'checkpoint_frame',
+    'replayed_frames'} (checkpoint_frame is None when no checkpoint was used),
+    or None if the entry was left as it is.
+    """
+    start_frame, state, checkpoint_frame = 0, None, None
+    if tracking_entry.canonical and tracking_entry.next_frame <= frame_index:
+        start_frame, state = tracking_entry.next_frame, tracking_entry.state
+    nearest_frame, nearest_state = tracker_checkpoints.nearest(video_path, frame_index, new_tracking_state)
+    if nearest_frame is not None and (state is None or nearest_frame > start_frame):
+        start_frame, state, checkpoint_frame = nearest_frame, nearest_state, nearest_frame
+    if state is None:
+        state = new_tracking_state()
+    if frame_index - start_frame > TRACKER_REPLAY_MAX_FRAMES:
+        return None
+
+    if frame_index > start_frame:
+        with span('tracker_replay'):
+            counts, state = analyze_video_chunk(
+                video_path, start_frame, frame_index - start_frame, model, average_wingspans_m, state,
+                decoder_pool=decoder_pool, detection_cache=detection_cache, checkpoints=tracker_checkpoints
+            )
+        if 'error' in counts:
+            return None
+    tracking_entry.state = state
+    tracking_entry.next_frame = frame_index
+    tracking_entry.canonical = True
+    return {'checkpoint_frame': checkpoint_frame, 'replayed_frames': frame_index - start_frame}
+
+# --- Read-ahead for sequential playback ---
+prefetch_manager = PrefetchManager(model, decoder_pool, detection_cache=detection_cache)
+
+# --- Background analysis jobs ---
+analysis_jobs = AnalysisJobQueue()
+SSE_KEEPALIVE_S = 15
+
+# --- Parallel analysis ---
+# Jobs submitted with "parallel": true (or a worker count) split the range into
+# overlapping segments analysed on a process pool, each worker with its own
+# model, and stitch the tracks afterwards. PARALLEL_ANALYSIS=1 makes it the
+# default for jobs.
+PARALLEL_ANALYSIS_DEFAULT = os.environ.get('PARALLEL_ANALYSIS', '').lower() in ('1', 'true', 'yes')
+
+
+def parallel_model_factory():
+    """Picklable factory that gives each analysis worker process its own model."""
+    if INFERENCE_SERVER_ADDRESS:
+        return functools.partial(connect_inference_client, INFERENCE_SERVER_ADDRESS)
+    return functools.partial(load_model, MODEL_PATH, INFERENCE_BACKEND, INFERENCE_INT8, INFERENCE_CALIBRATION)
+
+
+def parallel_detection_cache_factory():
+    """Picklable factory for a worker's handle on the shared detection cache, or None."""
+    if detection_cache is None:
+        return None
+    return functools.partial(DetectionCache, os.path.join(CACHE_FOLDER, 'detections.sqlite3'), MODEL_PATH,
+                             YOLO_MODEL_CONF_THRESHOLD, YOLO_MODEL_IOU_THRESHOLD,
+                             backend=getattr(model, 'inference_backend', 'torch'))
+
+
+def parse_parallel(value):
+    """
+    Validates a parallel value: false/0 (sequential), true (PARALLEL_ANALYSIS_WORKERS
+    processes) or a worker count. Returns (workers or None, error_message).
+    """
+    if value is None or value is False:
+        return None, None
+    if value is True:
+        return PARALLEL_ANALYSIS_WORKERS, None
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        return None, "parallel must be true, false or a number of worker processes."
+    if workers < 0:
+        return None, "parallel must be true, false or a number of worker processes."
+    return workers or None, None
+
+# --- Live streams ---
+# Camera feeds viewers may start, configured as STREAM_SOURCES="name=url;name2=url".
+# Clients pick a source by name and never pass a URL themselves.
+STREAM_SOURCES = dict(
+    entry.split('=', 1) for entry in os.environ.get('STREAM_SOURCES', '').split(';') if '=' in entry
+)
+STREAM_LATEST_TIMEOUT_S = 10
+live_streams = StreamRegistry()
+
+# --- Metrics ---
+# Per-stage and per-route latency histograms plus the components' counters,
+# scraped in Prometheus format from /metrics. A request sent with the
+# TRACE_HEADER header gets its own stage breakdown back as Server-Timing.
+TRACE_HEADER = 'X-Trace'
+metrics_registry.register_stats('decoder_pool', decoder_pool.stats)
+metrics_registry.register_stats('prefetch', prefetch_manager.stats)
+metrics_registry.register_stats('tracking_store', tracking_store.stats)
+metrics_registry.register_stats('analysis_jobs', analysis_jobs.stats)
+metrics_registry.register_stats('streams', live_streams.stats)
+metrics_registry.register_stats('proxies', proxy_manager.stats)
+metrics_registry.register_stats('uploads', upload_manager.stats)
+if results_store is not None:
+    metrics_registry.register_stats('results_store', results_store.stats)
+if tracker_checkpoints is not None:
+    metrics_registry.register_stats('tracker_checkpoints', tracker_checkpoints.stats)
+if detection_cache is not None:
+    metrics_registry.register_stats('detection_cache', detection_cache.stats)
+if INFERENCE_SERVER_ADDRESS and model is not None:
+    metrics_registry.register_stats('inference_server', model.stats)
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    if request.headers.get(TRACE_HEADER):
+        g.trace_token = start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    # Streamed responses (SSE, MJPEG) only get here once their headers are ready.
+    if METRICS_ENABLED and not response.is_streamed:
+        metrics_registry.observe(
+            'request_seconds', elapsed, 'Time to build a response per route.',
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method, status=response.status_code
+        )
+    trace_token = g.pop('trace_token', None)
+    if trace_token is not None:
+        response.headers['Server-Timing'] = server_timing_header(end_trace(trace_token), elapsed)
+    return response
+
+@app.teardown_request
+def end_request_trace(exception):
+    # Requests that failed before after_request still have to leave the trace.
+    trace_token = g.pop('trace_token', None)
+    if trace_token is not None:
+        end_trace(trace_token)
 
 # --- Routes ---
 
@@ -48,6 +356,13 @@ def ensure_session_id():
         session['session_id'] = str(uuid.uuid4())
     return session['session_id']
 
+def resolve_video_path(video_filename, is_session_file):
+    """Returns the on-disk path of a permanent or session-uploaded video."""
+    if is_session_file:
+        session_id = ensure_session_id()
+        return os.path.join(SESSION_UPLOAD_FOLDER, session_id, secure_filename(video_filename))
+    return os.path.join(PERMANENT_VIDEO_FOLDER, secure_filename(video_filename))
+
 @app.route('/')
 def index():
     """Serves the main HTML page."""
@@ -57,7 +372,8 @@ def index():
 def list_videos():
     """
     Scans permanent and session-specific folders for videos and returns a
-    JSON list containing the filename and total frame count for each video.
+    JSON list containing the filename, total frame count, fps and resolution
+    for each video, read from the metadata index.
     """
     video_files = {}
     session_id = ensure_session_id()
@@ -67,20 +383,23 @@ def list_videos():
         if not os.path.exists(directory):
             return
         for filename in os.listdir(directory):
-            if filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
+            if filename.lower().endswith(VIDEO_EXTENSIONS):
                 video_path = os.path.join(directory, filename)
                 try:
-                    cap = cv2.VideoCapture(video_path)
-                    if cap.isOpened():
-                        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                    # Served from the index; only new or changed files are opened.
+                    metadata = video_index.get(video_path)
+                    if metadata is not None:
                         # Use a prefix for session files to avoid name collisions in the dictionary
                         key = f"session__{filename}" if is_session_file else filename
                         video_files[key] = {
-                            'total_frames': total_frames,
+                            'total_frames': metadata['frame_count'],
+                            'fps': metadata['fps'],
+                            'width': metadata['width'],
+                            'height': metadata['height'],
                             'filename': filename, # Keep original filename for requests
-                            'is_session_file': is_session_file
+                            'is_session_file': is_session_file,
+                            'proxy': proxy_manager.status(video_path)['status']
                         }
-                    cap.release()
                 except Exception as e:
                     app.logger.error(f"Error processing video {filename}: {e}")
 
@@ -94,7 +413,11 @@ def list_videos():
 
 @app.route('/upload', methods=['POST'])
 def upload_video():
-    """Handles video file uploads."""
+    """
+    Handles video file uploads. Unless the form sets create_proxy=false (or
+    PROXY_ON_UPLOAD is off), a scrubbing proxy is then created in the
+    background; its progress is polled from /proxy.
+    """
     if 'video' not in request.files:
         return jsonify({'status': 'error', 'message': 'No video file part'}), 400
     file = request.files['video']
@@ -113,36 +436,146 @@ def upload_video():
         # Get total frames to return to the frontend for immediate selection
         video_path = os.path.join(user_upload_dir, filename)
         total_frames = -1
+        fps = 0.0
         try:
-            cap = cv2.VideoCapture(video_path)
-            if cap.isOpened():
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            cap.release()
+            # Probing here fills the index, so the next /videos call is a pure lookup.
+            metadata = video_index.get(video_path)
+            if metadata is not None:
+                total_frames = metadata['frame_count']
+                fps = metadata['fps']
         except Exception as e:
             app.logger.error(f"Could not get frame count for uploaded video {filename}: {e}")
 
+        create_proxy = request.form.get('create_proxy', str(PROXY_ON_UPLOAD)).lower() not in ('0', 'false', 'no')
+        if create_proxy and total_frames > 0:
+            proxy_status = proxy_manager.request(video_path)
+        else:
+            proxy_status = proxy_manager.status(video_path)
+
         return jsonify({
             'status': 'success',
             'message': f'Video "{filename}" uploaded successfully.',
             'filename': filename,
             'total_frames': total_frames,
-            'is_session_file': True
+            'fps': fps,
+            'is_session_file': True,
+            'proxy': proxy_status
         })
 
+def upload_error_response(error):
+    body = {'status': 'error', 'message': str(error)}
+    if error.received_bytes is not None:
+        body['received_bytes'] = error.received_bytes
+    return jsonify(body), error.status_code
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """
+    Starts a resumable chunked upload into the session's folder from JSON
+    {filename, size}, or finds the unfinished upload of the same file. The
+    client then PUTs the bytes from received_bytes on to /uploads/<upload_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    user_upload_dir = os.path.join(SESSION_UPLOAD_FOLDER, ensure_session_id())
+    try:
+        upload = upload_manager.create(user_upload_dir, data.get('filename'), data.get('size'))
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'status': 'success', **upload})
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Bytes received so far (the offset to resume from) and the metadata probed up to now."""
+    upload = upload_manager.status(os.path.join(SESSION_UPLOAD_FOLDER, ensure_session_id()), upload_id)
+    if upload is None:
+        return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+    return jsonify({'status': 'success', **upload})
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    Writes the raw request body at ?offset=, which must equal received_bytes;
+    otherwise the answer is 409 with the offset to continue from. The
+    response to the last chunk is that of /upload, so the video can be
+    selected right away.
+    """
+    user_upload_dir = os.path.join(SESSION_UPLOAD_FOLDER, ensure_session_id())
+    try:
+        offset = int(request.args.get('offset', -1))
+        upload = upload_manager.write(user_upload_dir, upload_id, offset, request.stream, request.content_length)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'offset must be an integer.'}), 400
+    except UploadError as e:
+        return upload_error_response(e)
+    if upload['upload_status'] != UPLOAD_COMPLETE:
+        return jsonify({'status': 'success', **upload})
+
+    video_path = upload.pop('path')
+    metadata = upload['metadata'] or {}
+    total_frames = metadata.get('frame_count', -1)
+    create_proxy = request.args.get('create_proxy', str(PROXY_ON_UPLOAD)).lower() not in ('0', 'false', 'no')
+    if create_proxy and total_frames > 0:
+        proxy_status = proxy_manager.request(video_path)
+    else:
+        proxy_status = proxy_manager.status(video_path)
+    app.logger.info(f"Completed chunked upload {upload_id} of {upload['filename']}")
+    return jsonify({
+        'status': 'success',
+        **upload,
+        'message': f'Video "{upload["filename"]}" uploaded successfully.',
+        'total_frames': total_frames,
+        'fps': metadata.get('fps', 0.0),
+        'is_session_file': True,
+        'proxy': proxy_status
+    })
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    """Deletes an unfinished upload."""
+    if not upload_manager.cancel(os.path.join(SESSION_UPLOAD_FOLDER, ensure_session_id()), upload_id):
+        return jsonify({'status': 'error', 'message': 'Upload not found.'}), 404
+    return jsonify({'status': 'success'})
+
 @app.route('/process_frame', methods=['POST'])
 def process_frame_endpoint():
-    """Processes a single video frame and returns the annotated version."""
+    """
+    Processes a single video frame and returns the annotated version.
+    With response_format 'json' (default) the image is a base64 string inside
+    the JSON body. With 'multipart' the response is multipart/form-data: a
+    small 'metadata' JSON part with the detections and a binary 'frame' part.
+    With 'detections' no image is drawn or encoded at all; the browser draws
+    the boxes over the video itself.
+    image_format ('jpeg' or 'webp'), image_quality and max_width (preview
+    downscaling) control the encoded image. motion_gate skips inference on
+    frames without motion during sequential playback. detect_every (k or
+    'auto') runs inference on every k-th frame only and predicts the others.
+    """
     data = request.get_json()
     video_filename = data.get('video_filename')
-    frame_index = int(data.get('frame_index', 0))
     is_session_file = data.get('is_session_file', False)
     reset_tracker = data.get('reset_tracker', False)
+    response_format = data.get('response_format', 'json')
+    image_format = data.get('image_format', 'jpeg')
+    use_motion_gate = bool(data.get('motion_gate', MOTION_GATE_DEFAULT))
+    frame_index, error_message = parse_int_field(data.get('frame_index', 0), 'frame_index', 0, required=True)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    image_quality, error_message = parse_int_field(data.get('image_quality'), 'image_quality', 1, 100)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    max_width, error_message = parse_int_field(data.get('max_width'), 'max_width', 16)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    detect_every, error_message = parse_detect_every(data.get('detect_every', DETECT_EVERY_DEFAULT))
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
 
-    if is_session_file:
-        session_id = ensure_session_id()
-        video_path = os.path.join(SESSION_UPLOAD_FOLDER, session_id, secure_filename(video_filename))
-    else:
-        video_path = os.path.join(PERMANENT_VIDEO_FOLDER, secure_filename(video_filename))
+    if response_format not in ('json', 'multipart', 'detections'):
+        return jsonify({'status': 'error', 'message': f'Unknown response_format: {response_format}'}), 400
+    if image_format not in FRAME_IMAGE_FORMATS:
+        return jsonify({'status': 'error', 'message': f'Unknown image_format: {image_format}'}), 400
+
+    video_path = resolve_video_path(video_filename, is_session_file)
 
     if not os.path.exists(video_path):
         app.logger.error(f"Video not found at path: {video_path}")
@@ -150,160 +583,396 @@ def process_frame_endpoint():
 
     app.logger.info(f"Processing frame {frame_index} for video: {video_filename}")
 
-    # Get or reset the tracking state for this video
-    if video_filename not in tracking_cache or reset_tracker:
-        tracking_cache[video_filename] = {}
-        app.logger.info(f"Initialized new tracking state for {video_filename}")
+    session_id = ensure_session_id()
+
+    # Get or reset the tracking state for this session and video. The state stays
+    # locked until the frame is processed, so concurrent requests cannot interleave.
+    with tracking_store.checkout(session_id, video_path, reset=reset_tracker) as tracking_entry:
+        if reset_tracker:
+            app.logger.info(f"Initialized new tracking state for {video_filename}")
+            tracking_entry.next_frame = frame_index
+            tracking_entry.canonical = frame_index == 0
+        if use_motion_gate and tracking_entry.motion_gate is None:
+            tracking_entry.motion_gate = MotionGate()
+        if detect_every is None:
+            tracking_entry.detection_schedule = None
+        elif tracking_entry.detection_schedule is None or tracking_entry.detect_every != detect_every:
+            tracking_entry.detection_schedule = new_detection_schedule(detect_every)
+        tracking_entry.detect_every = detect_every
+
+        # Seeks continue from the nearest checkpoint instead of the tracker of
+        # wherever playback was before. Gated and scheduled playback skips
+        # frames, so it never matches a full pass and is left alone.
+        tracker_restore = None
+        if not reset_tracker and frame_index != tracking_entry.next_frame:
+            if tracker_checkpoints is not None and not use_motion_gate and detect_every is None:
+                tracker_restore = restore_tracker(tracking_entry, video_path, frame_index)
+            if tracker_restore is None:
+                tracking_entry.canonical = False
+
+        # Frames the background worker already decoded and ran detection on.
+        # Seeks and tracker resets cancel the read-ahead inside fetch(). With the
+        # motion gate, read-ahead only decodes: the gate decides per frame whether
+        # inference is needed at all. With a detection schedule, only the frames
+        # it will detect are sent to the model ahead of time.
+        prefetch_should_detect = None
+        if use_motion_gate:
+            prefetch_should_detect = decode_only
+        elif tracking_entry.detection_schedule is not None:
+            prefetch_should_detect = tracking_entry.detection_schedule.planned_detection
+        prefetched = prefetch_manager.fetch(video_path, frame_index, session_id, reset=reset_tracker,
+                                            should_detect=prefetch_should_detect)
+        frame, raw_detections = prefetched if prefetched else (None, None)
+
+        # Frames that are only drawn, not detected, come from the proxy when it
+        # is at least as wide as the requested preview.
+        preview_source = None
+        proxy_info = proxy_manager.proxy_info(video_path) if response_format != 'detections' else None
+        if proxy_info is not None and max_width is not None and max_width <= proxy_info['width']:
+            preview_source = (proxy_manager.proxy_path(video_path), proxy_frame_index(proxy_info, frame_index),
+                              proxy_info['source_width'])
+
+        # Use the real detector function
+        encoded_frame, detections, updated_tracking_state, error_message = process_video_frame_with_tracking(
+            video_path=video_path,
+            frame_index=frame_index,
+            model=model,
+            average_wingspans_m=average_wingspans_m,
+            tracking_state=tracking_entry.state,
+            decoder_pool=decoder_pool,
+            session_key=session_id,
+            frame=frame,
+            raw_detections=raw_detections,
+            output_format={'multipart': 'bytes', 'detections': 'none'}.get(response_format, 'base64'),
+            image_format=image_format,
+            image_quality=image_quality,
+            max_width=max_width,
+            detection_cache=detection_cache,
+            motion_gate=tracking_entry.motion_gate if use_motion_gate else None,
+            detection_schedule=tracking_entry.detection_schedule,
+            preview_source=preview_source
+        )
+
+        if error_message:
+            return jsonify({'status': 'error', 'message': error_message}), 500
+
+        # Update the store with the new state
+        tracking_entry.state = updated_tracking_state
+        if use_motion_gate or detect_every is not None:
+            tracking_entry.canonical = False
+        tracking_entry.next_frame = frame_index + 1
+        if (tracking_entry.canonical and tracker_checkpoints is not None
+                and tracker_checkpoints.wants(tracking_entry.next_frame)):
+            tracker_checkpoints.put(video_path, tracking_entry.next_frame, updated_tracking_state)
+        if results_store is not None:
+            results_store.record(video_path, frame_index, detections, canonical=tracking_entry.canonical)
+
+    extra = {'tracker_restore': tracker_restore} if tracker_restore is not None else {}
 
-    current_tracking_state = tracking_cache[video_filename]
+    with span('serialize'):
+        if response_format == 'detections':
+            return jsonify({
+                'status': 'success',
+                'frame_index': frame_index,
+                'detections': detections,
+                **extra
+            })
 
-    # Use the real detector function
-    encoded_frame, detections, updated_tracking_state, error_message = process_video_frame_with_tracking(
-        video_path=video_path,
-        frame_index=frame_index,
-        model=model,
-        average_wingspans_m=average_wingspans_m,
-        tracking_state=current_tracking_state
-    )
+        if response_format == 'multipart':
+            return multipart_frame_response({
+                'status': 'success',
+                'frame_index': frame_index,
+                'detections': detections,
+                **extra
+            }, encoded_frame, image_format)
 
+        return jsonify({
+            'status': 'success',
+            'annotated_frame': encoded_frame,
+            'image_format': image_format,
+            'detections': detections,
+            **extra
+        })
+
+def multipart_frame_response(metadata, image_bytes, image_format):
+    """
+    Builds a multipart/form-data response holding a JSON 'metadata' part and the
+    encoded image as a binary 'frame' part. Browsers parse it with
+    Response.formData(), so the image never goes through base64.
+    """
+    boundary = uuid.uuid4().hex
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        b'Content-Disposition: form-data; name="metadata"\r\n',
+        b'Content-Type: application/json\r\n\r\n',
+        json.dumps(metadata).encode('utf-8'),
+        f'\r\n--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="frame"; filename="frame.{extension}"\r\n'.encode(),
+        f'Content-Type: image/{image_format}\r\n\r\n'.encode(),
+        image_bytes,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return Response(body, mimetype=f'multipart/form-data; boundary={boundary}')
+
+@app.route('/video_file')
+def video_file():
+    """
+    Serves the original video so the browser can decode and display it itself.
+    With proxy=true the browser-playable proxy is served instead, which seeks
+    much faster; its boxes still have to be scaled from the original size.
+    """
+    video_filename = request.args.get('video_filename', '')
+    is_session_file = request.args.get('is_session_file', 'false').lower() == 'true'
+    video_path = resolve_video_path(video_filename, is_session_file)
+    if not video_filename or not os.path.exists(video_path):
+        return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+    if request.args.get('proxy', 'false').lower() == 'true':
+        proxy_info = proxy_manager.proxy_info(video_path)
+        if proxy_info is None or not proxy_info['browser_playable']:
+            return jsonify({'status': 'error', 'message': 'No playable proxy for this video'}), 404
+        return send_file(proxy_manager.proxy_path(video_path), conditional=True)
+    # conditional=True enables HTTP range requests, which video seeking relies on.
+    return send_file(video_path, conditional=True)
+
+def requested_video_path():
+    """Video path from the video_filename and is_session_file query or JSON parameters, or None."""
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    video_filename = data.get('video_filename', '')
+    is_session_file = str(data.get('is_session_file', 'false')).lower() == 'true'
+    video_path = resolve_video_path(video_filename, is_session_file)
+    if not video_filename or not os.path.exists(video_path):
+        return None
+    return video_path
+
+@app.route('/proxy', methods=['GET', 'POST'])
+def proxy_status():
+    """
+    Status and progress of a video's scrubbing proxy. POST starts creating it
+    if it does not exist yet.
+    """
+    video_path = requested_video_path()
+    if video_path is None:
+        return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+    if request.method == 'POST':
+        return jsonify(proxy_manager.request(video_path))
+    return jsonify(proxy_manager.status(video_path))
+
+@app.route('/thumbnails')
+def thumbnails():
+    """The thumbnail strip of a video's proxy; its layout is part of the /proxy status."""
+    video_path = requested_video_path()
+    if video_path is None:
+        return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+    thumbnails_path = proxy_manager.thumbnails_path(video_path)
+    if thumbnails_path is None:
+        return jsonify({'status': 'error', 'message': 'Thumbnails are not ready'}), 404
+    return send_file(thumbnails_path, mimetype='image/jpeg', max_age=3600)
+
+@app.route('/preview_frame')
+def preview_frame():
+    """
+    A plain JPEG of one frame for scrubbing, without detection or tracking.
+    Decoded from the proxy when it exists, otherwise from the original.
+    max_width downscales the image.
+    """
+    video_path = requested_video_path()
+    if video_path is None:
+        return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+    frame_index, error_message = parse_int_field(request.args.get('frame_index', 0), 'frame_index', 0, required=True)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    max_width, error_message = parse_int_field(request.args.get('max_width'), 'max_width', 16)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    session_id = ensure_session_id()
+
+    frame, error_message = None, None
+    proxy_info = proxy_manager.proxy_info(video_path)
+    if proxy_info is not None:
+        frame, error_message = read_video_frame(proxy_manager.proxy_path(video_path),
+                                                proxy_frame_index(proxy_info, frame_index), decoder_pool,
+                                                session_key=session_id)
+    if frame is None:
+        frame, error_message = read_video_frame(video_path, frame_index, decoder_pool, session_key=session_id)
     if error_message:
         return jsonify({'status': 'error', 'message': error_message}), 500
 
-    # Update the cache with the new state
-    tracking_cache[video_filename] = updated_tracking_state
+    height, width = frame.shape[:2]
+    if max_width and width > max_width:
+        frame = cv2.resize(frame, (max_width, max(1, round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+    with span('encode'):
+        image = encode_frame(frame, 'jpeg', PREVIEW_JPEG_QUALITY)
+    return Response(image, mimetype='image/jpeg')
 
-    return jsonify({
-        'status': 'success',
-        'annotated_frame': encoded_frame,
-        'detections': detections
-    })
+@app.route('/decoder_stats')
+def decoder_stats():
+    """Returns hit/miss/seek counters of the shared decoder pool."""
+    return jsonify(decoder_pool.stats())
+
+@app.route('/prefetch_stats')
+def prefetch_stats():
+    """Returns read-ahead counters for /process_frame playback."""
+    return jsonify(prefetch_manager.stats())
+
+@app.route('/inference_stats')
+def inference_stats():
+    """Returns batching counters of the shared inference server."""
+    if not INFERENCE_SERVER_ADDRESS or model is None:
+        return jsonify({'status': 'error', 'message': 'No inference server is configured.'}), 404
+    return jsonify(model.stats())
+
+@app.route('/metrics')
+def metrics():
+    """Latency histograms and component counters in Prometheus text format."""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/tracking_stats')
+def tracking_stats():
+    """Returns hit/eviction counters and memory use of the tracking store."""
+    return jsonify(tracking_store.stats())
+
+@app.route('/detection_cache_stats')
+def detection_cache_stats():
+    """Returns hit/miss counters and the size of the detection cache."""
+    if detection_cache is None:
+        return jsonify({'status': 'error', 'message': 'Detection cache is disabled.'}), 404
+    return jsonify(detection_cache.stats())
+
+def parse_time(value):
+    """A Unix time from a query parameter: seconds since the epoch or an ISO 8601 date/time. Returns (time, error)."""
+    if value is None or value == '':
+        return None, None
+    try:
+        return float(value), None
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp(), None
+    except ValueError:
+        return None, f"Invalid time: {value}. Use an ISO 8601 date or Unix seconds."
+
+
+def results_filters():
+    """
+    The video (video_filename, is_session_file), since/until (file modification
+    time) and class filters of a /results query. Returns (kwargs, error_response).
+    """
+    if results_store is None:
+        return None, (jsonify({'status': 'error', 'message': 'The results store is disabled.'}), 404)
+    filters = {'video_path': None, 'class_name': request.args.get('class') or None}
+    if request.args.get('video_filename'):
+        filters['video_path'] = requested_video_path()
+        if filters['video_path'] is None:
+            return None, (jsonify({'status': 'error', 'message': 'Video not found'}), 404)
+    for name in ('since', 'until'):
+        filters[name], error_message = parse_time(request.args.get(name))
+        if error_message:
+            return None, (jsonify({'status': 'error', 'message': error_message}), 400)
+    return filters, None
+
+@app.route('/results/summary')
+def results_summary():
+    """
+    Per-class detections, unique tracks and their rates per minute of video
+    over all recorded videos, or those matching video_filename, since, until
+    and class, e.g. /results/summary?class=stork&since=2024-05-06.
+    """
+    filters, error_response = results_filters()
+    if error_response:
+        return error_response
+    return jsonify({'status': 'success', **results_store.summary(**filters)})
+
+@app.route('/results/timeline')
+def results_timeline():
+    """Frames, detections and new tracks per minute of video, with the /results/summary filters."""
+    filters, error_response = results_filters()
+    if error_response:
+        return error_response
+    return jsonify({'status': 'success', **results_store.timeline(**filters)})
+
+@app.route('/results/density')
+def results_density():
+    """Where in the frame birds were detected, as a grid of counts, with the /results/summary filters."""
+    filters, error_response = results_filters()
+    if error_response:
+        return error_response
+    return jsonify({'status': 'success', **results_store.density(**filters)})
+
+@app.route('/results/detections')
+def results_detections():
+    """
+    Stored detections of one video between start_frame and end_frame, optionally
+    of one class, at most limit rows.
+    """
+    filters, error_response = results_filters()
+    if error_response:
+        return error_response
+    if filters['video_path'] is None:
+        return jsonify({'status': 'error', 'message': 'video_filename is required.'}), 400
+    try:
+        start_frame = int(request.args.get('start_frame', 0))
+        end_frame = int(request.args['end_frame']) if request.args.get('end_frame') else None
+        limit = int(request.args.get('limit', RESULTS_MAX_DETECTION_ROWS))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'start_frame, end_frame and limit must be integers.'}), 400
+    detections = results_store.detections(filters['video_path'], start_frame, end_frame, filters['class_name'],
+                                          limit)
+    return jsonify({'status': 'success', 'detections': detections})
 
 @app.route('/analyze_video', methods=['POST'])
 def analyze_video():
     data = request.get_json()
     video_filename = data.get('video_filename')
     is_session_file = data.get('is_session_file', False)
-    start_frame_index = data.get('start_frame_index', 0)
-
 
     if not video_filename:
         return jsonify({'status': 'error', 'message': 'Video filename is required.'}), 400
+    start_frame_index, error_message = parse_int_field(data.get('start_frame_index', 0), 'start_frame_index', 0,
+                                                       required=True)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    num_frames, error_message = parse_int_field(data.get('num_frames', ANALYSIS_NUM_FRAMES), 'num_frames', 1,
+                                                required=True)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    # Longer windows belong in an analysis job; this endpoint blocks the request.
+    num_frames = min(num_frames, ANALYSIS_MAX_FRAMES)
+    detect_every, error_message = parse_detect_every(data.get('detect_every', DETECT_EVERY_DEFAULT))
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
 
-    if is_session_file:
-        session_id = ensure_session_id()
-        video_path = os.path.join(SESSION_UPLOAD_FOLDER, session_id, secure_filename(video_filename))
-    else:
-        video_path = os.path.join(PERMANENT_VIDEO_FOLDER, secure_filename(video_filename))
+    video_path = resolve_video_path(video_filename, is_session_file)
 
     if not os.path.exists(video_path):
         return jsonify({'status': 'error', 'message': 'Video not found'}), 404
 
+    if model is None:
+        return jsonify({'status': 'error', 'message': 'Model is not loaded.'}), 500
+
     try:
-        # --- ISOLATED ANALYSIS ---
-        # Load a SEPARATE model instance for analysis to prevent corrupting the
-        # state of the global model used for single-frame processing.
-        analysis_model, _ = load_model_and_wingspans(MODEL_PATH, WINGSPANS_FILE)
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise IOError("Cannot open video file")
-
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        # Set the starting frame for analysis
-        if start_frame_index > 0 and start_frame_index < total_frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame_index)
-
-        # This block appears to be an alternative implementation.
-        # It is syntactically correct but was mixed with the block below.
-        # I am keeping it as requested.
-        # Get the current tracking state for the video from the cache.
-        # If it doesn't exist, start with an empty state.
-        initial_tracking_state = tracking_cache.get(video_filename, {})
-        # Call the new, consistent analysis function from detector.py
-        # We use the global model instance, just like the single-frame view.
-        aggregated_results, _ = analyze_video_chunk(
+        # One pass with the already loaded model. The analysis continues from the
+        # viewer's tracking state but works on its own snapshot of it.
+        initial_tracking_state = tracking_store.snapshot(ensure_session_id(), video_path)
+        if initial_tracking_state is None:
+            initial_tracking_state = new_tracking_state()
+
+        result, error_message = analyze_video_range(
             video_path=video_path,
             start_frame=start_frame_index,
-            num_frames=30,  # Analyze 30 consecutive frames
+            num_frames=num_frames,
             model=model,
             average_wingspans_m=average_wingspans_m,
-            initial_tracking_state=initial_tracking_state
+            initial_tracking_state=initial_tracking_state,
+            decoder_pool=decoder_pool,
+            detection_cache=detection_cache,
+            detection_schedule=new_detection_schedule(detect_every),
+            results=results_store
         )
+        if error_message:
+            return jsonify({'status': 'error', 'message': error_message}), 500
 
-        # Data structures for analysis
-        analysis_results = {}
-        # { class_name: { "all_ids": set(), "longest_tracking": {"track_id": 0, "frames": 0}, "current_streaks": {track_id: streak_len} } }
-
-        for _ in range(30): # Limit analysis to 30 frames
-            ret, frame = cap.read()
-            if not ret:
-                break # Stop if we reach the end of the video
-
-            # This check was misplaced. It should likely be after the loop.
-            # if "error" in aggregated_results:
-            #     return jsonify({'status': 'error', 'message': aggregated_results["error"]}), 500
-
-            results = analysis_model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
-            
-            current_frame_track_ids = set()
-
-            # This block was incorrectly indented.
-            if results[0].boxes.id is not None:
-                boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-                track_ids = results[0].boxes.id.cpu().numpy().astype(int)
-                class_ids = results[0].boxes.cls.cpu().numpy().astype(int)
-
-                for box, track_id, class_id in zip(boxes, track_ids, class_ids):
-                    class_name = analysis_model.names[class_id]
-                    current_frame_track_ids.add(track_id)
-
-                    # Initialize class in results if not present
-                    if class_name not in analysis_results:
-                        analysis_results[class_name] = {
-                            "all_ids": set(),
-                            "longest_tracking": {"track_id": 0, "frames": 0},
-                            "current_streaks": {}
-                        }
-                    
-                    class_data = analysis_results[class_name]
-                    class_data["all_ids"].add(track_id)
-
-                    # Update current streak
-                    class_data["current_streaks"][track_id] = class_data["current_streaks"].get(track_id, 0) + 1
-
-                    # Check for new longest streak
-                    if class_data["current_streaks"][track_id] > class_data["longest_tracking"]["frames"]:
-                        class_data["longest_tracking"]["frames"] = class_data["current_streaks"][track_id]
-                        class_data["longest_tracking"]["track_id"] = track_id
-            
-            # Reset streaks for tracks that were not found in this frame
-            for class_data in analysis_results.values():
-                lost_tracks = set(class_data["current_streaks"].keys()) - current_frame_track_ids
-                for track_id in lost_tracks:
-                    class_data["current_streaks"][track_id] = 0
-
-        cap.release()
-
-        # This block was also incorrectly indented and structured.
-        if "error" in aggregated_results:
-             return jsonify({'status': 'error', 'message': aggregated_results["error"]}), 500
-
-        # The code seems to have two conflicting return paths. I am preserving both.
-        # This one seems to belong to the `analyze_video_chunk` call.
-        # return jsonify({'status': 'success', 'analysis': aggregated_results})
-
-        # Final formatting of the results from the manual loop
-        final_analysis = {}
-        for class_name, data in analysis_results.items():
-            final_analysis[class_name] = {
-                "total_unique_birds": len(data["all_ids"]),
-                "longest_tracking": {
-                    "track_id": int(data["longest_tracking"]["track_id"]),
-                    "frames": int(data["longest_tracking"]["frames"])
-                }
-            }
-
-        return jsonify({'status': 'success', 'analysis': final_analysis})
+        return jsonify({'status': 'success', **result})
 
     except Exception as e:
         # Log the full error to the server console for debugging
@@ -312,6 +981,236 @@ def analyze_video():
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': f'An internal error occurred: {e}'}), 500
 
+@app.route('/analysis_jobs', methods=['POST'])
+def submit_analysis_job():
+    """
+    Queues a background analysis of a frame range (the rest of the video by
+    default) and returns the job ID to poll or stream progress from. With
+    parallel (true or a worker count) the range is analysed in segments on a
+    process pool.
+    """
+    data = request.get_json()
+    video_filename = data.get('video_filename')
+    is_session_file = data.get('is_session_file', False)
+
+    if not video_filename:
+        return jsonify({'status': 'error', 'message': 'Video filename is required.'}), 400
+
+    video_path = resolve_video_path(video_filename, is_session_file)
+    if not os.path.exists(video_path):
+        return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+
+    if model is None:
+        return jsonify({'status': 'error', 'message': 'Model is not loaded.'}), 500
+
+    start_frame_index, error_message = parse_int_field(data.get('start_frame_index', 0), 'start_frame_index', 0,
+                                                       required=True)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    num_frames, error_message = parse_int_field(data.get('num_frames'), 'num_frames', 1)
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+
+    use_motion_gate = bool(data.get('motion_gate', MOTION_GATE_DEFAULT))
+    detect_every, error_message = parse_detect_every(data.get('detect_every', DETECT_EVERY_DEFAULT))
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    parallel_workers, error_message = parse_parallel(data.get('parallel', PARALLEL_ANALYSIS_DEFAULT))
+    if error_message:
+        return jsonify({'status': 'error', 'message': error_message}), 400
+    if parallel_workers and (use_motion_gate or detect_every is not None):
+        return jsonify({'status': 'error',
+                        'message': 'parallel cannot be combined with motion_gate or detect_every.'}), 400
+
+    def run(job, on_progress):
+        if parallel_workers:
+            result, error_message = analyze_video_parallel(
+                video_path=video_path,
+                start_frame=start_frame_index,
+                num_frames=num_frames,
+                model_factory=parallel_model_factory(),
+                wingspans_file=WINGSPANS_FILE,
+                workers=parallel_workers,
+                on_progress=on_progress,
+                cancel_event=job.cancel_event,
+                detection_cache_factory=parallel_detection_cache_factory()
+            )
+            if error_message:
+                raise IOError(error_message)
+            return result
+
+        # Jobs start from a fresh tracker so the report depends only on the range.
+        result, error_message = analyze_video_range(
+            video_path=video_path,
+            start_frame=start_frame_index,
+            num_frames=num_frames,
+            model=model,
+            average_wingspans_m=average_wingspans_m,
+            initial_tracking_state=new_tracking_state(),
+            decoder_pool=decoder_pool,
+            on_progress=on_progress,
+            cancel_event=job.cancel_event,
+            detection_cache=detection_cache,
+            motion_gate=MotionGate() if use_motion_gate else None,
+            detection_schedule=new_detection_schedule(detect_every),
+            # A full pass from frame 0 leaves checkpoints for later seeks.
+            checkpoints=tracker_checkpoints if start_frame_index == 0 and not use_motion_gate
+            and detect_every is None else None,
+            results=results_store
+        )
+        if error_message:
+            raise IOError(error_message)
+        return result
+
+    try:
+        job = analysis_jobs.submit(
+            ensure_session_id(), run,
+            video_filename=video_filename,
+            is_session_file=is_session_file,
+            start_frame_index=start_frame_index,
+            num_frames=num_frames,
+            parallel_workers=parallel_workers
+        )
+    except QueueFullError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+
+    app.logger.info(f"Queued analysis job {job.id} for {video_filename}")
+    return jsonify({'status': 'success', 'job': job.to_dict()}), 202
+
+@app.route('/analysis_jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Returns the status, progress and (once finished) the report of a job."""
+    job = analysis_jobs.get(job_id, owner=ensure_session_id())
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict()})
+
+@app.route('/analysis_jobs/<job_id>', methods=['DELETE'])
+def cancel_analysis_job(job_id):
+    """Cancels a queued or running job."""
+    job = analysis_jobs.cancel(job_id, owner=ensure_session_id())
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify({'status': 'success', 'job': job.to_dict(include_result=False)})
+
+@app.route('/analysis_jobs/<job_id>/events')
+def stream_analysis_job(job_id):
+    """Streams job progress as Server-Sent Events until the job finishes."""
+    job = analysis_jobs.get(job_id, owner=ensure_session_id())
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+    def events():
+        seen_version = None
+        while True:
+            version = analysis_jobs.wait_for_change(job, seen_version, SSE_KEEPALIVE_S)
+            if version == seen_version:
+                yield ": keep-alive\n\n"
+                continue
+            seen_version = version
+            if job.finished:
+                yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            yield f"event: progress\ndata: {json.dumps(job.to_dict(include_result=False))}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/streams', methods=['POST'])
+def start_stream():
+    """
+    Starts a live detection pipeline on a configured camera source, or replays
+    a stored video at its real frame rate (video_filename), which behaves like
+    a camera feed for testing. Returns the stream ID.
+    """
+    data = request.get_json()
+    source_name = data.get('source')
+    video_filename = data.get('video_filename')
+
+    if model is None:
+        return jsonify({'status': 'error', 'message': 'Model is not loaded.'}), 500
+
+    motion_gate = MotionGate() if data.get('motion_gate', MOTION_GATE_DEFAULT) else None
+    if source_name:
+        if source_name not in STREAM_SOURCES:
+            return jsonify({'status': 'error', 'message': f'Unknown stream source: {source_name}'}), 404
+        stream = LiveStream(STREAM_SOURCES[source_name], model, average_wingspans_m, motion_gate=motion_gate)
+    elif video_filename:
+        video_path = resolve_video_path(video_filename, data.get('is_session_file', False))
+        if not os.path.exists(video_path):
+            return jsonify({'status': 'error', 'message': 'Video not found'}), 404
+        stream = LiveStream(video_path, model, average_wingspans_m, realtime=True,
+                            loop=bool(data.get('loop', False)), motion_gate=motion_gate)
+    else:
+        return jsonify({'status': 'error', 'message': 'A stream source or video filename is required.'}), 400
+
+    if live_streams.start(ensure_session_id(), stream) is None:
+        return jsonify({'status': 'error', 'message': 'Too many live streams are running.'}), 429
+    return jsonify({'status': 'success', 'stream_id': stream.id}), 201
+
+@app.route('/stream_sources')
+def list_stream_sources():
+    """Returns the names of the configured camera sources."""
+    return jsonify(sorted(STREAM_SOURCES))
+
+@app.route('/streams/<stream_id>', methods=['GET'])
+def get_stream(stream_id):
+    """Returns counters, drop rate and end-to-end latency of a stream."""
+    stream = live_streams.get(stream_id, owner=ensure_session_id())
+    if stream is None:
+        return jsonify({'status': 'error', 'message': 'Stream not found'}), 404
+    return jsonify({'status': 'success', 'stats': stream.stats()})
+
+@app.route('/streams/<stream_id>', methods=['DELETE'])
+def stop_stream(stream_id):
+    """Stops a stream."""
+    stream = live_streams.stop(stream_id, owner=ensure_session_id())
+    if stream is None:
+        return jsonify({'status': 'error', 'message': 'Stream not found'}), 404
+    return jsonify({'status': 'success', 'stats': stream.stats()})
+
+@app.route('/streams/<stream_id>/latest')
+def latest_stream_result(stream_id):
+    """
+    Returns the most recently published result of a stream. With after=<sequence>
+    the request waits for a newer one (long polling). response_format 'multipart'
+    adds the annotated JPEG like /process_frame does; 'detections' (default)
+    returns JSON only.
+    """
+    stream = live_streams.get(stream_id, owner=ensure_session_id())
+    if stream is None:
+        return jsonify({'status': 'error', 'message': 'Stream not found'}), 404
+    after = request.args.get('after', type=int)
+    result = stream.latest(after_sequence=after, timeout=STREAM_LATEST_TIMEOUT_S)
+    if result is None:
+        return ('', 204)
+    metadata = {'status': 'success', **result.metadata()}
+    if request.args.get('response_format') == 'multipart' and result.image is not None:
+        return multipart_frame_response(metadata, result.image, 'jpeg')
+    return jsonify(metadata)
+
+@app.route('/streams/<stream_id>/mjpeg')
+def stream_mjpeg(stream_id):
+    """Serves the annotated stream as MJPEG, which an <img> element plays directly."""
+    stream = live_streams.get(stream_id, owner=ensure_session_id())
+    if stream is None:
+        return jsonify({'status': 'error', 'message': 'Stream not found'}), 404
+
+    def frames():
+        sequence = 0
+        while True:
+            result = stream.latest(after_sequence=sequence, timeout=STREAM_LATEST_TIMEOUT_S)
+            if result is None:
+                if not stream.running:
+                    return
+                continue
+            sequence = result.sequence
+            if result.image is not None:
+                yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + result.image + b'\r\n'
+
+    return Response(stream_with_context(frames()), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     # Get port from environment variable or default to 8080
     port = int(os.environ.get('PORT', 8080))
@@ -0,0 +1,219 @@
+# backends.py
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from detection_cache import file_sha256
+
+# --- Configuration Parameters ---
+INFERENCE_BACKENDS = ('torch', 'onnx', 'openvino')
+BACKEND_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'backends')
+BACKEND_DEFAULT_IMGSZ = 640          # Input size when the weights do not record their training size
+CALIBRATION_MAX_IMAGES = 300         # Images used to calibrate INT8 activation ranges
+CALIBRATION_FRAMES_PER_VIDEO = 30    # Evenly spaced frames taken from each calibration video
+CALIBRATION_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+CALIBRATION_VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+_EXPORT_INFO_FILE = 'export.json'
+
+
+def backend_key(backend, int8=False):
+    """Name of a backend variant, e.g. 'openvino-int8'. Used in cache keys and reports."""
+    return f"{backend}-int8" if int8 and backend != 'torch' else backend
+
+
+def model_imgsz(model):
+    """The input size the weights were trained at, which predictions also use."""
+    imgsz = getattr(model, 'overrides', {}).get('imgsz', BACKEND_DEFAULT_IMGSZ)
+    return max(imgsz) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+
+
+def _calibration_sources(calibration):
+    """Image and video files of a calibration set (a directory or a single video)."""
+    if os.path.isfile(calibration):
+        return [calibration]
+    sources = []
+    for root, _, files in os.walk(calibration):
+        for name in sorted(files):
+            if name.lower().endswith(CALIBRATION_IMAGE_EXTENSIONS + CALIBRATION_VIDEO_EXTENSIONS):
+                sources.append(os.path.join(root, name))
+    return sorted(sources)
+
+
+def calibration_fingerprint(calibration):
+    """Hash of the calibration files' names and sizes; a changed set triggers a new export."""
+    digest = hashlib.sha256(str(CALIBRATION_MAX_IMAGES).encode())
+    for path in _calibration_sources(calibration):
+        digest.update(f"{os.path.relpath(path, calibration)}:{os.path.getsize(path)}".encode())
+    return digest.hexdigest()
+
+
+def load_calibration_images(calibration, max_images=CALIBRATION_MAX_IMAGES):
+    """
+    BGR images of a calibration set: every image file, and evenly spaced
+    frames of every video, up to max_images spread over the whole set.
+    """
+    images = []
+    for path in _calibration_sources(calibration):
+        if path.lower().endswith(CALIBRATION_IMAGE_EXTENSIONS):
+            image = cv2.imread(path)
+            if image is not None:
+                images.append(image)
+            continue
+        cap = cv2.VideoCapture(path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for frame_index in np.linspace(0, max(0, total_frames - 1), CALIBRATION_FRAMES_PER_VIDEO).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_index))
+            ret, frame = cap.read()
+            if ret:
+                images.append(frame)
+        cap.release()
+    if len(images) > max_images:
+        images = [images[i] for i in np.linspace(0, len(images) - 1, max_images).astype(int)]
+    if not images:
+        raise ValueError(f"No calibration images found in {calibration}.")
+    return images
+
+
+def _letterbox(image, imgsz):
+    """Resizes keeping the aspect ratio and pads to imgsz x imgsz, as the YOLO predictor does."""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    return cv2.copyMakeBorder(resized, top, imgsz - resized.shape[0] - top, left, imgsz - resized.shape[1] - left,
+                              cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def _quantize_onnx(onnx_path, output_path, images, imgsz):
+    """Static INT8 quantization (QDQ, per-channel weights) with onnxruntime."""
+    # Optional dependency, only needed to build INT8 ONNX models.
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(images)
+
+        def get_next(self):
+            image = next(self._images, None)
+            if image is None:
+                return None
+            blob = cv2.cvtColor(_letterbox(image, imgsz), cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+            return {input_name: (blob[None].astype(np.float32) / 255.0)}
+
+    quantize_static(onnx_path, output_path, _Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def _write_calibration_dataset(directory, images, class_names):
+    """Writes images and an ultralytics dataset YAML for INT8 calibration. Returns the YAML path."""
+    image_dir = os.path.join(directory, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    for i, image in enumerate(images):
+        cv2.imwrite(os.path.join(image_dir, f"{i:05d}.jpg"), image)
+    yaml_path = os.path.join(directory, 'calibration.yaml')
+    with open(yaml_path, 'w') as f:
+        f.write(f"path: {directory}\ntrain: images\nval: images\nnames:\n")
+        for class_id, name in sorted(class_names.items()):
+            f.write(f"  {class_id}: {name}\n")
+    return yaml_path
+
+
+def export_model(model_path, backend, int8=False, calibration=None, export_dir=BACKEND_EXPORT_DIR):
+    """
+    Exports the PyTorch weights to an ONNX or OpenVINO model, optionally INT8
+    quantized with a calibration set (a directory of images and/or videos),
+    and caches the result under export_dir. The cache is keyed by the weights'
+    hash, the backend, the input size and the calibration set, so a later call
+    just returns the cached model. Returns (exported model path, imgsz).
+    Models are exported with dynamic input shapes, so batches and the motion
+    gate's smaller crops work as with PyTorch.
+    """
+    if backend not in INFERENCE_BACKENDS or backend == 'torch':
+        raise ValueError(f"Unknown export backend: {backend}")
+    if int8 and not calibration:
+        raise ValueError("INT8 quantization needs a calibration set.")
+
+    source = YOLO(model_path)
+    imgsz = model_imgsz(source)
+    variant = f"{backend_key(backend, int8)}-{imgsz}"
+    if int8:
+        variant += f"-{calibration_fingerprint(calibration)[:12]}"
+    target = os.path.join(export_dir, file_sha256(model_path)[:16], variant)
+
+    info_path = os.path.join(target, _EXPORT_INFO_FILE)
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            info = json.load(f)
+        return os.path.join(target, info['artifact']), info['imgsz']
+
+    # Export into a private directory and move it into place when complete, so
+    # concurrent workers never load a half-written model.
+    work_dir = f"{target}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(work_dir)
+    try:
+        print(f"Exporting {model_path} to {variant}...")
+        start = time.time()
+        weights_copy = os.path.join(work_dir, os.path.basename(model_path))
+        shutil.copy2(model_path, weights_copy)
+        images = load_calibration_images(calibration) if int8 else None
+        if backend == 'onnx':
+            artifact = YOLO(weights_copy).export(format='onnx', imgsz=imgsz, dynamic=True)
+            if int8:
+                quantized = os.path.splitext(artifact)[0] + '_int8.onnx'
+                _quantize_onnx(artifact, quantized, images, imgsz)
+                artifact = quantized
+        else:
+            options = {}
+            if int8:
+                options = {'int8': True, 'data': _write_calibration_dataset(os.path.join(work_dir, 'calibration'),
+                                                                            images, source.names)}
+            artifact = YOLO(weights_copy).export(format='openvino', imgsz=imgsz, dynamic=True, **options)
+        os.remove(weights_copy)
+        shutil.rmtree(os.path.join(work_dir, 'calibration'), ignore_errors=True)
+        info = {
+            'artifact': os.path.relpath(str(artifact), work_dir),
+            'backend': backend,
+            'int8': bool(int8),
+            'imgsz': imgsz,
+            'weights': os.path.abspath(model_path),
+            'export_seconds': time.time() - start,
+        }
+        with open(os.path.join(work_dir, _EXPORT_INFO_FILE), 'w') as f:
+            json.dump(info, f, indent=2)
+        try:
+            os.rename(work_dir, target)
+        except OSError:
+            # Another worker finished the same export first; use its copy.
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print(f"Exported {variant} in {info['export_seconds']:.1f}s.")
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    with open(info_path) as f:
+        info = json.load(f)
+    return os.path.join(target, info['artifact']), info['imgsz']
+
+
+def load_backend_model(model_path, backend, int8=False, calibration=None, export_dir=BACKEND_EXPORT_DIR):
+    """
+    Loads an exported ONNX or OpenVINO model through ultralytics, so the
+    predictor and result parsing are the same as for the PyTorch weights.
+    The exported model predicts at the input size of the original weights.
+    """
+    artifact, imgsz = export_model(model_path, backend, int8, calibration, export_dir)
+    model = YOLO(artifact, task='detect')
+    model.overrides['imgsz'] = imgsz
+    model.inference_backend = backend_key(backend, int8)
+    return model
@@ -0,0 +1,117 @@
+# bench_backends.py
+"""
+Latency and accuracy of the CPU inference backends. The same frames are
+detected with every backend through run_detection_on_frame; PyTorch is the
+reference. Recall is the share of confident reference detections
+(confidence >= CODE_DETECTION_CONF_THRESHOLD) a backend reproduces with the
+same class and IoU >= --match-iou; precision is the share of the backend's
+confident detections that match a reference detection. Exports (and INT8
+calibration) happen on first use and are cached, so their time is reported
+separately.
+
+Usage (from the app directory):
+    python benchmarks/bench_backends.py --video videos/sample.mp4 --backends torch,onnx,openvino,openvino-int8 --calibration videos
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import backend_key  # noqa: E402
+from detector import CODE_DETECTION_CONF_THRESHOLD, calculate_iou, load_model, run_detection_on_frame  # noqa: E402
+from bench_motion_gate import load_frames  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WARMUP_FRAMES = 3
+
+
+def confident(detections):
+    return [det for det in detections if det['confidence'] >= CODE_DETECTION_CONF_THRESHOLD]
+
+
+def match_counts(reference, candidate, match_iou):
+    """(matched, reference total, candidate total) of confident detections over all frames."""
+    matched = reference_total = candidate_total = 0
+    for ref_dets, dets in zip(reference, candidate):
+        ref_dets, remaining = confident(ref_dets), confident(dets)
+        reference_total += len(ref_dets)
+        candidate_total += len(remaining)
+        for ref in ref_dets:
+            for i, det in enumerate(remaining):
+                if det['class'] == ref['class'] and calculate_iou(ref['bbox'], det['bbox']) >= match_iou:
+                    matched += 1
+                    del remaining[i]
+                    break
+    return matched, reference_total, candidate_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'))
+    parser.add_argument('--video', required=True, action='append', help='May be given several times')
+    parser.add_argument('--frames', type=int, default=100, help='Frames per video')
+    parser.add_argument('--backends', default='torch,onnx,openvino',
+                        help="Backends to compare; append '-int8' for a quantized export")
+    parser.add_argument('--calibration', default=os.path.join(APP_ROOT, 'videos'),
+                        help='Images and/or videos for INT8 calibration')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    frames = [frame for video_path in args.video for frame in load_frames(video_path, args.frames)]
+
+    results = []
+    reference = None
+    for spec in ['torch'] + [b for b in args.backends.split(',') if b != 'torch']:
+        backend, int8 = spec.replace('-int8', ''), spec.endswith('-int8')
+        start = time.perf_counter()
+        model = load_model(args.weights, backend, int8, args.calibration)
+        load_seconds = time.perf_counter() - start
+        if model is None or getattr(model, 'inference_backend', 'torch') != backend_key(backend, int8):
+            print(f"Skipping {spec}: the backend could not be loaded.")
+            continue
+
+        for frame in frames[:WARMUP_FRAMES]:
+            run_detection_on_frame(frame, model)
+        detections, latencies = [], []
+        for frame in frames:
+            start = time.perf_counter()
+            detections.append(run_detection_on_frame(frame, model))
+            latencies.append(time.perf_counter() - start)
+        if reference is None:
+            reference = detections
+
+        latencies = np.array(latencies) * 1000
+        matched, reference_total, candidate_total = match_counts(reference, detections, args.match_iou)
+        results.append({
+            'backend': spec,
+            'frames': len(frames),
+            'load_seconds': load_seconds,
+            'latency_ms_mean': float(latencies.mean()),
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p95': float(np.percentile(latencies, 95)),
+            'fps': 1000.0 / float(latencies.mean()),
+            'recall': matched / reference_total if reference_total else 1.0,
+            'precision': matched / candidate_total if candidate_total else 1.0,
+            'detections': candidate_total,
+        })
+
+    print(f"{'backend':<16} {'load s':>7} {'mean ms':>8} {'p95 ms':>8} {'fps':>7} {'speedup':>8} "
+          f"{'recall':>7} {'precision':>9}")
+    for r in results:
+        speedup = results[0]['latency_ms_mean'] / r['latency_ms_mean']
+        print(f"{r['backend']:<16} {r['load_seconds']:>7.1f} {r['latency_ms_mean']:>8.1f} {r['latency_ms_p95']:>8.1f} "
+              f"{r['fps']:>7.1f} {speedup:>7.2f}x {r['recall']:>7.1%} {r['precision']:>9.1%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# bench_batch_inference.py
+"""
+Measures detection throughput (frames/sec) of run_detection_on_batch for a
+range of batch sizes and checks that every batch size returns the same
+detections as run_detection_on_frame.
+
+Usage (from the app directory):
+    python benchmarks/bench_batch_inference.py --video videos/sample.mp4 --frames 64 --batch-sizes 1,2,4,8,16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import load_model_and_wingspans, run_detection_on_batch, run_detection_on_frame  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_frames(video_path, num_frames, width, height):
+    """Reads the first num_frames frames of a video, or makes noise frames if no video is given."""
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        frames = []
+        while len(frames) < num_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        if not frames:
+            raise IOError(f"Could not read frames from {video_path}")
+        return frames
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(num_frames)]
+
+
+def same_detections(a, b, tolerance=1e-3):
+    """True if two raw detection lists agree in class, confidence and box."""
+    if len(a) != len(b):
+        return False
+    for det_a, det_b in zip(a, b):
+        if det_a['class'] != det_b['class']:
+            return False
+        if abs(det_a['confidence'] - det_b['confidence']) > tolerance:
+            return False
+        if max(abs(x - y) for x, y in zip(det_a['bbox'], det_b['bbox'])) > tolerance * 1000:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'))
+    parser.add_argument('--video', default=None, help='Video to take frames from (default: random frames)')
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--batch-sizes', default='1,2,4,8,16')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed model calls before measuring')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model, _ = load_model_and_wingspans(args.weights, os.path.join(APP_ROOT, 'wingspans.txt'))
+    if model is None:
+        sys.exit("Model could not be loaded.")
+
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    for _ in range(args.warmup):
+        run_detection_on_frame(frames[0], model)
+
+    reference = [run_detection_on_frame(frame, model) for frame in frames]
+
+    results = []
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        start = time.perf_counter()
+        detections = run_detection_on_batch(frames, model, batch_size)
+        elapsed = time.perf_counter() - start
+        results.append({
+            'batch_size': batch_size,
+            'frames': len(frames),
+            'seconds': elapsed,
+            'fps': len(frames) / elapsed if elapsed > 0 else float('inf'),
+            'matches_single_frame': all(same_detections(a, b) for a, b in zip(reference, detections)),
+        })
+
+    base_fps = results[0]['fps'] if results else 0
+    print(f"{'batch':>6} {'frames/s':>10} {'speedup':>8}  matches")
+    for r in results:
+        speedup = r['fps'] / base_fps if base_fps else 0
+        print(f"{r['batch_size']:>6} {r['fps']:>10.2f} {speedup:>7.2f}x  {r['matches_single_frame']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# bench_checkpoints.py
+"""
+Seek latency with tracker checkpoints against replaying from frame 0. A
+synthetic video (see synthetic.py) is analysed once from frame 0 with a
+CheckpointStore, which leaves a checkpoint every --interval frames. Each
+random seek then restores the nearest checkpoint and replays the frames up
+to the target, and the track IDs at the target are compared with those of
+the full pass. --stub-latency-ms emulates the model's inference time.
+
+Usage (from the app directory):
+    python benchmarks/bench_checkpoints.py --frames 1000 --seeks 20 --interval 25
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoints import CheckpointStore  # noqa: E402
+from decoder_pool import DecoderPool  # noqa: E402
+from detector import analyze_video_chunk, load_wingspans, new_tracking_state  # noqa: E402
+from synthetic import StubModel, SyntheticScene  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_ids(video_path, start_frame, state, frame_index, model, average_wingspans_m, decoder_pool):
+    """Replays [start_frame, frame_index] from state. Returns the sorted (ID, class) pairs of frame_index."""
+    found = []
+
+    def on_frame(index, frame_detections):
+        if index == frame_index:
+            found.extend(sorted((det['tracked_id'], det['class']) for det in frame_detections))
+
+    analyze_video_chunk(video_path, start_frame, frame_index - start_frame + 1, model, average_wingspans_m, state,
+                        decoder_pool=decoder_pool, on_frame=on_frame)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--birds', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seeks', type=int, default=10)
+    parser.add_argument('--interval', type=int, default=25, help='Frames between checkpoints')
+    parser.add_argument('--memory-bytes', type=int, default=None, help='Checkpoint memory budget (0 spills all)')
+    parser.add_argument('--stub-latency-ms', type=float, default=5.0, help='Emulated inference time per frame')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model = StubModel(latency_ms=args.stub_latency_ms)
+    average_wingspans_m = load_wingspans(os.path.join(APP_ROOT, 'wingspans.txt'))
+    decoder_pool = DecoderPool()
+    with tempfile.TemporaryDirectory() as work_dir:
+        video_path = os.path.join(work_dir, 'scene.mp4')
+        SyntheticScene(birds=args.birds, seed=args.seed).write(video_path, args.frames)
+        store = CheckpointStore(os.path.join(work_dir, 'checkpoints'), interval=args.interval)
+        if args.memory_bytes is not None:
+            store.max_memory_bytes = args.memory_bytes
+
+        truth = {}
+        targets = random.Random(args.seed).sample(range(args.frames), min(args.seeks, args.frames))
+        start = time.perf_counter()
+        analyze_video_chunk(video_path, 0, args.frames, model, average_wingspans_m, new_tracking_state(),
+                            decoder_pool=decoder_pool, checkpoints=store,
+                            on_frame=lambda index, dets: truth.__setitem__(
+                                index, sorted((det['tracked_id'], det['class']) for det in dets)))
+        full_seconds = time.perf_counter() - start
+        print(f"full pass       {full_seconds:>8.2f}s  {store.stats()['stored']} checkpoints")
+
+        results = []
+        for frame_index in targets:
+            start = time.perf_counter()
+            ids = frame_ids(video_path, 0, new_tracking_state(), frame_index, model, average_wingspans_m,
+                            decoder_pool)
+            replay_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            checkpoint_frame, state = store.nearest(video_path, frame_index, new_tracking_state)
+            if checkpoint_frame is None:
+                checkpoint_frame, state = 0, new_tracking_state()
+            restored_ids = frame_ids(video_path, checkpoint_frame, state, frame_index, model, average_wingspans_m,
+                                     decoder_pool)
+            restore_seconds = time.perf_counter() - start
+            matches = ids == truth[frame_index] and restored_ids == truth[frame_index]
+            results.append({'frame': frame_index, 'checkpoint_frame': checkpoint_frame,
+                            'replay_ms': 1000 * replay_seconds, 'restore_ms': 1000 * restore_seconds,
+                            'matches': matches})
+            print(f"seek {frame_index:>6}  from 0 {1000 * replay_seconds:>9.1f} ms  from {checkpoint_frame:>6} "
+                  f"{1000 * restore_seconds:>8.1f} ms  {'IDs match' if matches else 'IDS DIFFER'}")
+        print(store.stats())
+    decoder_pool.close_all()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'full_seconds': full_seconds, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
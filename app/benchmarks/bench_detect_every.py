@@ -0,0 +1,119 @@
+# bench_detect_every.py
+"""
+Throughput-vs-accuracy report for detect-every-k mode. A video range is first
+tracked with detection on every frame as the reference; then it is tracked
+again for each k (or "auto"), with Tracker.predict() filling the frames in
+between. Box recall is the share of reference tracked boxes that the k pass
+reproduces with the same class and IoU >= --match-iou; speedup is reference
+time over k-pass time (decoding included).
+
+Usage (from the app directory):
+    python benchmarks/bench_detect_every.py --video videos/sample.mp4 --k 2,3,5,auto
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decoder_pool import DecoderPool  # noqa: E402
+from detection_schedule import DetectionSchedule  # noqa: E402
+from detector import (  # noqa: E402
+    calculate_iou,
+    get_video_total_frames,
+    load_model_and_wingspans,
+    new_tracking_state,
+    process_video_frame_with_tracking,
+)
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def track_range(video_path, frame_indices, model, average_wingspans_m, decoder_pool, schedule):
+    """Tracks the frames in order. Returns (per-frame detections, seconds)."""
+    tracking_state = new_tracking_state()
+    per_frame = []
+    start = time.perf_counter()
+    for frame_index in frame_indices:
+        _, detections, tracking_state, error = process_video_frame_with_tracking(
+            video_path, frame_index, model, average_wingspans_m, tracking_state,
+            decoder_pool=decoder_pool, session_key='bench', output_format='none',
+            detection_schedule=schedule
+        )
+        if error:
+            raise IOError(error)
+        per_frame.append(detections)
+    return per_frame, time.perf_counter() - start
+
+
+def box_recall(reference, candidate, match_iou):
+    """Matched and total reference boxes over all frames."""
+    matched = total = 0
+    for ref_dets, dets in zip(reference, candidate):
+        remaining = list(dets)
+        for ref in ref_dets:
+            total += 1
+            for i, det in enumerate(remaining):
+                if det['class'] == ref['class'] and calculate_iou(ref['box'], det['box']) >= match_iou:
+                    matched += 1
+                    del remaining[i]
+                    break
+    return matched, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'))
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--k', default='2,3,5,auto', help='Detection intervals to compare')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model, average_wingspans_m = load_model_and_wingspans(args.weights, os.path.join(APP_ROOT, 'wingspans.txt'))
+    if model is None:
+        sys.exit("Model could not be loaded.")
+
+    total_frames = get_video_total_frames(args.video)
+    frame_indices = list(range(args.start, min(args.start + args.frames, total_frames)))
+    if not frame_indices:
+        sys.exit("No frames in range.")
+
+    decoder_pool = DecoderPool()
+    track_range(args.video, frame_indices[:2], model, average_wingspans_m, decoder_pool, None)  # Warm-up
+    reference, reference_seconds = track_range(args.video, frame_indices, model, average_wingspans_m,
+                                               decoder_pool, None)
+
+    results = []
+    for k in args.k.split(','):
+        schedule = DetectionSchedule(k=None if k == 'auto' else int(k))
+        per_frame, seconds = track_range(args.video, frame_indices, model, average_wingspans_m, decoder_pool,
+                                         schedule)
+        matched, total = box_recall(reference, per_frame, args.match_iou)
+        stats = schedule.stats()
+        results.append({
+            'k': k,
+            'frames': len(frame_indices),
+            'detected_frames': stats['detected'],
+            'final_k': stats['k'],
+            'fps': len(frame_indices) / seconds if seconds > 0 else float('inf'),
+            'reference_fps': len(frame_indices) / reference_seconds if reference_seconds > 0 else float('inf'),
+            'speedup': reference_seconds / seconds if seconds > 0 else float('inf'),
+            'box_recall': matched / total if total else 1.0,
+        })
+
+    print(f"{'k':>5} {'detected':>9} {'fps':>8} {'speedup':>8} {'recall':>7}")
+    for r in results:
+        print(f"{r['k']:>5} {r['detected_frames']:>9} {r['fps']:>8.1f} {r['speedup']:>7.2f}x {r['box_recall']:>7.1%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# bench_detections.py
+"""
+Per-frame cost of everything between the model and the response: parsing
+the model output, swarm filtering, tracking, distance estimation and the
+frontend list, for scenes of N birds in a tight flock (so the swarm rules
+fire). Detections are carried as arrays (Detections) from the model output
+on; the 'dicts' rows feed the same frames in as raw detection dicts, as
+older callers do, and must give identical results.
+
+Usage (from the app directory):
+    python benchmarks/bench_detections.py --boxes 5,20,100,400,1500 --frames 60
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import (  # noqa: E402
+    _parse_detection_result,
+    apply_swarm_logic,
+    build_frontend_detections,
+    estimate_distances,
+    load_wingspans,
+    new_tracking_state,
+    update_tracking_state,
+)
+from synthetic import CLASSES, StubModel, stub_result  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ('parse', 'swarm', 'tracking', 'distance', 'frontend')
+
+
+def simulate_results(num_boxes, num_frames, seed=0, width=1920, height=1080):
+    """One stub model result per frame for a flock of num_boxes drifting birds."""
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform([0, 0], [width, height], (num_boxes, 2))
+    sizes = rng.uniform(4, 40, num_boxes)
+    classes = rng.integers(0, len(CLASSES), num_boxes)
+    results = []
+    for _ in range(num_frames):
+        positions += rng.normal(0, 2, (num_boxes, 2))
+        results.append(stub_result([
+            [x, y, x + size, y + size * 0.8, class_id, min(0.95, 0.15 + size * size / 400.0)]
+            for (x, y), size, class_id in zip(positions, sizes, classes)
+        ]))
+    return results
+
+
+def run(results, model, average_wingspans_m, as_dicts):
+    """Runs the stages over all frames; returns (mean ms per stage, frontend lists)."""
+    totals = dict.fromkeys(STAGES, 0.0)
+    outputs = []
+    tracking_state = new_tracking_state()
+    for frame_index, result in enumerate(results):
+        start = time.perf_counter()
+        raw_detections = _parse_detection_result(result, model)
+        if as_dicts:
+            raw_detections = raw_detections.to_dicts()
+        parsed = time.perf_counter()
+        detections_for_tracking = apply_swarm_logic(raw_detections)
+        swarmed = time.perf_counter()
+        tracked = update_tracking_state(detections_for_tracking, tracking_state, frame_index)
+        tracking_done = time.perf_counter()
+        estimate_distances(tracked, average_wingspans_m)
+        estimated = time.perf_counter()
+        outputs.append(build_frontend_detections(tracked))
+        built = time.perf_counter()
+        for stage, seconds in zip(STAGES, (parsed - start, swarmed - parsed, tracking_done - swarmed,
+                                           estimated - tracking_done, built - estimated)):
+            totals[stage] += seconds
+    return {stage: 1000 * seconds / len(results) for stage, seconds in totals.items()}, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boxes', default='5,20,100,400,1500')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--repeats', type=int, default=3, help='Best of this many runs is reported')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model = StubModel()
+    average_wingspans_m = load_wingspans(os.path.join(APP_ROOT, 'wingspans.txt'))
+    results = []
+    print(f"{'boxes':>6} {'input':<7} " + ' '.join(f"{stage:>9}" for stage in STAGES) + f" {'total ms':>9}  same")
+    for num_boxes in [int(b) for b in args.boxes.split(',')]:
+        frames = simulate_results(num_boxes, args.frames)
+        reference = None
+        for input_format in ('arrays', 'dicts'):
+            runs = [run(frames, model, average_wingspans_m, input_format == 'dicts') for _ in range(args.repeats)]
+            stage_ms = min((r[0] for r in runs), key=lambda ms: sum(ms.values()))
+            outputs = runs[0][1]
+            reference = outputs if reference is None else reference
+            row = {'boxes': num_boxes, 'frames': args.frames, 'input': input_format, 'stage_ms': stage_ms,
+                   'total_ms': sum(stage_ms.values()), 'same_output': outputs == reference}
+            results.append(row)
+            print(f"{num_boxes:>6} {input_format:<7} " + ' '.join(f"{stage_ms[s]:>9.3f}" for s in STAGES) +
+                  f" {row['total_ms']:>9.3f}  {row['same_output']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
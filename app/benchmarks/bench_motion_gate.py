@@ -0,0 +1,121 @@
+# bench_motion_gate.py
+"""
+Recall-vs-speedup report for the motion gate. Every frame of a video is first
+detected in full as the reference; then the frames are replayed through
+MotionGate for each combination of pixel threshold and minimum changed
+fraction. Recall is the share of confident reference detections
+(confidence >= CODE_DETECTION_CONF_THRESHOLD) that the gated pass reproduces
+with the same class and IoU >= --match-iou; speedup is reference time over
+gated time (gate overhead included).
+
+Usage (from the app directory):
+    python benchmarks/bench_motion_gate.py --video videos/sample.mp4 --thresholds 10,18,30 --min-fractions 0.0002,0.0005,0.002
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import (  # noqa: E402
+    CODE_DETECTION_CONF_THRESHOLD,
+    calculate_iou,
+    load_model_and_wingspans,
+    run_detection_on_frame,
+)
+from motion import GATE_ROI, GATE_SKIPPED, MotionGate  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while max_frames is None or len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise IOError(f"Could not read frames from {video_path}")
+    return frames
+
+
+def recall(reference, gated, match_iou):
+    """Matched and total confident reference detections over all frames."""
+    matched = total = 0
+    for ref_dets, gated_dets in zip(reference, gated):
+        candidates = list(gated_dets)
+        for ref in ref_dets:
+            if ref['confidence'] < CODE_DETECTION_CONF_THRESHOLD:
+                continue
+            total += 1
+            for i, det in enumerate(candidates):
+                if det['class'] == ref['class'] and calculate_iou(ref['bbox'], det['bbox']) >= match_iou:
+                    matched += 1
+                    del candidates[i]
+                    break
+    return matched, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'))
+    parser.add_argument('--video', required=True, action='append', help='May be given several times')
+    parser.add_argument('--frames', type=int, default=None, help='Frames per video (default: all)')
+    parser.add_argument('--thresholds', default='18', help='Gray-level pixel thresholds to compare')
+    parser.add_argument('--min-fractions', default='0.0005', help='Minimum changed fractions to compare')
+    parser.add_argument('--no-roi', action='store_true', help='Only skip frames; never crop to motion regions')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model, _ = load_model_and_wingspans(args.weights, os.path.join(APP_ROOT, 'wingspans.txt'))
+    if model is None:
+        sys.exit("Model could not be loaded.")
+
+    results = []
+    for video_path in args.video:
+        frames = load_frames(video_path, args.frames)
+        run_detection_on_frame(frames[0], model)  # Warm-up
+
+        start = time.perf_counter()
+        reference = [run_detection_on_frame(frame, model) for frame in frames]
+        reference_seconds = time.perf_counter() - start
+
+        for threshold in [int(t) for t in args.thresholds.split(',')]:
+            for min_fraction in [float(f) for f in args.min_fractions.split(',')]:
+                gate = MotionGate(pixel_threshold=threshold, min_changed_fraction=min_fraction, roi=not args.no_roi)
+                start = time.perf_counter()
+                gated = [gate.detect(frame, index, model)[0] for index, frame in enumerate(frames)]
+                seconds = time.perf_counter() - start
+                matched, total = recall(reference, gated, args.match_iou)
+                results.append({
+                    'video': video_path,
+                    'frames': len(frames),
+                    'pixel_threshold': threshold,
+                    'min_changed_fraction': min_fraction,
+                    'skipped_frames': gate.counters[GATE_SKIPPED],
+                    'roi_frames': gate.counters[GATE_ROI],
+                    'recall': matched / total if total else 1.0,
+                    'reference_detections': total,
+                    'speedup': reference_seconds / seconds if seconds > 0 else float('inf'),
+                })
+
+    print(f"{'video':<24} {'thresh':>6} {'min frac':>9} {'skipped':>8} {'roi':>5} {'recall':>7} {'speedup':>8}")
+    for r in results:
+        print(f"{os.path.basename(r['video'])[:24]:<24} {r['pixel_threshold']:>6} {r['min_changed_fraction']:>9.4f} "
+              f"{r['skipped_frames']:>8} {r['roi_frames']:>5} {r['recall']:>7.1%} {r['speedup']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# bench_parallel_analysis.py
+"""
+Speedup of the segmented parallel analysis over a sequential pass, and
+whether its report matches the sequential one. A synthetic video (see
+synthetic.py) is analysed with the stub detector, or with the real model
+when --weights is given, once sequentially and once per worker count.
+--stub-latency-ms emulates the model's inference time, which is what the
+worker processes parallelize in practice.
+
+Usage (from the app directory):
+    python benchmarks/bench_parallel_analysis.py --frames 2000 --workers 1,2,4,8 --stub-latency-ms 40
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_video_range  # noqa: E402
+from decoder_pool import DecoderPool  # noqa: E402
+from detector import load_model, load_wingspans, new_tracking_state  # noqa: E402
+from parallel_analysis import analyze_video_parallel  # noqa: E402
+from synthetic import StubModel, SyntheticScene  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINGSPANS_FILE = os.path.join(APP_ROOT, 'wingspans.txt')
+
+
+def report_differences(sequential, parallel):
+    """Human-readable differences between two analysis results; empty when they match."""
+    differences = []
+    if sequential['counts'] != parallel['counts']:
+        differences.append(f"counts {sequential['counts']} != {parallel['counts']}")
+    for class_name in sorted(set(sequential['analysis']) | set(parallel['analysis'])):
+        expected = sequential['analysis'].get(class_name)
+        actual = parallel['analysis'].get(class_name)
+        if expected != actual:
+            differences.append(f"{class_name}: {expected} != {actual}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None, help='Analyse this video instead of a synthetic one')
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--birds', type=int, default=15)
+    parser.add_argument('--swarm-size', type=int, default=30)
+    parser.add_argument('--speed', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts')
+    parser.add_argument('--stub-latency-ms', type=float, default=20.0, help='Emulated inference time per frame')
+    parser.add_argument('--weights', default=None, help='Use the real model instead of the stub')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    if args.weights:
+        model_factory = functools.partial(load_model, args.weights)
+    else:
+        model_factory = functools.partial(StubModel, latency_ms=args.stub_latency_ms)
+
+    with tempfile.TemporaryDirectory() as video_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(video_dir, 'scene.mp4')
+            SyntheticScene(birds=args.birds, swarm_size=args.swarm_size, speed=args.speed,
+                           seed=args.seed).write(video_path, args.frames)
+
+        start = time.perf_counter()
+        sequential, error = analyze_video_range(video_path, 0, args.frames, model_factory(),
+                                                load_wingspans(WINGSPANS_FILE), new_tracking_state(),
+                                                decoder_pool=DecoderPool())
+        sequential_seconds = time.perf_counter() - start
+        if error:
+            sys.exit(error)
+        print(f"sequential      {sequential_seconds:>7.2f}s  {sequential['frames_analyzed']} frames")
+
+        results = [{'workers': 0, 'seconds': sequential_seconds, 'speedup': 1.0, 'matches': True}]
+        for workers in (int(w) for w in args.workers.split(',')):
+            start = time.perf_counter()
+            parallel, error = analyze_video_parallel(video_path, 0, args.frames, model_factory, WINGSPANS_FILE,
+                                                     workers=workers)
+            seconds = time.perf_counter() - start
+            if error:
+                sys.exit(error)
+            differences = report_differences(sequential, parallel)
+            results.append({'workers': workers, 'seconds': seconds, 'speedup': sequential_seconds / seconds,
+                            'segments': parallel['parallel']['segments'],
+                            'stitched_tracks': parallel['parallel']['stitched_tracks'],
+                            'matches': not differences, 'differences': differences})
+            print(f"{workers:>2} workers      {seconds:>7.2f}s  {sequential_seconds / seconds:>5.2f}x  "
+                  f"{parallel['parallel']['segments']} segments  "
+                  f"{'report matches' if not differences else 'REPORT DIFFERS'}")
+            for difference in differences:
+                print(f"    {difference}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# bench_pipeline.py
+"""
+Reproducible benchmark suite for the frame pipeline. Synthetic videos with a
+controlled number of birds, speed and swarm density are generated (see
+synthetic.py) and run through:
+  frame_base64  process_video_frame_with_tracking with an annotated base64 frame
+  frame_none    process_video_frame_with_tracking with detections only
+  analysis      analyze_video_chunk (batched detection)
+  tracker       update_tracking_state on swarm-filtered ground-truth detections
+  endpoint      the Flask /process_frame endpoint (prefetch included)
+with the deterministic stub detector, and with the real model when its
+weights exist. Each result has frames/sec, mean per-stage latency (from the
+metrics spans) and peak traced Python memory. Results are written as JSON
+and can be compared with an earlier run.
+
+Usage (from the app directory):
+    python benchmarks/bench_pipeline.py --json bench.json
+    python benchmarks/bench_pipeline.py --scenarios swarm --frames 200 --compare bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decoder_pool import DecoderPool  # noqa: E402
+from detector import (  # noqa: E402
+    analyze_video_chunk,
+    apply_swarm_logic,
+    load_model,
+    load_wingspans,
+    new_tracking_state,
+    process_video_frame_with_tracking,
+    update_tracking_state,
+)
+from metrics import registry as metrics_registry  # noqa: E402
+from synthetic import StubModel, SyntheticScene, truth_detections  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = ('frame_base64', 'frame_none', 'analysis', 'tracker', 'endpoint')
+SCENARIOS = {
+    'sparse': {'birds': 8, 'swarm_size': 0, 'speed': 3.0},
+    'flock': {'birds': 40, 'swarm_size': 0, 'speed': 2.0},
+    'swarm': {'birds': 10, 'swarm_size': 80, 'speed': 1.5},
+}
+
+
+def measure(run, num_frames, memory):
+    """
+    Times run() and reads the stage spans it produced; with memory, runs it
+    again under tracemalloc for the peak. run() must start from fresh state.
+    """
+    gc.collect()
+    metrics_registry.reset()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    stages = {stage: round(summary['mean_ms'], 4) for stage, summary in
+              metrics_registry.summary('stage_seconds').items()}
+    result = {
+        'frames': num_frames,
+        'seconds': seconds,
+        'fps': num_frames / seconds if seconds > 0 else float('inf'),
+        'ms_per_frame': 1000 * seconds / num_frames,
+        'stage_ms': stages,
+        'peak_mb': None,
+    }
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def bench_frames(video_path, num_frames, model, average_wingspans_m, output_format):
+    def run():
+        decoder_pool = DecoderPool()
+        tracking_state = new_tracking_state()
+        for frame_index in range(num_frames):
+            _, _, tracking_state, error = process_video_frame_with_tracking(
+                video_path, frame_index, model, average_wingspans_m, tracking_state,
+                decoder_pool=decoder_pool, session_key='bench', output_format=output_format
+            )
+            if error:
+                raise IOError(error)
+        decoder_pool.close_all()
+    return run
+
+
+def bench_analysis(video_path, num_frames, model, average_wingspans_m):
+    def run():
+        decoder_pool = DecoderPool()
+        aggregated, _ = analyze_video_chunk(video_path, 0, num_frames, model, average_wingspans_m,
+                                            new_tracking_state(), decoder_pool=decoder_pool)
+        if 'error' in aggregated:
+            raise IOError(aggregated['error'])
+        decoder_pool.close_all()
+    return run
+
+
+def bench_tracker(truth_per_frame):
+    frames = [apply_swarm_logic(truth_detections(truth)) for truth in truth_per_frame]
+
+    def run():
+        tracking_state = new_tracking_state()
+        for frame_index, detections in enumerate(frames):
+            update_tracking_state(detections, tracking_state, frame_index)
+    return run
+
+
+def bench_endpoint(video_path, num_frames, model):
+    """The /process_frame route through Flask's test client, without the detection cache."""
+    import app as app_module
+    app_module.model = model
+    app_module.prefetch_manager.model = model
+    app_module.detection_cache = None
+    app_module.prefetch_manager.detection_cache = None
+    app_module.PERMANENT_VIDEO_FOLDER = os.path.dirname(video_path)
+    video_filename = os.path.basename(video_path)
+
+    def run():
+        client = app_module.app.test_client()
+        for frame_index in range(num_frames):
+            response = client.post('/process_frame', json={
+                'video_filename': video_filename,
+                'frame_index': frame_index,
+                'reset_tracker': frame_index == 0,
+            })
+            if response.status_code != 200:
+                raise IOError(response.get_json().get('message'))
+    return run
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_ROOT, capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def compare(results, previous_path):
+    """Prints the fps change of every result also present in an earlier run."""
+    with open(previous_path) as f:
+        previous = {(r['scenario'], r['model'], r['benchmark']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {previous_path}:")
+    print(f"{'scenario':<10} {'model':<6} {'benchmark':<13} {'old fps':>9} {'new fps':>9} {'change':>8}")
+    for r in results:
+        old = previous.get((r['scenario'], r['model'], r['benchmark']))
+        if old is None:
+            continue
+        change = (r['fps'] / old['fps'] - 1) if old['fps'] else 0.0
+        print(f"{r['scenario']:<10} {r['model']:<6} {r['benchmark']:<13} {old['fps']:>9.1f} {r['fps']:>9.1f} "
+              f"{change:>+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Any of {', '.join(SCENARIOS)}")
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help=f"Any of {', '.join(BENCHMARKS)}")
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stub-latency-ms', type=float, default=0.0, help='Emulated inference time per frame')
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'),
+                        help='Also benchmark the real model if this file exists')
+    parser.add_argument('--stub-only', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    parser.add_argument('--compare', default=None, help='Earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    average_wingspans_m = load_wingspans(os.path.join(APP_ROOT, 'wingspans.txt'))
+    models = [('stub', StubModel(latency_ms=args.stub_latency_ms))]
+    if not args.stub_only and os.path.exists(args.weights):
+        real_model = load_model(args.weights)
+        if real_model is not None:
+            models.append(('yolo', real_model))
+
+    benchmarks = args.benchmarks.split(',')
+    results = []
+    with tempfile.TemporaryDirectory() as video_dir:
+        for scenario in args.scenarios.split(','):
+            scene = SyntheticScene(width=args.width, height=args.height, seed=args.seed, **SCENARIOS[scenario])
+            video_path = os.path.join(video_dir, f'{scenario}.mp4')
+            truth_per_frame = scene.write(video_path, args.frames)
+            for model_name, model in models:
+                runs = {
+                    'frame_base64': lambda: bench_frames(video_path, args.frames, model, average_wingspans_m,
+                                                         'base64'),
+                    'frame_none': lambda: bench_frames(video_path, args.frames, model, average_wingspans_m, 'none'),
+                    'analysis': lambda: bench_analysis(video_path, args.frames, model, average_wingspans_m),
+                    'tracker': lambda: bench_tracker(truth_per_frame),
+                    'endpoint': lambda: bench_endpoint(video_path, args.frames, model),
+                }
+                for benchmark in benchmarks:
+                    if benchmark == 'tracker' and model_name != 'stub':
+                        continue  # Model independent
+                    result = measure(runs[benchmark](), args.frames, not args.no_memory)
+                    result.update({'scenario': scenario, 'model': model_name, 'benchmark': benchmark,
+                                   'birds': len(scene.sizes)})
+                    results.append(result)
+                    peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else '-'
+                    print(f"{scenario:<10} {model_name:<6} {benchmark:<13} {result['fps']:>9.1f} fps "
+                          f"{result['ms_per_frame']:>8.2f} ms/frame {peak:>7} MB peak")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': environment(), 'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
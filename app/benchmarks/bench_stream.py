@@ -0,0 +1,59 @@
+# bench_stream.py
+"""
+Replays a local video through the live stream pipeline at the video's own
+frame rate, as a camera would deliver it, and reports end-to-end latency
+(capture to published result) and the share of frames dropped because
+inference fell behind.
+
+Usage (from the app directory):
+    python benchmarks/bench_stream.py --video videos/sample.mp4 --queue-sizes 1,2,4
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import load_model_and_wingspans  # noqa: E402
+from stream import LiveStream  # noqa: E402
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default=os.path.join(APP_ROOT, 'weights/best.pt'))
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--queue-sizes', default='2', help='Frame queue sizes to compare')
+    parser.add_argument('--no-render', action='store_true', help='Skip annotation and JPEG encoding')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    model, average_wingspans_m = load_model_and_wingspans(args.weights, os.path.join(APP_ROOT, 'wingspans.txt'))
+    if model is None:
+        sys.exit("Model could not be loaded.")
+
+    results = []
+    for queue_size in [int(q) for q in args.queue_sizes.split(',')]:
+        stream = LiveStream(args.video, model, average_wingspans_m, realtime=True, render=not args.no_render,
+                            frame_queue_size=queue_size).start()
+        stream.join()
+        stats = stream.stats()
+        if stats['error']:
+            sys.exit(stats['error'])
+        stats['frame_queue_size'] = queue_size
+        results.append(stats)
+
+    print(f"{'queue':>6} {'captured':>9} {'published':>10} {'dropped':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for r in results:
+        print(f"{r['frame_queue_size']:>6} {r['captured']:>9} {r['published']:>10} {r['drop_rate']:>7.1%} "
+              f"{r['latency_ms_p50'] or 0:>8.1f} {r['latency_ms_p95'] or 0:>8.1f} {r['latency_ms_max'] or 0:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# bench_tracker.py
+"""
+Scaling benchmark for the tracking step. Simulates a flock of N moving boxes
+(with jitter, dropouts and a few classes) and compares the original dict-based
+loop with the vectorized Tracker in each matching mode. Also checks that the
+'compat' mode assigns exactly the same track IDs as the original loop.
+
+Usage (from the app directory):
+    python benchmarks/bench_tracker.py --boxes 10,50,100,250,500,1000 --frames 30
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detector import new_tracking_state, update_tracking_state  # noqa: E402
+
+CLASSES = ['seagull', 'stork', 'crow']
+
+
+def simulate_flock(num_boxes, num_frames, seed=0, width=1920, height=1080):
+    """Yields one list of detections per frame for a flock of moving birds."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(8, 40, num_boxes)
+    positions = rng.uniform([0, 0], [width, height], (num_boxes, 2))
+    velocities = rng.normal(0, 3, (num_boxes, 2))
+    classes = rng.integers(0, len(CLASSES), num_boxes)
+    for _ in range(num_frames):
+        positions += velocities + rng.normal(0, 0.5, (num_boxes, 2))
+        visible = rng.random(num_boxes) > 0.05
+        detections = []
+        for k in np.nonzero(visible)[0]:
+            x, y, s = positions[k][0], positions[k][1], sizes[k]
+            detections.append({
+                'bbox': [float(x), float(y), float(x + s), float(y + s * 0.8)],
+                'class': CLASSES[classes[k]],
+                'confidence': float(rng.uniform(0.25, 0.95)),
+                'geometric_mean': math.sqrt(s * s * 0.8),
+            })
+        yield detections
+
+
+def run(tracking_state, frames):
+    """Runs the tracking step over all frames; returns (seconds, per-frame id lists)."""
+    ids_per_frame = []
+    elapsed = 0.0
+    for frame_index, detections in enumerate(frames):
+        # Each run gets fresh dicts because tracking stores references to them.
+        detections = [dict(det) for det in detections]
+        start = time.perf_counter()
+        tracked = update_tracking_state(detections, tracking_state, frame_index)
+        elapsed += time.perf_counter() - start
+        ids_per_frame.append([info['id'] for info in tracked])
+    return elapsed, ids_per_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boxes', default='10,50,100,250,500,1000')
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--modes', default='compat,greedy,hungarian')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    results = []
+    print(f"{'boxes':>6} {'legacy ms/f':>12} " + ' '.join(f"{m + ' ms/f':>15}" for m in modes) + '  compat ids equal')
+    for num_boxes in [int(b) for b in args.boxes.split(',')]:
+        frames = list(simulate_flock(num_boxes, args.frames))
+        legacy_s, legacy_ids = run({}, frames)
+        row = {'boxes': num_boxes, 'frames': args.frames, 'legacy_ms_per_frame': 1000 * legacy_s / args.frames}
+        for mode in modes:
+            try:
+                mode_s, mode_ids = run(new_tracking_state(matching=mode), frames)
+            except ImportError as e:
+                print(f"Skipping '{mode}' matching: {e}")
+                continue
+            row[f'{mode}_ms_per_frame'] = 1000 * mode_s / args.frames
+            if mode == 'compat':
+                row['compat_ids_equal'] = mode_ids == legacy_ids
+        results.append(row)
+        cells = ' '.join(f"{row.get(m + '_ms_per_frame', float('nan')):>15.2f}" for m in modes)
+        print(f"{num_boxes:>6} {row['legacy_ms_per_frame']:>12.2f} {cells}  {row.get('compat_ids_equal')}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# synthetic.py
+"""
+Synthetic bird videos and a deterministic stub detector for benchmarks that
+must run without the model weights.
+
+SyntheticScene draws dark birds on a light sky: a number of independent birds
+plus an optional tight swarm, each moving with its own velocity. The bird's
+class is encoded in the red channel. StubModel finds the birds again with a
+threshold and connected components and answers like an ultralytics YOLO
+model, so it goes through the same detector code as the real model.
+"""
+import time
+
+import cv2
+import numpy as np
+
+CLASSES = ['crow', 'pigeon', 'seagull', 'stork', 'swallow']
+_CLASS_RED_STEP = 40        # Red value step between classes; the green channel stays dark for all birds
+_SKY_COLOR = (215, 205, 190)
+_BIRD_GREEN = 30
+_DETECT_THRESHOLD = 100     # Green values below this are bird pixels
+
+
+class SyntheticScene:
+    """
+    A reproducible scene. birds move independently at up to speed px/frame;
+    swarm_size birds fly as a flock in a cluster of swarm_radius pixels.
+    """
+
+    def __init__(self, birds=20, swarm_size=0, speed=3.0, swarm_radius=60, width=1280, height=720, seed=0):
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        total = birds + swarm_size
+        self.sizes = rng.uniform(8, 28, total)
+        self.classes = rng.integers(0, len(CLASSES), total)
+        self.positions = rng.uniform([40, 40], [width - 80, height - 80], (total, 2))
+        self.velocities = rng.uniform(-speed, speed, (total, 2))
+        if swarm_size:
+            center = rng.uniform([swarm_radius, swarm_radius], [width - 2 * swarm_radius, height - 2 * swarm_radius])
+            self.positions[birds:] = center + rng.normal(0, swarm_radius / 2, (swarm_size, 2))
+            self.velocities[birds:] = rng.uniform(-speed, speed, 2) + rng.normal(0, 0.2, (swarm_size, 2))
+            self.sizes[birds:] = rng.uniform(6, 12, swarm_size)  # Distant, small birds
+        self._rng = rng
+
+    def frames(self, num_frames):
+        """Yields (frame, ground-truth boxes [x1, y1, x2, y2, class_id]) per frame."""
+        positions = self.positions.copy()
+        velocities = self.velocities.copy()
+        for _ in range(num_frames):
+            frame = np.empty((self.height, self.width, 3), np.uint8)
+            frame[:] = _SKY_COLOR
+            truth = []
+            for (x, y), size, class_id in zip(positions, self.sizes, self.classes):
+                x1, y1 = int(x), int(y)
+                x2, y2 = int(x + size), int(y + size * 0.6)
+                color = (_BIRD_GREEN, _BIRD_GREEN, int(class_id) * _CLASS_RED_STEP)
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+                truth.append([x1, y1, x2, y2, int(class_id)])
+            yield frame, truth
+            positions += velocities
+            # Birds bounce off the frame border so the scene stays populated.
+            for axis, limit in ((0, self.width - 40), (1, self.height - 40)):
+                out = (positions[:, axis] < 5) | (positions[:, axis] > limit)
+                velocities[out, axis] *= -1
+                positions[:, axis] = np.clip(positions[:, axis], 5, limit)
+
+    def write(self, path, num_frames, fps=25):
+        """Writes the scene as an mp4 file. Returns the ground truth per frame."""
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (self.width, self.height))
+        truth_per_frame = []
+        for frame, truth in self.frames(num_frames):
+            writer.write(frame)
+            truth_per_frame.append(truth)
+        writer.release()
+        return truth_per_frame
+
+
+def truth_detections(truth):
+    """Ground-truth boxes as raw detection dicts, e.g. to benchmark tracking alone."""
+    return [
+        {
+            'bbox': [float(x1), float(y1), float(x2), float(y2)],
+            'class': CLASSES[class_id],
+            'confidence': stub_confidence((x2 - x1) * (y2 - y1)),
+            'bbox_width_pixels': float(x2 - x1),
+            'bbox_height_pixels': float(y2 - y1),
+        }
+        for x1, y1, x2, y2, class_id in truth
+    ]
+
+
+def stub_confidence(area):
+    """Deterministic confidence: small birds are uncertain, so swarm logic has work to do."""
+    return float(np.clip(0.15 + area / 400.0, 0.15, 0.95))
+
+
+class _StubBoxes:
+    """The box columns of an ultralytics Boxes object, as float32 arrays."""
+    __slots__ = ('xyxy', 'xywh', 'cls', 'conf')
+
+    def __init__(self, rows):
+        data = np.array(rows, dtype=np.float32).reshape(-1, 6)  # x1, y1, x2, y2, class_id, confidence
+        x1, y1, x2, y2 = data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+        self.xyxy = data[:, :4]
+        self.xywh = np.column_stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+        self.cls = data[:, 4]
+        self.conf = data[:, 5]
+
+
+class _StubResult:
+    __slots__ = ('boxes',)
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def stub_result(rows):
+    """Wraps [x1, y1, x2, y2, class_id, confidence] rows like one ultralytics result."""
+    return _StubResult(_StubBoxes(rows))
+
+
+class StubModel:
+    """
+    Deterministic stand-in for the YOLO model. latency_ms is added per frame to
+    emulate inference cost, so pipeline overheads can be seen in proportion.
+    """
+
+    def __init__(self, latency_ms=0.0, imgsz=1920):
+        self.names = dict(enumerate(CLASSES))
+        self.overrides = {'imgsz': imgsz}
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.frames = 0
+
+    def _detect(self, frame):
+        _, mask = cv2.threshold(frame[:, :, 1], _DETECT_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask)
+        boxes = []
+        for label in range(1, count):
+            x, y, w, h, area = stats[label]
+            red = float(np.median(frame[y:y + h, x:x + w, 2][labels[y:y + h, x:x + w] == label]))
+            class_id = int(np.clip(round(red / _CLASS_RED_STEP), 0, len(CLASSES) - 1))
+            boxes.append([x, y, x + w, y + h, class_id, stub_confidence(w * h)])
+        return stub_result(boxes)
+
+    def __call__(self, source, conf=0.25, iou=0.5, imgsz=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        self.calls += 1
+        self.frames += len(frames)
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(frames) / 1000.0)
+        return [self._detect(frame) for frame in frames]
@@ -0,0 +1,213 @@
+# checkpoints.py
+import bisect
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from tracker import Tracker
+
+# --- Configuration Parameters ---
+CHECKPOINT_INTERVAL = 25                              # Frames between tracker checkpoints (M)
+CHECKPOINT_MAX_MEMORY_BYTES = 64 * 1024 * 1024        # Checkpoints kept in memory before spilling to disk
+CHECKPOINT_MAX_DISK_BYTES = 512 * 1024 * 1024         # Spilled checkpoints kept before the oldest are deleted
+CHECKPOINT_ENTRY_OVERHEAD_BYTES = 1024                # Fixed cost charged per checkpoint on top of its arrays
+
+
+def tracker_fingerprint(tracker):
+    """Tracker settings a checkpoint is only valid for."""
+    return f"{tracker.matching}:{tracker.iou_threshold}:{tracker.frames_to_look_back}:{tracker.history_length}"
+
+
+class CheckpointStore:
+    """
+    Snapshots of the tracker every `interval` frames of a video's canonical
+    timeline: detection and tracking of every frame, starting from an empty
+    tracker at frame 0. The checkpoint at frame N is the state before frame N
+    is processed, so a seek to frame F restores the nearest checkpoint at or
+    before F and replays at most interval - 1 frames. Checkpoints are shared
+    by all viewers of a video and keyed by its path, mtime and size, a
+    namespace for the model (weights, backend and thresholds) and the tracker
+    settings. Recently used checkpoints stay in memory; the rest spill to
+    compressed .npz files under spill_dir, bounded in total size.
+    """
+
+    def __init__(self, spill_dir, namespace='', interval=CHECKPOINT_INTERVAL,
+                 max_memory_bytes=CHECKPOINT_MAX_MEMORY_BYTES, max_disk_bytes=CHECKPOINT_MAX_DISK_BYTES):
+        self.spill_dir = spill_dir
+        self.namespace = namespace
+        self.interval = interval
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()   # (video key, frame) -> (Tracker, nbytes), least recently used first
+        self._memory_bytes = 0
+        self._frames = {}              # video key -> sorted checkpoint frames, in memory or on disk
+        self._disk = OrderedDict()     # file path -> nbytes, oldest first
+        self._disk_bytes = 0
+        self._scanned = set()          # Video keys whose spill directory was read
+        self._lock = threading.Lock()
+        self._counters = {'stored': 0, 'restored': 0, 'restored_from_disk': 0, 'misses': 0, 'spilled': 0,
+                          'deleted': 0}
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def wants(self, frame_index):
+        """True if a checkpoint belongs at frame_index."""
+        return frame_index > 0 and frame_index % self.interval == 0
+
+    def _video_key(self, video_path, tracker):
+        stat = os.stat(video_path)
+        identity = (f"{self.namespace}|{os.path.abspath(video_path)}|{stat.st_mtime_ns}|{stat.st_size}|"
+                    f"{tracker_fingerprint(tracker)}")
+        return hashlib.sha1(identity.encode()).hexdigest()[:20]
+
+    def _spill_path(self, video_key, frame_index):
+        return os.path.join(self.spill_dir, video_key, f"{frame_index:09d}.npz")
+
+    def _scan_locked(self, video_key):
+        """Adds checkpoints spilled by earlier runs of the app to the index."""
+        if video_key in self._scanned:
+            return
+        self._scanned.add(video_key)
+        directory = os.path.join(self.spill_dir, video_key)
+        if not os.path.isdir(directory):
+            return
+        frames = self._frames.setdefault(video_key, [])
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(directory, name)
+            if path not in self._disk:
+                self._disk[path] = os.path.getsize(path)
+                self._disk_bytes += self._disk[path]
+            frame_index = int(name[:-4])
+            if frame_index not in frames:
+                bisect.insort(frames, frame_index)
+
+    def put(self, video_path, frame_index, tracker):
+        """Stores a snapshot of tracker as the checkpoint before frame_index."""
+        if not isinstance(tracker, Tracker):
+            return
+        video_key = self._video_key(video_path, tracker)
+        snapshot = tracker.snapshot()
+        nbytes = CHECKPOINT_ENTRY_OVERHEAD_BYTES + snapshot.memory_bytes()
+        with self._lock:
+            self._scan_locked(video_key)
+            key = (video_key, frame_index)
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous[1]
+            self._memory[key] = (snapshot, nbytes)
+            self._memory_bytes += nbytes
+            frames = self._frames.setdefault(video_key, [])
+            if frame_index not in frames:
+                bisect.insort(frames, frame_index)
+            self._counters['stored'] += 1
+            to_spill = self._evict_memory_locked()
+        self._spill(to_spill)
+
+    def nearest(self, video_path, frame_index, tracker_factory):
+        """
+        Returns (checkpoint frame, tracker) for the latest checkpoint at or
+        before frame_index, or (None, None) if there is none. The tracker is a
+        private copy. tracker_factory() gives an empty tracker, used for the
+        settings fingerprint.
+        """
+        video_key = self._video_key(video_path, tracker_factory())
+        with self._lock:
+            self._scan_locked(video_key)
+            frames = self._frames.get(video_key, [])
+            position = bisect.bisect_right(frames, frame_index) - 1
+            while position >= 0:
+                checkpoint_frame = frames[position]
+                key = (video_key, checkpoint_frame)
+                cached = self._memory.get(key)
+                if cached is not None:
+                    self._memory.move_to_end(key)
+                    self._counters['restored'] += 1
+                    return checkpoint_frame, cached[0].snapshot()
+                path = self._spill_path(video_key, checkpoint_frame)
+                if path in self._disk:
+                    break
+                # Neither in memory nor on disk any more.
+                del frames[position]
+                position -= 1
+            else:
+                self._counters['misses'] += 1
+                return None, None
+        try:
+            with np.load(path) as data:
+                tracker = Tracker.from_state_dict(data)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load tracker checkpoint {path}: {e}")
+            with self._lock:
+                self._forget_file_locked(path, video_key, checkpoint_frame)
+            return self.nearest(video_path, frame_index, tracker_factory)
+        with self._lock:
+            self._disk.move_to_end(path, last=True)
+            self._counters['restored'] += 1
+            self._counters['restored_from_disk'] += 1
+        return checkpoint_frame, tracker
+
+    def _evict_memory_locked(self):
+        """Pops least recently used checkpoints over the memory budget. Returns them for spilling."""
+        to_spill = []
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            key, (snapshot, nbytes) = self._memory.popitem(last=False)
+            self._memory_bytes -= nbytes
+            to_spill.append((key, snapshot))
+        return to_spill
+
+    def _spill(self, to_spill):
+        """Writes evicted checkpoints to disk, outside the lock."""
+        for (video_key, frame_index), snapshot in to_spill:
+            path = self._spill_path(video_key, frame_index)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.savez_compressed(f, **snapshot.state_dict())
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Could not spill tracker checkpoint {path}: {e}")
+                continue
+            with self._lock:
+                if path not in self._disk:
+                    self._disk[path] = os.path.getsize(path)
+                    self._disk_bytes += self._disk[path]
+                self._counters['spilled'] += 1
+                to_delete = self._evict_disk_locked()
+            for path in to_delete:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _forget_file_locked(self, path, video_key, frame_index):
+        self._disk_bytes -= self._disk.pop(path, 0)
+        frames = self._frames.get(video_key, [])
+        if frame_index in frames and (video_key, frame_index) not in self._memory:
+            frames.remove(frame_index)
+
+    def _evict_disk_locked(self):
+        """Drops the oldest spilled checkpoints over the disk budget. Returns their paths to delete."""
+        to_delete = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            path = next(iter(self._disk))
+            video_key = os.path.basename(os.path.dirname(path))
+            self._forget_file_locked(path, video_key, int(os.path.basename(path)[:-4]))
+            to_delete.append(path)
+            self._counters['deleted'] += 1
+        return to_delete
+
+    def stats(self):
+        """Returns checkpoint counters and the memory and disk they use."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_memory'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['on_disk'] = len(self._disk)
+            stats['disk_bytes'] = self._disk_bytes
+        return stats
@@ -0,0 +1,312 @@
+# chunked_upload.py
+import glob
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+from video_index import VIDEO_EXTENSIONS, probe_video
+
+# --- Configuration Parameters ---
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024           # Chunk size suggested to clients
+UPLOAD_MAX_CHUNK_BYTES = 64 * 1024 * 1024      # Larger request bodies are refused
+UPLOAD_MAX_BYTES = 50 * 1024 * 1024 * 1024     # Largest video accepted
+UPLOAD_WRITE_BLOCK_BYTES = 1024 * 1024         # Bytes read from the request and written per step
+UPLOAD_STALE_S = 24 * 3600                     # Unfinished uploads untouched this long are deleted
+UPLOAD_FIRST_PROBE_BYTES = 1024 * 1024         # The partial file is first probed once this much has arrived...
+UPLOAD_PROBE_GROWTH = 4                        # ...and again each time it has grown this many times over
+UPLOAD_PROBE_WORKERS = 1
+
+UPLOAD_RECEIVING = 'receiving'
+UPLOAD_COMPLETE = 'complete'
+
+PARTIAL_DIR = '.partial'
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """A refused upload request; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400, received_bytes=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.received_bytes = received_bytes
+
+
+class _Upload:
+    """An upload in progress, mirrored in a JSON manifest next to its partial file."""
+
+    def __init__(self, upload_dir, upload_id, filename, size):
+        self.upload_dir = upload_dir
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.lock = threading.Lock()  # Held while a chunk is written
+        self.metadata = None          # Container metadata probed from the partial file
+        self.metadata_stable = False  # Two probes at different sizes agreed, so it comes from the header
+        self.next_probe_bytes = UPLOAD_FIRST_PROBE_BYTES
+        self.probing = False
+
+    @property
+    def part_path(self):
+        # The partial file keeps the video's extension so the demuxer is picked as for the final file.
+        return os.path.join(self.upload_dir, PARTIAL_DIR, self.id + os.path.splitext(self.filename)[1].lower())
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.upload_dir, PARTIAL_DIR, self.id + '.json')
+
+    @property
+    def final_path(self):
+        return os.path.join(self.upload_dir, self.filename)
+
+    def received_bytes(self):
+        """Bytes on disk; everything written so far is a valid prefix of the file."""
+        try:
+            return os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+
+    def to_dict(self):
+        received = self.received_bytes()
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'received_bytes': received,
+            'progress': received / self.size if self.size else 1.0,
+            'upload_status': UPLOAD_RECEIVING,
+            'chunk_bytes': UPLOAD_CHUNK_BYTES,
+            'metadata': _public_metadata(self.metadata),
+        }
+
+
+def _public_metadata(metadata):
+    if metadata is None:
+        return None
+    return {key: metadata.get(key) for key in ('frame_count', 'fps', 'width', 'height', 'codec', 'duration_s')}
+
+
+class UploadManager:
+    """
+    Resumable chunked uploads. A client creates an upload with the file's name
+    and size, then sends the bytes in order as raw request bodies, each at the
+    offset the server has confirmed. Chunks are streamed to a partial file
+    block by block, so memory use does not depend on the chunk or file size.
+    An interrupted upload resumes from the bytes already on disk, also after
+    a server restart. While the file arrives, its container is probed in the
+    background, so its metadata is usually known when the last chunk lands.
+    """
+
+    def __init__(self, video_index, max_bytes=UPLOAD_MAX_BYTES, max_chunk_bytes=UPLOAD_MAX_CHUNK_BYTES,
+                 stale_s=UPLOAD_STALE_S):
+        self.video_index = video_index
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.stale_s = stale_s
+        self._uploads = {}  # upload_id -> _Upload
+        self._lock = threading.Lock()
+        self._probe_executor = ThreadPoolExecutor(max_workers=UPLOAD_PROBE_WORKERS, thread_name_prefix='upload-probe')
+        self._counters = {'created': 0, 'resumed': 0, 'chunks': 0, 'bytes': 0, 'completed': 0, 'conflicts': 0,
+                          'probes': 0, 'metadata_ready_at_completion': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def create(self, upload_dir, filename, size):
+        """
+        Starts an upload of filename (size bytes) into upload_dir, or returns the
+        unfinished upload of the same file there so the client can resume it.
+        """
+        filename = secure_filename(filename or '')
+        if not filename.lower().endswith(VIDEO_EXTENSIONS):
+            raise UploadError(f"Unsupported file type. Allowed: {', '.join(VIDEO_EXTENSIONS)}")
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError('size must be the file size in bytes.')
+        if not 0 < size <= self.max_bytes:
+            raise UploadError(f'size must be between 1 and {self.max_bytes} bytes.')
+
+        os.makedirs(os.path.join(upload_dir, PARTIAL_DIR), exist_ok=True)
+        self._delete_stale(upload_dir)
+        for manifest_path in glob.glob(os.path.join(upload_dir, PARTIAL_DIR, '*.json')):
+            upload = self._load(upload_dir, os.path.basename(manifest_path)[:-5])
+            if upload is not None and upload.filename == filename and upload.size == size:
+                self._count('resumed')
+                return upload.to_dict()
+
+        upload = _Upload(upload_dir, uuid.uuid4().hex, filename, size)
+        open(upload.part_path, 'wb').close()
+        with open(upload.manifest_path, 'w') as f:
+            json.dump({'filename': filename, 'size': size, 'created': time.time()}, f)
+        with self._lock:
+            self._uploads[upload.id] = upload
+            self._counters['created'] += 1
+        return upload.to_dict()
+
+    def _load(self, upload_dir, upload_id):
+        """The upload with this id in upload_dir, from memory or its manifest, or None."""
+        if not _UPLOAD_ID.match(upload_id or ''):
+            return None
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload if upload.upload_dir == upload_dir else None
+        try:
+            with open(os.path.join(upload_dir, PARTIAL_DIR, upload_id + '.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        upload = _Upload(upload_dir, upload_id, manifest['filename'], manifest['size'])
+        with self._lock:
+            return self._uploads.setdefault(upload_id, upload)
+
+    def status(self, upload_dir, upload_id):
+        """Progress of an unfinished upload, or None if there is no such upload."""
+        upload = self._load(upload_dir, upload_id)
+        return upload.to_dict() if upload is not None else None
+
+    def write(self, upload_dir, upload_id, offset, stream, length):
+        """
+        Appends length bytes read from stream at offset, which must be the
+        number of bytes received so far. A dropped connection keeps whatever
+        arrived. When the last byte lands the file is moved into upload_dir and
+        the result has upload_status 'complete', its path and its metadata.
+        """
+        upload = self._load(upload_dir, upload_id)
+        if upload is None:
+            raise UploadError('Upload not found.', 404)
+        if length is None or length < 0:
+            raise UploadError('Content-Length is required.', 411)
+        if length > self.max_chunk_bytes:
+            raise UploadError(f'Chunks may be at most {self.max_chunk_bytes} bytes.', 413)
+        if not upload.lock.acquire(blocking=False):
+            self._count('conflicts')
+            raise UploadError('Another chunk of this upload is being written.', 409, upload.received_bytes())
+        try:
+            received = upload.received_bytes()
+            if offset != received:
+                self._count('conflicts')
+                raise UploadError(f'Expected offset {received}.', 409, received)
+            if received + length > upload.size:
+                raise UploadError('Chunk extends past the end of the file.', 400, received)
+
+            written = 0
+            with open(upload.part_path, 'ab') as f:
+                while written < length:
+                    block = stream.read(min(UPLOAD_WRITE_BLOCK_BYTES, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    written += len(block)
+            self._count('chunks')
+            self._count('bytes', written)
+            received += written
+            if written < length:
+                raise UploadError('Chunk ended early; resume from received_bytes.', 400, received)
+
+            if received < upload.size:
+                self._maybe_probe(upload, received)
+                return upload.to_dict()
+            return self._complete(upload)
+        finally:
+            upload.lock.release()
+
+    def _maybe_probe(self, upload, received):
+        """Probes the partial file in the background once it has grown enough since the last probe."""
+        with self._lock:
+            if upload.metadata_stable or upload.probing or received < upload.next_probe_bytes:
+                return
+            upload.probing = True
+            upload.next_probe_bytes = received * UPLOAD_PROBE_GROWTH
+        self._probe_executor.submit(self._probe, upload, received)
+
+    def _probe(self, upload, received):
+        try:
+            metadata = probe_video(upload.part_path)
+            self._count('probes')
+            if metadata is None or metadata['frame_count'] <= 0:
+                return
+            # A frame count that did not change as the file grew was read from the
+            # container header, not estimated from the bytes present so far.
+            stable = upload.metadata is not None and upload.metadata == metadata
+            with self._lock:
+                upload.metadata = metadata
+                upload.metadata_stable = stable
+        except Exception as e:
+            print(f"Could not probe partial upload {upload.part_path} at {received} bytes: {e}")
+        finally:
+            with self._lock:
+                upload.probing = False
+
+    def _complete(self, upload):
+        with open(upload.part_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(upload.part_path, upload.final_path)
+        try:
+            os.remove(upload.manifest_path)
+        except OSError:
+            pass
+        with self._lock:
+            self._uploads.pop(upload.id, None)
+            self._counters['completed'] += 1
+            stable_metadata = upload.metadata if upload.metadata_stable else None
+        if stable_metadata is not None:
+            self._count('metadata_ready_at_completion')
+            metadata = self.video_index.put(upload.final_path, stable_metadata)
+        else:
+            metadata = self.video_index.get(upload.final_path)
+        return {
+            'upload_id': upload.id,
+            'filename': upload.filename,
+            'size': upload.size,
+            'received_bytes': upload.size,
+            'progress': 1.0,
+            'upload_status': UPLOAD_COMPLETE,
+            'path': upload.final_path,
+            'metadata': _public_metadata(metadata),
+        }
+
+    def cancel(self, upload_dir, upload_id):
+        """Deletes an unfinished upload. Returns False if there is no such upload."""
+        upload = self._load(upload_dir, upload_id)
+        if upload is None:
+            return False
+        with upload.lock:
+            for path in (upload.part_path, upload.manifest_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        return True
+
+    def _delete_stale(self, upload_dir):
+        """Deletes unfinished uploads in upload_dir that have not received data for stale_s."""
+        deadline = time.time() - self.stale_s
+        for manifest_path in glob.glob(os.path.join(upload_dir, PARTIAL_DIR, '*.json')):
+            upload = self._load(upload_dir, os.path.basename(manifest_path)[:-5])
+            if upload is None:
+                continue
+            try:
+                last_write = max(os.path.getmtime(path) for path in (upload.part_path, upload.manifest_path)
+                                 if os.path.exists(path))
+            except ValueError:
+                continue
+            if last_write < deadline and not upload.lock.locked():
+                self.cancel(upload_dir, upload.id)
+
+    def stats(self):
+        """Returns upload counters and the number of unfinished uploads in memory."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['active'] = len(self._uploads)
+        return stats
@@ -0,0 +1,190 @@
+# decoder_pool.py
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+# --- Configuration Parameters ---
+DECODER_POOL_MAX_HANDLES = 8         # Open captures kept alive across all sessions
+DECODER_POOL_IDLE_TTL_S = 120.0      # Captures unused for this long are released
+DECODER_POOL_MAX_FORWARD_GRAB = 30   # Forward jumps up to this many frames use grab() instead of a seek
+
+
+class _PooledCapture:
+    """An open capture together with the index of the frame its next read() returns."""
+    __slots__ = ('cap', 'video_path', 'mtime', 'position', 'last_used', 'closed', 'lock')
+
+    def __init__(self, cap, video_path, mtime):
+        self.cap = cap
+        self.video_path = video_path
+        self.mtime = mtime
+        self.position = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+        self.lock = threading.Lock()
+
+
+class DecoderPool:
+    """
+    Keeps cv2.VideoCapture handles open between requests so sequential frame
+    access does not pay for a container open and keyframe seek on every call.
+    Handles are keyed by (session_key, video_path) and evicted LRU/TTL.
+    """
+
+    def __init__(self, max_handles=DECODER_POOL_MAX_HANDLES, idle_ttl_s=DECODER_POOL_IDLE_TTL_S,
+                 max_forward_grab=DECODER_POOL_MAX_FORWARD_GRAB, keyframe_lookup=None):
+        self.max_handles = max_handles
+        self.idle_ttl_s = idle_ttl_s
+        self.max_forward_grab = max_forward_grab
+        # Optional callable video_path -> sorted keyframe indices (or None), used to
+        # seek instead of grabbing when a keyframe lies between position and target.
+        self.keyframe_lookup = keyframe_lookup
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,              # Request served by an already open capture
+            'misses': 0,            # A new capture had to be opened
+            'sequential_reads': 0,  # Requested frame was the capture's next frame
+            'forward_grabs': 0,     # Short forward jump served by grab()
+            'grabbed_frames': 0,    # Frames skipped with grab()
+            'seeks': 0,             # CAP_PROP_POS_FRAMES seeks
+            'evictions': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _acquire(self, key, video_path):
+        """Returns an open entry for key, opening a new capture on a miss."""
+        mtime = os.path.getmtime(video_path)
+        to_release = []
+        with self._lock:
+            to_release.extend(self._expire_locked())
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime != mtime:
+                # The file was replaced on disk; the open handle is stale.
+                to_release.append(self._entries.pop(key))
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+        self._release_entries(to_release)
+        if entry is not None:
+            return entry
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            cap.release()
+            raise IOError("Could not open video file.")
+        entry = _PooledCapture(cap, video_path, mtime)
+
+        to_release = []
+        with self._lock:
+            self._counters['misses'] += 1
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                to_release.append(previous)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_handles:
+                _, oldest = self._entries.popitem(last=False)
+                to_release.append(oldest)
+                self._counters['evictions'] += 1
+        self._release_entries(to_release)
+        return entry
+
+    def _expire_locked(self):
+        """Pops entries idle for longer than the TTL. Caller must hold self._lock."""
+        expired = []
+        deadline = time.monotonic() - self.idle_ttl_s
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.last_used >= deadline:
+                break
+            del self._entries[key]
+            expired.append(entry)
+            self._counters['evictions'] += 1
+        return expired
+
+    @staticmethod
+    def _release_entries(entries):
+        for entry in entries:
+            with entry.lock:
+                entry.closed = True
+                entry.cap.release()
+
+    def read_frame(self, video_path, frame_index, session_key=None):
+        """
+        Reads frame_index from video_path using the cheapest available strategy:
+        a plain read() when it is the next frame, grab() for short forward jumps,
+        and a seek otherwise. Returns (ret, frame) like cv2.VideoCapture.read().
+        Raises IOError if the video cannot be opened.
+        """
+        key = (session_key, video_path)
+        while True:
+            entry = self._acquire(key, video_path)
+            with entry.lock:
+                if entry.closed:
+                    # Evicted between lookup and lock; open it again.
+                    continue
+                ret, frame = self._read_locked(entry, frame_index)
+                entry.last_used = time.monotonic()
+                return ret, frame
+
+    def _read_locked(self, entry, frame_index):
+        cap = entry.cap
+        distance = frame_index - entry.position if entry.position is not None else None
+
+        if distance == 0:
+            self._count('sequential_reads')
+        elif (distance is not None and 0 < distance <= self.max_forward_grab and
+              not self._keyframe_in_between(entry.video_path, entry.position, frame_index)):
+            for _ in range(distance):
+                if not cap.grab():
+                    entry.position = None
+                    return False, None
+            self._count('forward_grabs')
+            self._count('grabbed_frames', distance)
+        else:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            self._count('seeks')
+
+        ret, frame = cap.read()
+        # After a failed read the decoder position is unknown, so force a seek next time.
+        entry.position = frame_index + 1 if ret else None
+        return ret, frame
+
+    def _keyframe_in_between(self, video_path, position, frame_index):
+        """True if seeking would decode fewer frames than grabbing forward from position."""
+        keyframes = self.keyframe_lookup(video_path) if self.keyframe_lookup is not None else None
+        if not keyframes:
+            return False
+        k = bisect.bisect_right(keyframes, frame_index) - 1
+        return k >= 0 and keyframes[k] > position
+
+    def close(self, video_path=None, session_key=None):
+        """Releases every capture matching the given video path and/or session key."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (session_key is None or key[0] == session_key) and
+                   (video_path is None or key[1] == video_path)
+            ]
+            to_release = [self._entries.pop(key) for key in keys]
+        self._release_entries(to_release)
+
+    def close_all(self):
+        """Releases every open capture."""
+        self.close()
+
+    def stats(self):
+        """Returns a snapshot of the pool counters and the number of open handles."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['open_handles'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,218 @@
+# detection_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from detections import Detections, class_names_of
+
+# --- Configuration Parameters ---
+DETECTION_CACHE_MAX_BYTES = 512 * 1024 * 1024   # Detection blobs kept on disk before LRU eviction
+DETECTION_CACHE_EVICT_FRACTION = 0.1            # Extra share of the budget freed per eviction pass
+ACCESS_FLUSH_ROWS = 256                         # Pending last-access updates written in one batch
+ACCESS_FLUSH_INTERVAL_S = 30.0                  # Longest time hits wait before their access time is written
+
+# Columns of the float64 array stored per frame. Detections hold float64 arrays,
+# so the round trip through the cache is lossless whatever precision the model used.
+_COLUMNS = ('x1', 'y1', 'x2', 'y2', 'confidence', 'width', 'height', 'class_id')
+
+
+def file_sha256(path):
+    """Full SHA-256 of a file, used to fingerprint model weights."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    Disk-backed cache of raw per-frame model detections in SQLite, one compact
+    float64 blob per frame. Entries are keyed by the video's SHA-256, frame index,
+    model weights hash, inference backend and the YOLO confidence/IoU thresholds, so a revisited
+    frame skips inference; swarm logic and tracking are re-applied on top.
+    The total blob size is bounded with least-recently-used eviction; access
+    times of hits are written in batches, not on every read.
+    """
+
+    def __init__(self, db_path, model_path, conf_threshold, iou_threshold, max_bytes=DETECTION_CACHE_MAX_BYTES,
+                 backend='torch'):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.model_key = f"{file_sha256(model_path)}:{conf_threshold}:{iou_threshold}"
+        if backend != 'torch':
+            # Exported and quantized models detect slightly differently.
+            self.model_key += f":{backend}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS detections ('
+            ' video_hash TEXT NOT NULL, model_key TEXT NOT NULL, frame_index INTEGER NOT NULL,'
+            ' data BLOB NOT NULL, nbytes INTEGER NOT NULL, last_access REAL NOT NULL,'
+            ' PRIMARY KEY (video_hash, model_key, frame_index))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS detections_last_access ON detections (last_access)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS video_hashes ('
+            ' path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, content_hash TEXT NOT NULL)'
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM detections').fetchone()[0]
+        self._video_hashes = {}  # path -> (mtime_ns, size, content hash)
+        # (video hash, model key, frame index) -> access time of hits not written yet. Written
+        # with the next store or in batches, so a hit does not commit to disk.
+        self._pending_access = {}
+        self._last_access_flush = time.monotonic()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted_frames': 0, 'unusable': 0}
+
+    def _video_hash(self, video_path):
+        """
+        SHA-256 of the whole video. Any edit changes it, even one that keeps the
+        size, and the same recording uploaded twice shares cache entries. The
+        file is read once per version (mtime and size); the hash is stored.
+        """
+        stat = os.stat(video_path)
+        cached = self._video_hashes.get(video_path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        with self._lock:
+            row = self._conn.execute('SELECT mtime_ns, size, content_hash FROM video_hashes WHERE path = ?',
+                                     (video_path,)).fetchone()
+        if row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            content_hash = row[2]
+        else:
+            content_hash = file_sha256(video_path)
+            with self._lock:
+                self._conn.execute('INSERT OR REPLACE INTO video_hashes (path, mtime_ns, size, content_hash)'
+                                   ' VALUES (?, ?, ?, ?)', (video_path, stat.st_mtime_ns, stat.st_size, content_hash))
+                self._conn.commit()
+        self._video_hashes[video_path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
+
+    @staticmethod
+    def _encode(raw_detections, class_names):
+        """The blob of a frame's detections. Raises KeyError if a class is not in class_names."""
+        detections = Detections.coerce(raw_detections)
+        data = np.column_stack([detections.boxes, detections.confidence, detections.sizes,
+                                detections.model_class_ids(class_names)]).astype(np.float64)
+        return data.reshape(len(detections), len(_COLUMNS)).tobytes()
+
+    @staticmethod
+    def _decode(blob, class_names):
+        """The Detections of a blob, or None if a stored class ID is not in class_names."""
+        data = np.frombuffer(blob, dtype=np.float64).reshape(-1, len(_COLUMNS))
+        names = class_names_of(class_names)
+        class_ids = data[:, 7].astype(np.int64)
+        if len(class_ids) and (class_ids.min() < 0 or class_ids.max() >= len(names)):
+            return None
+        return Detections(data[:, :4], data[:, 4], data[:, 5:7], class_ids, names)
+
+    def _flush_access_locked(self):
+        """Writes the pending last-access times. Caller holds self._lock and commits."""
+        if self._pending_access:
+            self._conn.executemany(
+                'UPDATE detections SET last_access = ? WHERE video_hash = ? AND model_key = ? AND frame_index = ?',
+                [(accessed, *key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.monotonic()
+
+    def get_many(self, video_path, frame_indices, class_names):
+        """
+        Returns {frame_index: raw Detections} for the cached frames among
+        frame_indices, read straight from the stored arrays.
+        """
+        frame_indices = list(frame_indices)
+        if not frame_indices:
+            return {}
+        video_hash = self._video_hash(video_path)
+        placeholders = ','.join('?' * len(frame_indices))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT frame_index, data FROM detections WHERE video_hash = ? AND model_key = ?'
+                f' AND frame_index IN ({placeholders})',
+                [video_hash, self.model_key, *frame_indices]
+            ).fetchall()
+            found = {}
+            now = time.time()
+            for frame_index, blob in rows:
+                detections = self._decode(blob, class_names)
+                if detections is None:
+                    self._counters['unusable'] += 1
+                    continue
+                found[frame_index] = detections
+                self._pending_access[(video_hash, self.model_key, frame_index)] = now
+            if found and (len(self._pending_access) >= ACCESS_FLUSH_ROWS or
+                          time.monotonic() - self._last_access_flush >= ACCESS_FLUSH_INTERVAL_S):
+                self._flush_access_locked()
+                self._conn.commit()
+            self._counters['hits'] += len(found)
+            self._counters['misses'] += len(frame_indices) - len(found)
+        return found
+
+    def get(self, video_path, frame_index, class_names):
+        """Returns the cached raw Detections of one frame, or None on a miss."""
+        return self.get_many(video_path, [frame_index], class_names).get(frame_index)
+
+    def put(self, video_path, frame_index, raw_detections, class_names):
+        """
+        Stores the raw Detections (or detection dicts) of one frame, before any
+        swarm re-labeling. Frames with a class the model does not name are not stored.
+        """
+        try:
+            blob = self._encode(raw_detections, class_names)
+        except KeyError as e:
+            print(f"Not caching frame {frame_index} of {video_path}: {e}")
+            with self._lock:
+                self._counters['unusable'] += 1
+            return
+        video_hash = self._video_hash(video_path)
+        with self._lock:
+            previous = self._conn.execute(
+                'SELECT nbytes FROM detections WHERE video_hash = ? AND model_key = ? AND frame_index = ?',
+                (video_hash, self.model_key, frame_index)
+            ).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO detections (video_hash, model_key, frame_index, data, nbytes, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (video_hash, self.model_key, frame_index, blob, len(blob), time.time())
+            )
+            self._total_bytes += len(blob) - (previous[0] if previous else 0)
+            self._counters['stores'] += 1
+            self._pending_access.pop((video_hash, self.model_key, frame_index), None)
+            # Access times go out with this commit, and before eviction so it sees them.
+            self._flush_access_locked()
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """Deletes least recently used frames until the cache is below its budget."""
+        target = self.max_bytes * (1 - DETECTION_CACHE_EVICT_FRACTION)
+        freed = 0
+        rows = self._conn.execute(
+            'SELECT rowid, nbytes FROM detections ORDER BY last_access'
+        )
+        doomed = []
+        for rowid, nbytes in rows:
+            if self._total_bytes - freed <= target:
+                break
+            doomed.append((rowid,))
+            freed += nbytes
+        self._conn.executemany('DELETE FROM detections WHERE rowid = ?', doomed)
+        self._total_bytes -= freed
+        self._counters['evicted_frames'] += len(doomed)
+
+    def stats(self):
+        """Returns hit/miss counters and the cache size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['bytes'] = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
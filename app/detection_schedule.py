@@ -0,0 +1,69 @@
+# detection_schedule.py
+import math
+
+from detector import TRACKING_FRAMES_TO_LOOK_BACK
+
+# --- Configuration Parameters ---
+# Longest gap between detections. A bird missed by one detection is then unseen
+# for at most this many frames, and must still be matchable within the
+# tracker's look-back window afterwards.
+DETECT_EVERY_MAX_K = max(1, TRACKING_FRAMES_TO_LOOK_BACK - 1)
+DETECT_EVERY_MAX_DRIFT = 0.5   # Box-size fraction a bird may move between detections in adaptive mode
+
+
+class DetectionSchedule:
+    """
+    Decides which frames of a sequential pass are sent to the model. In between,
+    Tracker.predict() moves the tracks along their velocity. With a fixed k,
+    every k-th frame is detected (k is capped at max_k). In adaptive mode
+    (k=None), k follows scene motion: after each detection it is set so that
+    the fastest visible track moves at most max_drift of its box size before
+    the next detection. Any non-sequential access (a seek) is always detected.
+    """
+
+    def __init__(self, k=None, max_k=DETECT_EVERY_MAX_K, max_drift=DETECT_EVERY_MAX_DRIFT):
+        self.fixed_k = min(max(1, int(k)), max_k) if k else None
+        self.max_k = max_k
+        self.max_drift = max_drift
+        self.k = self.fixed_k or 1
+        self._next_detection = None
+        self._last_index = None
+        self.counters = {'detected': 0, 'predicted': 0}
+
+    def should_detect(self, frame_index):
+        """True if frame_index has to be sent to the model."""
+        sequential = self._last_index is not None and frame_index == self._last_index + 1
+        self._last_index = frame_index
+        detect = not sequential or self._next_detection is None or frame_index >= self._next_detection
+        self.counters['detected' if detect else 'predicted'] += 1
+        return detect
+
+    def planned_detection(self, frame_index):
+        """
+        True if sequential playback will send frame_index to the model, as far
+        as is known now; does not change the schedule. In adaptive mode only
+        the next detection is known, since k is picked again after each one.
+        Used to run read-ahead inference only on frames that will use it.
+        """
+        next_detection = self._next_detection
+        if next_detection is None or frame_index < next_detection:
+            return False
+        if self.fixed_k is not None:
+            return (frame_index - next_detection) % self.k == 0
+        return frame_index == next_detection
+
+    def detected(self, frame_index, tracker):
+        """Records a detection at frame_index and picks the next detection frame."""
+        if self.fixed_k is None:
+            speed = tracker.max_relative_speed()
+            self.k = self.max_k if speed <= 0 else max(1, min(self.max_k, math.floor(self.max_drift / speed)))
+        self._next_detection = frame_index + self.k
+
+    def stats(self):
+        """Returns detected/predicted frame counts and the current k."""
+        stats = dict(self.counters)
+        stats['k'] = self.k
+        stats['adaptive'] = self.fixed_k is None
+        total = stats['detected'] + stats['predicted']
+        stats['inference_saved'] = stats['predicted'] / total if total else 0.0
+        return stats
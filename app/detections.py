@@ -0,0 +1,155 @@
+# detections.py
+import numpy as np
+
+
+def class_names_of(names):
+    """
+    Model class names (the model's dict of class ID -> name, or a sequence) as
+    a tuple of lowercase names indexed by class ID.
+    """
+    if isinstance(names, dict):
+        table = [''] * (max(names) + 1 if names else 0)
+        for class_id, name in names.items():
+            table[int(class_id)] = str(name).lower()
+        return tuple(table)
+    return tuple(str(name).lower() for name in names)
+
+
+def _as_array(values, dtype):
+    """A tensor (e.g. an ultralytics Boxes column, possibly on the GPU) or array-like as a NumPy array."""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=dtype)
+
+
+class Detections:
+    """
+    The raw detections of one frame as parallel NumPy arrays: xyxy boxes (N, 4),
+    confidences, box widths and heights (N, 2) and class IDs into a table of
+    lowercase class names. The arrays are never modified in place, so a
+    Detections can be shared (cache, motion gate reference, prefetch buffer)
+    without copying. For code that expects the raw detection dicts, it also
+    behaves as a sequence of them; the dicts are built only when asked for.
+    """
+    __slots__ = ('boxes', 'confidence', 'sizes', 'class_ids', 'names', '_geometric_mean')
+
+    def __init__(self, boxes, confidence, sizes, class_ids, names, geometric_mean=None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float64).reshape(-1)
+        self.sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 2)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.names = names
+        self._geometric_mean = geometric_mean
+
+    @classmethod
+    def empty(cls, names=()):
+        return cls(np.empty((0, 4)), np.empty(0), np.empty((0, 2)), np.empty(0, dtype=np.int64),
+                   class_names_of(names))
+
+    @classmethod
+    def from_result(cls, result, names):
+        """Reads an ultralytics result's box columns in bulk; names is the model's names dict."""
+        boxes = result.boxes
+        return cls(_as_array(boxes.xyxy, np.float64), _as_array(boxes.conf, np.float64),
+                   _as_array(boxes.xywh, np.float64).reshape(-1, 4)[:, 2:4], _as_array(boxes.cls, np.int64),
+                   class_names_of(names))
+
+    @classmethod
+    def from_dicts(cls, raw_detections):
+        """Builds the arrays from raw detection dicts."""
+        names = []
+        codes = {}
+        class_ids = []
+        for det in raw_detections:
+            code = codes.get(det['class'])
+            if code is None:
+                code = codes[det['class']] = len(names)
+                names.append(det['class'])
+            class_ids.append(code)
+        return cls([det['bbox'] for det in raw_detections], [det['confidence'] for det in raw_detections],
+                   [(det['bbox_width_pixels'], det['bbox_height_pixels']) for det in raw_detections],
+                   class_ids, tuple(names))
+
+    @classmethod
+    def coerce(cls, raw_detections):
+        """Returns raw_detections as a Detections, converting a list of dicts."""
+        if isinstance(raw_detections, cls):
+            return raw_detections
+        return cls.from_dicts(raw_detections)
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    def __getitem__(self, index):
+        return self.take(np.array([index], dtype=np.int64)).to_dicts()[0]
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __eq__(self, other):
+        if not isinstance(other, Detections):
+            return NotImplemented
+        return (np.array_equal(self.boxes, other.boxes) and np.array_equal(self.confidence, other.confidence) and
+                np.array_equal(self.sizes, other.sizes) and self.class_name_list() == other.class_name_list())
+
+    __hash__ = None
+
+    @property
+    def geometric_mean(self):
+        """sqrt(width * height) of every box; 0 for boxes without area."""
+        if self._geometric_mean is None:
+            width, height = self.sizes[:, 0], self.sizes[:, 1]
+            valid = (width > 0) & (height > 0)
+            self._geometric_mean = np.where(valid, np.sqrt(np.where(valid, width * height, 0.0)), 0.0)
+        return self._geometric_mean
+
+    def class_name_list(self):
+        """The class name of every detection."""
+        return [self.names[class_id] for class_id in self.class_ids.tolist()]
+
+    def model_class_ids(self, names):
+        """Class IDs in the model's names dict. Raises KeyError if a detected class is not there."""
+        table = class_names_of(names)
+        if table == self.names:
+            return self.class_ids
+        ids = {name: class_id for class_id, name in enumerate(table)}
+        used = np.unique(self.class_ids).tolist()
+        missing = [self.names[code] for code in used if self.names[code] not in ids]
+        if missing:
+            raise KeyError(f"Classes not in the model's names: {', '.join(missing)}")
+        lookup = np.zeros(len(self.names), dtype=np.int64)
+        for code in used:
+            lookup[code] = ids[self.names[code]]
+        return lookup[self.class_ids]
+
+    def take(self, rows):
+        """The detections at rows (an index array or boolean mask), in that order."""
+        return Detections(self.boxes[rows], self.confidence[rows], self.sizes[rows], self.class_ids[rows], self.names,
+                          None if self._geometric_mean is None else self._geometric_mean[rows])
+
+    def relabeled(self, rows, class_id):
+        """A copy in which the detections at rows have class_id."""
+        class_ids = self.class_ids.copy()
+        class_ids[rows] = class_id
+        return Detections(self.boxes, self.confidence, self.sizes, class_ids, self.names, self._geometric_mean)
+
+    def shifted(self, dx, dy):
+        """A copy with every box moved by (dx, dy), e.g. from crop to frame coordinates."""
+        return Detections(self.boxes + np.array([dx, dy, dx, dy], dtype=np.float64), self.confidence, self.sizes,
+                          self.class_ids, self.names, self._geometric_mean)
+
+    def to_dicts(self):
+        """The raw detection dicts, including each box's geometric mean."""
+        return [
+            {
+                'bbox': bbox,
+                'class': class_name,
+                'confidence': confidence,
+                'bbox_width_pixels': width,
+                'bbox_height_pixels': height,
+                'geometric_mean': geometric_mean,
+            }
+            for bbox, class_name, confidence, (width, height), geometric_mean in zip(
+                self.boxes.tolist(), self.class_name_list(), self.confidence.tolist(), self.sizes.tolist(),
+                self.geometric_mean.tolist())
+        ]
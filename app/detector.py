@@ -1,9 +1,15 @@
 # detector.py
 import cv2
+import numpy as np
 from ultralytics import YOLO
-import math
 import os
 import base64
+import threading
+import uuid
+
+from detections import Detections
+from metrics import span
+from tracker import TrackedFrame, Tracker
 
 # --- Configuration Parameters from interface.py ---
 YOLO_MODEL_CONF_THRESHOLD = 0.04
@@ -11,22 +17,44 @@ YOLO_MODEL_IOU_THRESHOLD = 0.5
 CODE_DETECTION_CONF_THRESHOLD = 0.25
 TRACKING_IOU_THRESHOLD = 0.03
 TRACKING_FRAMES_TO_LOOK_BACK = 5
+TRACKER_MATCHING_MODE = 'compat' # 'compat' (original IDs), 'greedy' or 'hungarian'
+TRACK_SIZE_HISTORY_LENGTH = 30 # Recent bbox sizes kept per track (ring buffer)
 MIN_BBOX_GEOMETRIC_MEAN = 10
 N_SAME_FOR_SWARM = 4
 N_BULK_FOR_SWARM = 8 # New parameter for bulk re-labeling
 SWARM_CONF_THRESHOLD = 0.40
+DETECTION_BATCH_SIZE = 8 # Frames per model call in batched inference (analysis, offline jobs)
 
 # Reference values for distance estimation
 SEAGULL_REF_BBOX_GEOMETRIC_MEAN_PIXELS = 42
 SEAGULL_REF_DISTANCE_M = 40.0
 
+# Encoding of annotated frames
+FRAME_IMAGE_FORMATS = ('jpeg', 'webp')
+FRAME_JPEG_QUALITY = 95 # OpenCV's default, used when no quality is requested
+FRAME_WEBP_QUALITY = 80
+
 # --- Model Initialization ---
-def load_model_and_wingspans(model_path, wingspans_file):
-    """Loads the YOLO model and wingspan data."""
-    model = None
-    average_wingspans_m = {}
+# The ultralytics predictor keeps per-call state, so calls into the same model
+# from request threads and background workers are serialized.
+_inference_lock = threading.Lock()
 
-    # Load Model
+def load_model(model_path, backend='torch', int8=False, calibration=None):
+    """
+    Loads the YOLO model. The 'torch' backend runs the weights on the GPU if
+    one is available. 'onnx' and 'openvino' run an exported (and with int8,
+    quantized) copy on the CPU, see backends.py; if the export fails, the
+    PyTorch weights are used instead. Returns None on failure.
+    """
+    if backend != 'torch':
+        try:
+            from backends import backend_key, load_backend_model
+            print(f"Loading {backend_key(backend, int8)} backend for {model_path}...")
+            model = load_backend_model(model_path, backend, int8, calibration)
+            print(f"Model loaded successfully with the {backend_key(backend, int8)} backend.")
+            return model
+        except Exception as e:
+            print(f"Error loading {backend} backend, falling back to PyTorch: {e}")
     try:
         print(f"Loading YOLO model from {model_path}...")
         # This import is here to avoid a circular dependency if it were at the top level
@@ -34,10 +62,14 @@ def load_model_and_wingspans(model_path, wingspans_file):
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
         model = YOLO(model_path).to(device)
         print(f"Model loaded successfully on '{device}'.")
+        return model
     except Exception as e:
         print(f"Error loading YOLO model: {e}")
+        return None
 
-    # Load Wingspans
+def load_wingspans(wingspans_file):
+    """Loads the average wingspan of each bird class, converted to meters."""
+    average_wingspans_m = {}
     if os.path.exists(wingspans_file):
         with open(wingspans_file, 'r') as f:
             for line in f:
@@ -52,8 +84,11 @@ def load_model_and_wingspans(model_path, wingspans_file):
         print(f"Loaded and converted wingspans (in meters): {average_wingspans_m}")
     else:
         print(f"Wingspans file not found at {wingspans_file}. Distance estimation will be disabled.")
+    return average_wingspans_m
 
-    return model, average_wingspans_m
+def load_model_and_wingspans(model_path, wingspans_file, backend='torch', int8=False, calibration=None):
+    """Loads the YOLO model (with the given inference backend) and wingspan data."""
+    return load_model(model_path, backend, int8, calibration), load_wingspans(wingspans_file)
 
 def get_video_total_frames(video_path):
     """Gets the total number of frames in a video file."""
@@ -74,33 +109,86 @@ def get_video_total_frames(video_path):
         if 'cap' in locals() and cap.isOpened():
             cap.release()
 
-def run_detection_on_frame(frame, model):
-    """Runs bird detection and processes results."""
+def _parse_detection_result(result, model):
+    """Converts one ultralytics result into the raw Detections used by the pipeline."""
+    return Detections.from_result(result, model.names)
+
+def run_detection_on_frame(frame, model, imgsz=None):
+    """
+    Runs bird detection and returns the frame's raw Detections. imgsz overrides
+    the model input size, e.g. to run a small crop at the scale of a full frame.
+    """
     if model is None:
-        return []
+        return Detections.empty()
     try:
-        results = model(frame, conf=YOLO_MODEL_CONF_THRESHOLD, iou=YOLO_MODEL_IOU_THRESHOLD)
-        raw_detections = []
-        for r in results:
-            for box in r.boxes:
-                raw_detections.append({
-                    'bbox': box.xyxy[0].tolist(),
-                    'class': model.names[int(box.cls)].lower(),
-                    'confidence': float(box.conf),
-                    'bbox_width_pixels': float(box.xywh[0][2]),
-                    'bbox_height_pixels': float(box.xywh[0][3])
-                })
-        return raw_detections
+        if hasattr(model, 'detect_frames'):
+            # A remote model (inference server client) returns parsed detections.
+            with span('inference'):
+                return model.detect_frames([frame], imgsz=imgsz)[0]
+        options = {'imgsz': imgsz} if imgsz else {}
+        with _inference_lock, span('inference'):
+            results = model(frame, conf=YOLO_MODEL_CONF_THRESHOLD, iou=YOLO_MODEL_IOU_THRESHOLD, **options)
+        return _parse_detection_result(results[0], model)
     except Exception as e:
         print(f"Error during raw detection on frame: {e}")
-        return []
+        return Detections.empty(model.names)
 
-def annotate_frame(frame, detections_for_annotation):
-    """Overlays annotations onto a video frame."""
+def run_detection_on_batch(frames, model, batch_size=DETECTION_BATCH_SIZE, on_detected=None, imgsz=None):
+    """
+    Runs bird detection on several frames, feeding the model up to batch_size
+    frames per call. Returns the raw Detections of every frame, as
+    run_detection_on_frame does. If given, on_detected(position, raw_detections)
+    is called for every frame whose model call succeeded. imgsz overrides the
+    model input size as in run_detection_on_frame.
+    """
+    if model is None:
+        return [Detections.empty() for _ in frames]
+    batch_size = max(1, int(batch_size))
+    all_detections = []
+    for batch_start in range(0, len(frames), batch_size):
+        batch = list(frames[batch_start:batch_start + batch_size])
+        try:
+            if hasattr(model, 'detect_frames'):
+                with span('inference'):
+                    batch_detections = model.detect_frames(batch, imgsz=imgsz)
+            else:
+                options = {'imgsz': imgsz} if imgsz else {}
+                with _inference_lock, span('inference'):
+                    results = model(batch, conf=YOLO_MODEL_CONF_THRESHOLD, iou=YOLO_MODEL_IOU_THRESHOLD, **options)
+                batch_detections = [_parse_detection_result(r, model) for r in results]
+        except Exception as e:
+            print(f"Error during raw detection on batch: {e}")
+            all_detections.extend(Detections.empty(model.names) for _ in batch)
+            continue
+        if on_detected is not None:
+            for offset, raw_detections in enumerate(batch_detections):
+                on_detected(batch_start + offset, raw_detections)
+        all_detections.extend(batch_detections)
+    return all_detections
+
+def run_detection_with_cache(video_path, frame_indices, frames, model, detection_cache=None,
+                             batch_size=DETECTION_BATCH_SIZE):
+    """
+    Batched detection for frames of one video whose results are written to the
+    detection cache. Failed model calls are not cached.
+    """
+    if detection_cache is None:
+        return run_detection_on_batch(frames, model, batch_size)
+
+    def store(position, raw_detections):
+        detection_cache.put(video_path, frame_indices[position], raw_detections, model.names)
+
+    return run_detection_on_batch(frames, model, batch_size, on_detected=store)
+
+def annotate_frame(frame, detections_for_annotation, scale=1.0):
+    """
+    Overlays annotations onto a video frame. Boxes are given in original frame
+    coordinates and multiplied by scale when drawing on a resized frame.
+    """
     annotated_frame = frame.copy()
     for detection in detections_for_annotation:
         bbox = detection['bbox']
-        x1, y1, x2, y2 = [int(coord) for coord in bbox]
+        x1, y1, x2, y2 = [int(coord * scale) for coord in bbox]
         cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
 
         label_lines = []
@@ -130,6 +218,36 @@ def annotate_frame(frame, detections_for_annotation):
 
     return annotated_frame
 
+def encode_frame(frame, image_format='jpeg', quality=None):
+    """Encodes a frame as JPEG or WebP and returns the raw bytes."""
+    if image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality or FRAME_WEBP_QUALITY)]
+        ok, buffer = cv2.imencode('.webp', frame, params)
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality or FRAME_JPEG_QUALITY)]
+        ok, buffer = cv2.imencode('.jpg', frame, params)
+    if not ok:
+        raise ValueError(f"Could not encode frame as {image_format}.")
+    return buffer.tobytes()
+
+def render_annotated_frame(frame, detections_for_annotation, image_format='jpeg', quality=None, max_width=None,
+                           source_width=None):
+    """
+    Draws the detections and encodes the result. Frames wider than max_width are
+    downscaled before drawing, so a preview costs less to annotate and encode.
+    source_width is the width the detection boxes refer to when frame is a
+    smaller proxy of the detected frame.
+    """
+    height, width = frame.shape[:2]
+    with span('annotate'):
+        if max_width and width > max_width:
+            frame = cv2.resize(frame, (int(max_width), max(1, round(height * max_width / width))),
+                               interpolation=cv2.INTER_AREA)
+        scale = frame.shape[1] / (source_width or width)
+        annotated_frame = annotate_frame(frame, detections_for_annotation, scale)
+    with span('encode'):
+        return encode_frame(annotated_frame, image_format, quality)
+
 def calculate_iou(box1, box2):
     """Calculates the Intersection over Union (IoU) of two bounding boxes."""
     x_inter1 = max(box1[0], box2[0])
@@ -143,90 +261,109 @@ def calculate_iou(box1, box2):
     iou = inter_area / union_area if union_area > 0 else 0
     return iou
 
-def process_video_frame_with_tracking(video_path, frame_index, model, average_wingspans_m, tracking_state):
+def read_video_frame(video_path, frame_index, decoder_pool=None, session_key=None):
     """
-    Main processing function that reads a frame, detects, tracks, estimates distance,
-    and annotates.
+    Reads a single frame. Uses the decoder pool when one is given so that open
+    captures are reused; otherwise opens, seeks and releases a capture.
+    Returns (frame, error_message).
     """
-    if model is None:
-        return None, [], tracking_state, "Model is not loaded."
+    with span('decode'):
+        return _read_video_frame(video_path, frame_index, decoder_pool, session_key)
+
+def _read_video_frame(video_path, frame_index, decoder_pool, session_key):
+    if decoder_pool is not None:
+        try:
+            ret, frame = decoder_pool.read_frame(video_path, frame_index, session_key=session_key)
+        except IOError:
+            return None, "Could not open video file."
+    else:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None, "Could not open video file."
 
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return None, [], tracking_state, "Could not open video file."
-
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-    ret, frame = cap.read()
-    cap.release()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        ret, frame = cap.read()
+        cap.release()
 
     if not ret:
-        return None, [], tracking_state, f"Could not read frame at index {frame_index}."
+        return None, f"Could not read frame at index {frame_index}."
+    return frame, None
 
-    # --- Raw Detection ---
-    raw_detections_from_model = run_detection_on_frame(frame, model)
+def apply_swarm_logic(raw_detections_from_model):
+    """
+    Applies base confidence filtering and the swarm re-labeling rules to the raw
+    model detections (Detections, or a list of raw detection dicts). Returns
+    the Detections that should be tracked; the input is left unchanged.
+    """
+    detections = Detections.coerce(raw_detections_from_model)
+    confidence = detections.confidence
+    geometric_mean = detections.geometric_mean
 
     # --- Base Filtering ---
     # Start with all detections that meet the basic confidence threshold.
     # This ensures we don't lose valid detections due to swarm logic.
-    base_detections = [det for det in raw_detections_from_model if det['confidence'] >= CODE_DETECTION_CONF_THRESHOLD]
+    base = confidence >= CODE_DETECTION_CONF_THRESHOLD
 
     # --- Conditional Filtering (Swarm Logic) ---
-    core_detections = []
-    swarm_candidates = []
-    core_detection_counts_by_type = {}
-
-    for det in raw_detections_from_model:
-        bbox_width = det['bbox_width_pixels']
-        bbox_height = det['bbox_height_pixels']
-        geometric_mean = math.sqrt(bbox_width * bbox_height) if bbox_width > 0 and bbox_height > 0 else 0
-        det['geometric_mean'] = geometric_mean
-        confidence = det['confidence']
-
-        # A detection is "core" if it's both large enough AND confident enough.
-        if geometric_mean >= MIN_BBOX_GEOMETRIC_MEAN and confidence >= CODE_DETECTION_CONF_THRESHOLD:
-            core_detections.append(det)
-            bird_type = det['class']
-            core_detection_counts_by_type[bird_type] = core_detection_counts_by_type.get(bird_type, 0) + 1
-        else:
-            # Otherwise, it's a candidate to be included if a swarm is detected.
-            swarm_candidates.append(det)
+    # A detection is "core" if it's both large enough AND confident enough.
+    # Otherwise, it's a candidate to be included if a swarm is detected.
+    core = (geometric_mean >= MIN_BBOX_GEOMETRIC_MEAN) & base
+    core_class_ids = detections.class_ids[core]
+    counts = np.bincount(core_class_ids, minlength=len(detections.names))
+    # Classes numerous enough for a swarm, in the order they first appear among the core detections.
+    swarm_classes = np.nonzero(counts >= min(N_SAME_FOR_SWARM, N_BULK_FOR_SWARM))[0].tolist()
+    swarm_classes.sort(key=lambda class_id: int(np.argmax(core_class_ids == class_id)))
+    core_detection_counts_by_type = [(class_id, int(counts[class_id])) for class_id in swarm_classes]
 
     # --- Swarm Logic: Check for bulk swarm first, then normal swarm ---
     bulk_swarm_class = None
-    # Find the most numerous core bird type
-    for bird_type, count in core_detection_counts_by_type.items():
+    for class_id, count in core_detection_counts_by_type:
         # If a class meets the bulk threshold AND it's not 'unknown_bird', it triggers the rule.
-        if count >= N_BULK_FOR_SWARM and bird_type != 'unknown_bird':
-            bulk_swarm_class = bird_type
+        if count >= N_BULK_FOR_SWARM and detections.names[class_id] != 'unknown_bird':
+            bulk_swarm_class = class_id
             # We take the first valid class that triggers the rule.
             break
 
-    if bulk_swarm_class:
+    if bulk_swarm_class is not None:
         # Bulk Swarm Rule: Re-label ALL original detections to the dominant class.
         # This is an aggressive override.
-        for det in raw_detections_from_model:
-            det['class'] = bulk_swarm_class
-        detections_for_tracking = raw_detections_from_model
-    else:
-        # If no bulk swarm, start with our baseline good-confidence detections.
-        detections_for_tracking = base_detections.copy()
-        # Then, check for a normal swarm to ADD more detections.
-        normal_swarm_class = None
-        for bird_type, count in core_detection_counts_by_type.items():
-            if count >= N_SAME_FOR_SWARM:
-                normal_swarm_class = bird_type
-                break
-
-        if normal_swarm_class:
-            # If a swarm is detected, add the low-confidence candidates back in,
-            # but re-label them to match the swarm.
-            for candidate in swarm_candidates:
-                candidate['class'] = normal_swarm_class
-            detections_for_tracking.extend(swarm_candidates)
-
-    # The list `detections_for_tracking` now contains all the detections we want to process.
-
-    # --- Object Tracking Logic ---
+        return detections.relabeled(slice(None), bulk_swarm_class)
+
+    # If no bulk swarm, start with our baseline good-confidence detections.
+    # Then, check for a normal swarm to ADD more detections.
+    normal_swarm_class = None
+    for class_id, count in core_detection_counts_by_type:
+        if count >= N_SAME_FOR_SWARM:
+            normal_swarm_class = class_id
+            break
+
+    if normal_swarm_class is None:
+        return detections.take(np.nonzero(base)[0])
+
+    # If a swarm is detected, add the low-confidence candidates back in, but
+    # re-label them to match the swarm. Confident boxes that are too small to be
+    # core are both base detections and candidates, so they are tracked twice,
+    # and both times with the swarm's class.
+    candidates = np.nonzero(~core)[0]
+    rows = np.concatenate([np.nonzero(base)[0], candidates])
+    return detections.relabeled(candidates, normal_swarm_class).take(rows)
+
+def new_tracking_state(matching=TRACKER_MATCHING_MODE):
+    """Creates an empty tracking state for a video session."""
+    return Tracker(TRACKING_IOU_THRESHOLD, TRACKING_FRAMES_TO_LOOK_BACK, matching=matching,
+                   history_length=TRACK_SIZE_HISTORY_LENGTH)
+
+def update_tracking_state(detections_for_tracking, tracking_state, frame_index):
+    """
+    Matches the frame's detections against the tracking state, creates new tracks,
+    drops stale ones, and returns the tracked detections visible in this frame.
+    A Tracker is updated with vectorized matching; a plain dict state is still
+    handled by the original per-pair loop.
+    """
+    if isinstance(tracking_state, Tracker):
+        return tracking_state.update(detections_for_tracking, frame_index)
+
+    detections_for_tracking = list(detections_for_tracking)
     current_frame_tracking_updates = {}
     matched_detections_indices = set()
 
@@ -307,8 +444,13 @@ def process_video_frame_with_tracking(video_path, frame_index, model, average_wi
     detections_for_annotation = [
         info for info in current_frame_tracking_updates.values() if info.get('is_visible', False)
     ]
+    return detections_for_annotation
 
-    # --- Distance Estimation ---
+def estimate_distances(detections_for_annotation, average_wingspans_m):
+    """
+    Adds a seagull-referenced 'distance_m' estimate to each tracked detection.
+    A TrackedFrame gets the whole distance column in one vectorized step.
+    """
     perform_distance_estimation = (
         average_wingspans_m and 'seagull' in average_wingspans_m and
         SEAGULL_REF_BBOX_GEOMETRIC_MEAN_PIXELS > 0 and
@@ -317,6 +459,20 @@ def process_video_frame_with_tracking(video_path, frame_index, model, average_wi
 
     if perform_distance_estimation:
         seagull_ref_wingspan_m = average_wingspans_m['seagull']
+        if isinstance(detections_for_annotation, TrackedFrame):
+            tracked = detections_for_annotation
+            # Wingspan of every class code; 0 for birds without a known wingspan.
+            class_wingspans_m = np.array([average_wingspans_m.get(name, 0.0) for name in tracked.class_table] or [0.0],
+                                         dtype=np.float64)
+            bird_real_wingspan_m = class_wingspans_m[tracked.class_codes]
+            max_geometric_mean_pixels = tracked.max_gm
+            valid = (max_geometric_mean_pixels > 0) & (bird_real_wingspan_m > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                estimated_distance_m = (bird_real_wingspan_m / seagull_ref_wingspan_m) * \
+                                       (SEAGULL_REF_BBOX_GEOMETRIC_MEAN_PIXELS / max_geometric_mean_pixels) * \
+                                       SEAGULL_REF_DISTANCE_M
+            tracked.set_distances(np.where(valid, estimated_distance_m, tracked.distance))
+            return
         for det_info in detections_for_annotation:
             bird_name = det_info['class']
             if bird_name in average_wingspans_m:
@@ -329,13 +485,27 @@ def process_video_frame_with_tracking(video_path, frame_index, model, average_wi
                                           SEAGULL_REF_DISTANCE_M
                     det_info['distance_m'] = estimated_distance_m
 
-    # --- Annotation and Encoding ---
-    annotated_frame = annotate_frame(frame, detections_for_annotation)
-
-    _, buffer = cv2.imencode('.jpg', annotated_frame)
-    encoded_frame = base64.b64encode(buffer).decode('utf-8')
+def build_frontend_detections(detections_for_annotation):
+    """
+    Converts tracked detections into the JSON-friendly list sent to the frontend.
+    This is where the columns of a TrackedFrame become dicts.
+    """
+    if isinstance(detections_for_annotation, TrackedFrame):
+        tracked = detections_for_annotation
+        return [
+            {
+                "class": class_name,
+                "confidence": confidence,
+                "tracked_id": tracked_id,
+                "distance_m": distance_m,
+                "visibility_count": visibility_count,
+                "box": box
+            }
+            for class_name, confidence, tracked_id, distance_m, visibility_count, box in zip(
+                tracked.class_name_list(), tracked.confidence.tolist(), tracked.ids.tolist(),
+                tracked.distance_list(), tracked.visibility.tolist(), tracked.boxes.tolist())
+        ]
 
-    # Prepare detection list for frontend
     frontend_detections = []
     for det in detections_for_annotation:
         frontend_detections.append({
@@ -347,13 +517,151 @@ def process_video_frame_with_tracking(video_path, frame_index, model, average_wi
             "box": det.get('bbox')
         })
 
+    return frontend_detections
+
+def process_video_frame_with_tracking(video_path, frame_index, model, average_wingspans_m, tracking_state,
+                                      decoder_pool=None, session_key=None, frame=None, raw_detections=None,
+                                      output_format='base64', image_format='jpeg', image_quality=None,
+                                      max_width=None, detection_cache=None, motion_gate=None,
+                                      detection_schedule=None, preview_source=None):
+    """
+    Main processing function that reads a frame, detects, tracks, estimates distance,
+    and annotates. A frame and its raw detections that were already produced
+    (e.g. by the prefetcher) can be passed in to skip decoding and inference.
+    With a detection cache, raw detections of previously seen frames are reused
+    and new ones are stored; a cached frame is not even decoded when output_format
+    is 'none'. With a motion gate (motion.MotionGate), frames without motion
+    reuse the previous detections and small motion regions are detected on a
+    crop. With a detection schedule (detection_schedule.DetectionSchedule), only
+    scheduled frames are detected and the Tracker predicts the others.
+    preview_source is an optional (proxy video path, proxy frame index, source
+    width) of a low-resolution proxy; when detection does not need the original
+    frame, the annotated image is drawn on the proxy frame instead.
+    output_format is 'base64' for a base64 string of the annotated
+    image, 'bytes' for the raw encoded image, or 'none' to skip annotation and
+    encoding (the encoded frame is then None). image_format, image_quality and
+    max_width control the encoding.
+    """
+    if model is None:
+        return None, [], tracking_state, "Model is not loaded."
+
+    predict_only = (detection_schedule is not None and isinstance(tracking_state, Tracker) and
+                    not detection_schedule.should_detect(frame_index))
+
+    if raw_detections is None and detection_cache is not None and not predict_only:
+        with span('cache_lookup'):
+            raw_detections = detection_cache.get(video_path, frame_index, model.names)
+
+    if predict_only:
+        needs_frame = output_format != 'none'
+        detection_needs_frame = False
+    else:
+        detection_needs_frame = raw_detections is None or motion_gate is not None
+        needs_frame = detection_needs_frame or output_format != 'none'
+    source_width = None
+    if frame is None and needs_frame and preview_source is not None and not detection_needs_frame:
+        # Only the image is needed, so decode the cheap proxy instead of the original.
+        proxy_path, proxy_index, source_width = preview_source
+        frame, error = read_video_frame(proxy_path, proxy_index, decoder_pool, session_key)
+        if error:
+            source_width = None
+    if frame is None and needs_frame:
+        frame, error = read_video_frame(video_path, frame_index, decoder_pool, session_key)
+        if error:
+            return None, [], tracking_state, error
+
+    if predict_only:
+        # --- Track Propagation (no detection on this frame) ---
+        with span('predict'):
+            detections_for_annotation = tracking_state.predict(frame_index)
+    else:
+        # --- Raw Detection ---
+        if motion_gate is not None:
+            if raw_detections is None:
+                raw_detections, _ = motion_gate.detect(frame, frame_index, model, video_path, detection_cache)
+            else:
+                motion_gate.observe(frame, frame_index, raw_detections)
+        elif raw_detections is None:
+            if detection_cache is not None:
+                raw_detections = run_detection_with_cache(video_path, [frame_index], [frame], model,
+                                                          detection_cache)[0]
+            else:
+                raw_detections = run_detection_on_frame(frame, model)
+
+        # --- Swarm Logic ---
+        with span('swarm'):
+            detections_for_tracking = apply_swarm_logic(raw_detections)
+
+        # --- Object Tracking Logic ---
+        with span('tracking'):
+            detections_for_annotation = update_tracking_state(detections_for_tracking, tracking_state, frame_index)
+        if detection_schedule is not None and isinstance(tracking_state, Tracker):
+            detection_schedule.detected(frame_index, tracking_state)
+
+    # --- Distance Estimation ---
+    with span('distance'):
+        estimate_distances(detections_for_annotation, average_wingspans_m)
+
+    # --- Annotation and Encoding ---
+    encoded_frame = None
+    if output_format != 'none':
+        encoded_frame = render_annotated_frame(frame, detections_for_annotation, image_format,
+                                               image_quality, max_width, source_width)
+        if output_format == 'base64':
+            with span('base64'):
+                encoded_frame = base64.b64encode(encoded_frame).decode('utf-8')
+
+    # Prepare detection list for frontend
+    frontend_detections = build_frontend_detections(detections_for_annotation)
+
     return encoded_frame, frontend_detections, tracking_state, None
 
-def analyze_video_chunk(video_path, start_frame, num_frames, model, average_wingspans_m, initial_tracking_state):
+def _iter_batched_detections(video_path, start_frame, end_frame, model, decoder_pool, session_key, batch_size,
+                             detection_cache):
+    """
+    Yields (frame_index, raw_detections) in frame order. Frames are sent to the
+    model in batches; frames found in the detection cache are not even decoded.
+    """
+    for batch_start in range(start_frame, end_frame, batch_size):
+        batch_range = range(batch_start, min(batch_start + batch_size, end_frame))
+        cached = {}
+        if detection_cache is not None:
+            cached = detection_cache.get_many(video_path, batch_range, model.names)
+
+        decoded_indices = []
+        decoded_frames = []
+        for frame_index in batch_range:
+            if frame_index in cached:
+                continue
+            frame, error = read_video_frame(video_path, frame_index, decoder_pool, session_key)
+            if error:
+                print(f"Skipping frame {frame_index} due to error: {error}")
+                continue
+            decoded_indices.append(frame_index)
+            decoded_frames.append(frame)
+
+        batch_detections = dict(cached)
+        batch_detections.update(zip(decoded_indices, run_detection_with_cache(
+            video_path, decoded_indices, decoded_frames, model, detection_cache, batch_size)))
+        for frame_index in sorted(batch_detections):
+            yield frame_index, batch_detections[frame_index]
+
+def analyze_video_chunk(video_path, start_frame, num_frames, model, average_wingspans_m, initial_tracking_state,
+                        decoder_pool=None, batch_size=DETECTION_BATCH_SIZE, on_frame=None, detection_cache=None,
+                        motion_gate=None, detection_schedule=None, checkpoints=None):
     """
     Analyzes a chunk of video frames and returns an aggregated report.
     This function now correctly uses the process_video_frame_with_tracking function
-    to ensure swarm logic is applied.
+    to ensure swarm logic is applied. When a decoder pool is given the chunk is
+    decoded sequentially from a single private capture. Frames are sent to the
+    model in batches of batch_size; frames found in the detection cache are
+    neither decoded nor sent to the model. With a motion gate or a detection
+    schedule, frames are processed one at a time so static frames can be
+    skipped and frames between scheduled detections predicted. If given,
+    on_frame(frame_index, frame_detections) is called after every tracked frame;
+    returning False stops the chunk early. With a checkpoints store, the tracker
+    state is stored at its checkpoint frames; only pass one when the chunk
+    continues the canonical timeline (see checkpoints.py).
     """
     if model is None:
         return {"error": "Model not loaded"}, None
@@ -366,22 +674,56 @@ def analyze_video_chunk(video_path, start_frame, num_frames, model, average_wing
 
     end_frame = min(start_frame + num_frames, total_frames)
     
-    # Make a deep copy to avoid modifying the main tracker state during analysis
-    import copy
-    local_tracking_state = copy.deepcopy(initial_tracking_state)
+    # Work on a copy to avoid modifying the main tracker state during analysis.
+    # A Tracker snapshot is copy-on-write; legacy dict states are deep-copied.
+    if isinstance(initial_tracking_state, Tracker):
+        local_tracking_state = initial_tracking_state.snapshot()
+    else:
+        import copy
+        local_tracking_state = copy.deepcopy(initial_tracking_state)
 
     aggregated_detections = {}
-
-    for frame_index in range(start_frame, end_frame):
-        _, frame_detections, local_tracking_state, error = process_video_frame_with_tracking(
-            video_path, frame_index, model, average_wingspans_m, local_tracking_state
+    # A key of its own so the chunk never moves the playback capture of any viewer.
+    session_key = f"analysis-{uuid.uuid4()}"
+
+    if motion_gate is not None or detection_schedule is not None:
+        # Gate and schedule decisions depend on the previous frame's result, so frames
+        # are decoded and detected one at a time inside process_video_frame_with_tracking.
+        frame_inputs = (
+            (frame_index, {'decoder_pool': decoder_pool, 'session_key': session_key,
+                           'detection_cache': detection_cache, 'motion_gate': motion_gate,
+                           'detection_schedule': detection_schedule})
+            for frame_index in range(start_frame, end_frame)
+        )
+    else:
+        frame_inputs = (
+            (frame_index, {'raw_detections': raw_detections})
+            for frame_index, raw_detections in _iter_batched_detections(
+                video_path, start_frame, end_frame, model, decoder_pool, session_key, batch_size, detection_cache)
         )
-        if error:
-            print(f"Skipping frame {frame_index} due to error: {error}")
-            continue
 
-        for det in frame_detections:
-            bird_class = det['class']
-            aggregated_detections[bird_class] = aggregated_detections.get(bird_class, 0) + 1
+    try:
+        # Tracking is applied one frame at a time, in frame order.
+        for frame_index, frame_input in frame_inputs:
+            _, frame_detections, local_tracking_state, error = process_video_frame_with_tracking(
+                video_path, frame_index, model, average_wingspans_m, local_tracking_state,
+                output_format='none', **frame_input
+            )
+            if error:
+                print(f"Skipping frame {frame_index} due to error: {error}")
+                continue
+
+            for det in frame_detections:
+                bird_class = det['class']
+                aggregated_detections[bird_class] = aggregated_detections.get(bird_class, 0) + 1
+
+            if checkpoints is not None and checkpoints.wants(frame_index + 1):
+                checkpoints.put(video_path, frame_index + 1, local_tracking_state)
+
+            if on_frame is not None and on_frame(frame_index, frame_detections) is False:
+                return aggregated_detections, local_tracking_state
+    finally:
+        if decoder_pool is not None:
+            decoder_pool.close(session_key=session_key)
 
     return aggregated_detections, local_tracking_state
\ No newline at end of file
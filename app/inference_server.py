@@ -0,0 +1,325 @@
+# inference_server.py
+# Optional inference service. One process owns the YOLO model and the web
+# workers send it frames over a local socket, so N gunicorn workers hold one
+# copy of the weights and concurrent requests share model batches:
+#
+#   python inference_server.py
+#   INFERENCE_SERVER_ADDRESS=$XDG_RUNTIME_DIR/kusgoz-$(id -u)/inference.sock gunicorn app:app
+#
+# Clients must know the authkey (INFERENCE_SERVER_AUTHKEY, or else a random key
+# kept in a file only the owner can read), and the socket itself is only
+# accessible to its owner, since the server unpickles what clients send.
+import argparse
+import os
+import queue
+import secrets
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+# --- Configuration Parameters ---
+INFERENCE_MAX_BATCH_SIZE = 16          # Frames per model call
+INFERENCE_BATCH_WINDOW_S = 0.005       # How long the first request waits for others to join its batch
+INFERENCE_CONNECT_TIMEOUT_S = 30.0     # How long a client retries connecting while the server starts
+INFERENCE_RUNTIME_DIR = os.environ.get('INFERENCE_RUNTIME_DIR')  # Private directory for the socket and key
+INFERENCE_KEY_FILE = 'inference.key'
+INFERENCE_SOCKET_FILE = 'inference.sock'
+
+
+def _private_dir():
+    """The per-user runtime directory (mode 0700), created if missing and checked to be private."""
+    path = INFERENCE_RUNTIME_DIR or os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                                                 f'kusgoz-{os.getuid()}')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by this user and not accessible to others.")
+    return path
+
+
+def default_address():
+    """Socket path in the private runtime directory."""
+    return os.path.join(_private_dir(), INFERENCE_SOCKET_FILE)
+
+
+def _authkey():
+    """
+    INFERENCE_SERVER_AUTHKEY if set, otherwise the shared secret in the private
+    runtime directory, generated on first use and readable by the owner only.
+    """
+    authkey = os.environ.get('INFERENCE_SERVER_AUTHKEY')
+    if authkey:
+        return authkey.encode()
+    directory = _private_dir()
+    key_path = os.path.join(directory, INFERENCE_KEY_FILE)
+    if not os.path.exists(key_path):
+        # Written to a temporary file and linked into place, so a concurrent
+        # reader never sees a partial key and the first writer wins.
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(32))
+            try:
+                os.link(tmp_path, key_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_path)
+    info = os.lstat(key_path)
+    if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{key_path} must be a file owned by this user and not accessible to others.")
+    with open(key_path, 'rb') as f:
+        return f.read()
+
+
+class _PendingRequest:
+    """Frames of one client request waiting for the batcher."""
+    __slots__ = ('frames', 'imgsz', 'done', 'detections', 'error')
+
+    def __init__(self, frames, imgsz=None):
+        self.frames = frames
+        self.imgsz = imgsz
+        self.done = threading.Event()
+        self.detections = None
+        self.error = None
+
+
+class InferenceServer:
+    """
+    Accepts frames from any number of clients and micro-batches them: the
+    first request waits up to batch_window_s for others, and everything that
+    arrived is sent to the model in batches of at most max_batch_size frames.
+    Without an address the socket is created in the private runtime directory;
+    without an authkey the shared secret from _authkey() is required.
+    """
+
+    def __init__(self, model, address=None, authkey=None, max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                 batch_window_s=INFERENCE_BATCH_WINDOW_S):
+        self.model = model
+        self.address = address
+        self.authkey = authkey
+        self.max_batch_size = max_batch_size
+        self.batch_window_s = batch_window_s
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._counters = {'connections': 0, 'requests': 0, 'frames': 0, 'batches': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def serve_forever(self):
+        """Accepts connections until the process is stopped."""
+        if self.address is None:
+            self.address = default_address()
+        if self.authkey is None:
+            self.authkey = _authkey()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # Stale socket left by a previous run
+        threading.Thread(target=self._batch_loop, name='inference-batcher', daemon=True).start()
+        # The socket is created without group/other permissions; there is no
+        # window in which another user could connect before a chmod.
+        previous_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            print(f"Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"Rejected inference client: {e}")
+                    continue
+                self._count('connections')
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        """Answers one client's requests in order until it disconnects."""
+        try:
+            while True:
+                command, payload = conn.recv()
+                if command == 'names':
+                    conn.send(('ok', self.model.names))
+                elif command == 'imgsz':
+                    from backends import model_imgsz
+                    conn.send(('ok', model_imgsz(self.model)))
+                elif command == 'stats':
+                    conn.send(('ok', self.stats()))
+                elif command == 'detect':
+                    specs, imgsz = payload
+                    frames = [np.frombuffer(conn.recv_bytes(), dtype=dtype).reshape(shape)
+                              for shape, dtype in specs]
+                    request = _PendingRequest(frames, imgsz)
+                    self._queue.put(request)
+                    request.done.wait()
+                    if request.error is not None:
+                        conn.send(('error', request.error))
+                    else:
+                        conn.send(('ok', request.detections))
+                else:
+                    conn.send(('error', f"Unknown command {command!r}."))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _batch_loop(self):
+        while True:
+            requests = [self._queue.get()]
+            frame_count = len(requests[0].frames)
+            deadline = time.monotonic() + self.batch_window_s
+            while frame_count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                frame_count += len(request.frames)
+
+            # Frames sent with an input size (e.g. motion-gate crops) only share
+            # batches with frames of the same size.
+            groups = {}
+            for request in requests:
+                groups.setdefault(request.imgsz, []).append(request)
+            for imgsz, group in groups.items():
+                self._run_group(group, imgsz)
+
+    def _run_group(self, requests, imgsz):
+        from detector import run_detection_on_batch
+
+        frames = [frame for request in requests for frame in request.frames]
+        succeeded = set()
+        detections = run_detection_on_batch(frames, self.model, self.max_batch_size,
+                                            on_detected=lambda position, _: succeeded.add(position), imgsz=imgsz)
+        self._count('requests', len(requests))
+        self._count('frames', len(frames))
+        self._count('batches', -(-len(frames) // self.max_batch_size))
+
+        offset = 0
+        for request in requests:
+            positions = range(offset, offset + len(request.frames))
+            if all(position in succeeded for position in positions):
+                request.detections = [detections[position] for position in positions]
+            else:
+                # Reported as an error so clients do not cache empty results.
+                request.error = "Inference failed on the server."
+                self._count('errors')
+            offset += len(request.frames)
+            request.done.set()
+
+    def stats(self):
+        """Returns request/frame/batch counters and the mean batch size."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['mean_batch_size'] = stats['frames'] / stats['batches'] if stats['batches'] else 0.0
+        stats['backend'] = getattr(self.model, 'inference_backend', 'torch')
+        return stats
+
+
+class InferenceClient:
+    """
+    Stands in for the model in a web worker. detector.run_detection_on_batch
+    calls detect_frames() instead of running the model locally. Each thread
+    uses its own connection, so concurrent requests reach the server's batcher
+    together.
+    """
+
+    def __init__(self, address=None, authkey=None, connect_timeout_s=INFERENCE_CONNECT_TIMEOUT_S):
+        self.address = address or default_address()
+        self.authkey = authkey if authkey is not None else _authkey()
+        self.connect_timeout_s = connect_timeout_s
+        self._local = threading.local()
+        self.names = self._request('names')
+        # Mirrors the ultralytics model attribute, so backends.model_imgsz reports
+        # the server model's input size (the motion gate scales crops by it).
+        self.overrides = {'imgsz': self._request('imgsz')}
+        self.inference_backend = self.stats().get('backend', 'torch')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            deadline = time.monotonic() + self.connect_timeout_s
+            while True:
+                try:
+                    conn = Client(self.address, authkey=self.authkey)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.5)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, command, payload=None, frames=()):
+        conn = self._connection()
+        try:
+            conn.send((command, payload))
+            for frame in frames:
+                conn.send_bytes(frame.reshape(-1))  # Flat view; send_bytes counts the first axis only
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # The server went away; reconnect on the next request.
+            conn.close()
+            self._local.conn = None
+            raise
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def detect_frames(self, frames, imgsz=None):
+        """
+        Returns the raw Detections of every frame, like run_detection_on_batch.
+        imgsz overrides the model input size on the server.
+        """
+        frames = [np.ascontiguousarray(frame) for frame in frames]
+        return self._request('detect', ([(frame.shape, frame.dtype.str) for frame in frames], imgsz), frames)
+
+    def stats(self):
+        """Returns the server's counters."""
+        return self._request('stats')
+
+
+def connect_inference_client(address):
+    """Connects to the inference server at address. Returns None on failure."""
+    try:
+        client = InferenceClient(address)
+        print(f"Using inference server at {client.address}.")
+        return client
+    except Exception as e:
+        print(f"Error connecting to inference server at {address}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve YOLO inference to the web workers.')
+    parser.add_argument('--address', default=os.environ.get('INFERENCE_SERVER_ADDRESS'),
+                        help='Socket path (default: inference.sock in the private runtime directory)')
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights/best.pt'))
+    parser.add_argument('--max-batch-size', type=int, default=INFERENCE_MAX_BATCH_SIZE)
+    parser.add_argument('--batch-window-ms', type=float, default=INFERENCE_BATCH_WINDOW_S * 1000)
+    parser.add_argument('--backend', default=os.environ.get('INFERENCE_BACKEND', 'torch'),
+                        choices=('torch', 'onnx', 'openvino'))
+    parser.add_argument('--int8', action='store_true', help='Quantize the exported model to INT8')
+    parser.add_argument('--calibration', default=os.environ.get('INFERENCE_CALIBRATION'),
+                        help='Images and/or videos for INT8 calibration')
+    args = parser.parse_args()
+
+    from detector import load_model
+    model = load_model(args.model, args.backend, args.int8, args.calibration)
+    if model is None:
+        raise SystemExit(1)
+    InferenceServer(model, args.address, max_batch_size=args.max_batch_size,
+                    batch_window_s=args.batch_window_ms / 1000).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# jobs.py
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration Parameters ---
+ANALYSIS_JOB_WORKERS = 2           # Analysis jobs that run at the same time
+ANALYSIS_JOB_MAX_PENDING = 16      # Queued + running jobs accepted before submissions are refused
+ANALYSIS_JOB_RETENTION_S = 3600    # Finished jobs are kept this long for polling
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its pending limit."""
+
+
+class AnalysisJob:
+    """State of one background analysis job."""
+
+    def __init__(self, owner, params):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.params = params
+        self.status = JOB_QUEUED
+        self.frames_done = 0
+        self.frames_total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.version = 0  # Bumped on every change so progress streams know when to send
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, include_result=True):
+        """Returns the JSON-friendly view of the job."""
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'frames_done': self.frames_done,
+            'frames_total': self.frames_total,
+            'progress': (self.frames_done / self.frames_total) if self.frames_total else 0.0,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            **{k: v for k, v in self.params.items() if k != 'video_path'},
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class AnalysisJobQueue:
+    """
+    Runs analysis jobs on a bounded thread pool so long analyses never block a
+    request worker. Jobs live in the memory of the process that accepted them.
+    """
+
+    def __init__(self, max_workers=ANALYSIS_JOB_WORKERS, max_pending=ANALYSIS_JOB_MAX_PENDING,
+                 retention_s=ANALYSIS_JOB_RETENTION_S):
+        self.max_pending = max_pending
+        self.retention_s = retention_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._jobs = {}
+        self._cond = threading.Condition()
+
+    def _touch(self, job):
+        """Records a change to job and wakes up progress streams. Caller holds self._cond."""
+        job.version += 1
+        self._cond.notify_all()
+
+    def _prune_locked(self):
+        deadline = time.time() - self.retention_s
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < deadline]:
+            del self._jobs[job_id]
+
+    def submit(self, owner, runner, **params):
+        """
+        Queues runner(job, on_progress) to run in the pool and returns the job.
+        runner returns the job result; it should stop early once
+        job.cancel_event is set. Raises QueueFullError at the pending limit.
+        """
+        with self._cond:
+            self._prune_locked()
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Too many analysis jobs in progress ({pending}).")
+            job = AnalysisJob(owner, params)
+            self._jobs[job.id] = job
+            job.future = self._executor.submit(self._run, job, runner)
+        return job
+
+    def _run(self, job, runner):
+        with self._cond:
+            if job.finished:
+                return
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            self._touch(job)
+
+        def on_progress(frames_done, frames_total):
+            with self._cond:
+                job.frames_done = frames_done
+                job.frames_total = frames_total
+                self._touch(job)
+
+        try:
+            result = runner(job, on_progress)
+            status, error = (JOB_CANCELLED if job.cancel_event.is_set() else JOB_COMPLETED), None
+        except Exception as e:
+            print(f"Analysis job {job.id} failed: {e}")
+            result, status, error = None, JOB_FAILED, str(e)
+
+        with self._cond:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+            self._touch(job)
+
+    def get(self, job_id, owner=None):
+        """Returns the job, or None if it does not exist or belongs to another owner."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job_id, owner=None):
+        """Cancels a queued job or asks a running one to stop. Returns the job or None."""
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        with self._cond:
+            if job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == JOB_QUEUED and job.future.cancel():
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+            self._touch(job)
+        return job
+
+    def wait_for_change(self, job, seen_version, timeout):
+        """Blocks until job.version differs from seen_version or timeout passes. Returns the version."""
+        with self._cond:
+            self._cond.wait_for(lambda: job.version != seen_version, timeout)
+            return job.version
+
+    def stats(self):
+        """Returns the number of jobs per status."""
+        with self._cond:
+            stats = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATES}
+            for job in self._jobs.values():
+                stats[job.status] += 1
+        return stats
@@ -0,0 +1,211 @@
+# metrics.py
+import contextvars
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- Configuration Parameters ---
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+METRICS_NAMESPACE = 'kusgoz'      # Prefix of every exported metric name
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit.
+METRICS_LATENCY_BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Trace of the current request: a list of (stage, seconds), or None when not tracing.
+_current_trace = contextvars.ContextVar('metrics_trace', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS_S):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[position] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Returns (cumulative bucket counts including +Inf, sum, count)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+def _metric_name(*parts):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(str(part) for part in parts if part))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """
+    Latency histograms fed by span() and the request hooks, plus gauges read
+    from the components' stats() methods when /metrics is scraped. Rendered
+    in the Prometheus text exposition format.
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, buckets=METRICS_LATENCY_BUCKETS_S):
+        self.namespace = namespace
+        self.buckets = buckets
+        self._histograms = {}   # name -> {sorted label tuple: Histogram}
+        self._help = {}
+        self._stats_sources = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, help_text='', **labels):
+        """Adds a latency sample to the histogram name{labels}."""
+        key = tuple(sorted(labels.items()))
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                series = self._histograms.setdefault(name, {})
+                histogram = series.setdefault(key, Histogram(self.buckets))
+                if help_text:
+                    self._help.setdefault(name, help_text)
+        histogram.observe(seconds)
+
+    def summary(self, name):
+        """Returns {label value: {'count', 'total_ms', 'mean_ms'}} for a histogram with one label."""
+        with self._lock:
+            series = dict(self._histograms.get(name, {}))
+        summary = {}
+        for labels, histogram in sorted(series.items()):
+            _, total, count = histogram.snapshot()
+            key = ','.join(str(value) for _, value in labels)
+            summary[key] = {
+                'count': count,
+                'total_ms': total * 1000,
+                'mean_ms': total * 1000 / count if count else 0.0,
+            }
+        return summary
+
+    def reset(self):
+        """Drops all histogram samples, e.g. between benchmark runs."""
+        with self._lock:
+            self._histograms.clear()
+
+    def register_stats(self, prefix, stats_fn, help_text=''):
+        """
+        Exports every numeric value of stats_fn()'s dict as the gauge
+        <namespace>_<prefix>_<key>. Nested dicts become <prefix>_<key>_<subkey>.
+        """
+        with self._lock:
+            self._stats_sources.append((prefix, stats_fn, help_text))
+
+    def _gauges(self, prefix, stats, help_text, lines):
+        for key, value in sorted(stats.items()):
+            if isinstance(value, dict):
+                self._gauges(_metric_name(prefix, key), value, help_text, lines)
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = _metric_name(self.namespace, prefix, key)
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+
+    def render(self):
+        """The current metrics in Prometheus text format."""
+        lines = []
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            stats_sources = list(self._stats_sources)
+        for name, series in sorted(histograms.items()):
+            full_name = _metric_name(self.namespace, name)
+            if self._help.get(name):
+                lines.append(f'# HELP {full_name} {self._help[name]}')
+            lines.append(f'# TYPE {full_name} histogram')
+            for labels, histogram in sorted(series.items()):
+                cumulative, total, count = histogram.snapshot()
+                for bound, value in zip(list(histogram.buckets) + ['+Inf'], cumulative):
+                    lines.append(f'{full_name}_bucket{_format_labels(labels + (("le", bound),))} {value}')
+                lines.append(f'{full_name}_sum{_format_labels(labels)} {total}')
+                lines.append(f'{full_name}_count{_format_labels(labels)} {count}')
+        for prefix, stats_fn, help_text in stats_sources:
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            if stats:
+                self._gauges(prefix, stats, help_text, lines)
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by the pipeline stages and the Flask app.
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(stage):
+    """
+    Times the with-block as one pipeline stage: the duration goes into the
+    stage_seconds{stage=...} histogram and, while a request is being traced,
+    into its trace.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe('stage_seconds', elapsed, 'Time spent per pipeline stage.', stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def start_trace():
+    """Starts collecting the spans of the current request. Returns a token for end_trace()."""
+    return _current_trace.set([])
+
+
+def end_trace(token):
+    """Stops tracing and returns the collected (stage, seconds) spans."""
+    trace = _current_trace.get() or []
+    _current_trace.reset(token)
+    return trace
+
+
+def server_timing_header(trace, total_seconds=None):
+    """
+    Formats spans as a Server-Timing header value, summing repeated stages,
+    e.g. 'decode;dur=4.1, inference;dur=61.0;desc="2 calls"'. Browser devtools
+    show it in the request's Timing tab.
+    """
+    totals = {}
+    for stage, seconds in trace:
+        total, calls = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, calls + 1)
+    entries = []
+    for stage, (seconds, calls) in totals.items():
+        entry = f'{stage};dur={seconds * 1000:.2f}'
+        if calls > 1:
+            entry += f';desc="{calls} calls"'
+        entries.append(entry)
+    if total_seconds is not None:
+        entries.append(f'total;dur={total_seconds * 1000:.2f}')
+    return ', '.join(entries)
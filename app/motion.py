@@ -0,0 +1,160 @@
+# motion.py
+import math
+
+import cv2
+import numpy as np
+
+from backends import model_imgsz
+from detections import Detections
+from detector import TRACKING_FRAMES_TO_LOOK_BACK, run_detection_on_frame, run_detection_with_cache
+
+# --- Configuration Parameters ---
+MOTION_DOWNSCALE_WIDTH = 320          # Width of the grayscale frame that is differenced
+MOTION_BLUR_KERNEL = 5                # Gaussian blur against sensor noise and compression artifacts
+MOTION_PIXEL_THRESHOLD = 18           # Gray-level change that counts as motion
+MOTION_MIN_CHANGED_FRACTION = 0.0005  # Changed share of the frame below which inference is skipped
+MOTION_MAX_SKIPPED_FRAMES = TRACKING_FRAMES_TO_LOOK_BACK  # Consecutive skips before inference is forced
+MOTION_ROI_MAX_AREA_FRACTION = 0.5    # Motion regions larger than this share of the frame use full inference
+MOTION_ROI_PADDING = 48               # Pixels added around motion regions and known birds
+
+GATE_FULL = 'full'
+GATE_ROI = 'roi'
+GATE_SKIPPED = 'skipped'
+
+
+class MotionGate:
+    """
+    Cheap pre-stage that decides, per frame, whether inference is needed. The
+    frame is downscaled, blurred and differenced against the frame of the last
+    inference, so slow movement accumulates until it is noticed.
+    - No motion: the previous raw detections are reused, for at most
+      max_skipped_frames frames in a row, so tracks stay alive within
+      TRACKING_FRAMES_TO_LOOK_BACK.
+    - Motion in a small part of the frame (with roi enabled): only a crop
+      around the motion and the known birds is sent to the model, at the scale
+      a full frame would have been processed at.
+    - Otherwise, and after any non-sequential access: full-frame inference.
+    One gate belongs to one sequential pass over one video.
+    """
+
+    def __init__(self, pixel_threshold=MOTION_PIXEL_THRESHOLD, min_changed_fraction=MOTION_MIN_CHANGED_FRACTION,
+                 max_skipped_frames=MOTION_MAX_SKIPPED_FRAMES, roi=True,
+                 roi_max_area_fraction=MOTION_ROI_MAX_AREA_FRACTION, downscale_width=MOTION_DOWNSCALE_WIDTH):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skipped_frames = max_skipped_frames
+        self.roi = roi
+        self.roi_max_area_fraction = roi_max_area_fraction
+        self.downscale_width = downscale_width
+        self._reference = None          # Downscaled frame of the last inference
+        self._reference_detections = None
+        self._last_index = None
+        self._skipped_in_row = 0
+        self.counters = {GATE_FULL: 0, GATE_ROI: 0, GATE_SKIPPED: 0}
+
+    def reset(self):
+        """Forgets the reference frame; the next frame gets full inference."""
+        self._reference = None
+        self._reference_detections = None
+        self._last_index = None
+        self._skipped_in_row = 0
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.downscale_width / width)
+        small = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (MOTION_BLUR_KERNEL, MOTION_BLUR_KERNEL), 0), scale
+
+    def _motion_mask(self, small):
+        diff = cv2.absdiff(small, self._reference)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return mask
+
+    def observe(self, frame, frame_index, raw_detections):
+        """Makes detections produced elsewhere (prefetch, cache) the new reference."""
+        if frame is None:
+            self.reset()
+            return
+        self._reference, _ = self._prepare(frame)
+        self._reference_detections = Detections.coerce(raw_detections)
+        self._last_index = frame_index
+        self._skipped_in_row = 0
+
+    def detect(self, frame, frame_index, model, video_path=None, detection_cache=None):
+        """
+        Returns (raw_detections, decision) for the frame, running as little
+        inference as possible. Only full-frame results go to the detection cache.
+        """
+        small, scale = self._prepare(frame)
+        sequential = self._last_index is not None and frame_index == self._last_index + 1
+        self._last_index = frame_index
+
+        decision, roi_box = GATE_FULL, None
+        if sequential and self._reference is not None and self._reference.shape == small.shape:
+            mask = self._motion_mask(small)
+            changed_fraction = cv2.countNonZero(mask) / mask.size
+            if changed_fraction < self.min_changed_fraction and self._skipped_in_row < self.max_skipped_frames:
+                decision = GATE_SKIPPED
+            elif self.roi:
+                roi_box = self._roi_box(mask, scale, frame.shape)
+                if roi_box is not None:
+                    decision = GATE_ROI
+
+        self.counters[decision] += 1
+        if decision == GATE_SKIPPED:
+            self._skipped_in_row += 1
+            # Detections are never modified in place, so the reference can be reused as is.
+            return self._reference_detections, decision
+
+        if decision == GATE_ROI:
+            raw_detections = self._detect_roi(frame, roi_box, model)
+        elif detection_cache is not None:
+            raw_detections = run_detection_with_cache(video_path, [frame_index], [frame], model, detection_cache)[0]
+        else:
+            raw_detections = run_detection_on_frame(frame, model)
+        self._reference = small
+        self._reference_detections = raw_detections
+        self._skipped_in_row = 0
+        return raw_detections, decision
+
+    def _roi_box(self, mask, scale, frame_shape):
+        """
+        Bounding box (full-frame pixels) around all motion and all birds of the
+        reference frame, or None if it covers too much of the frame.
+        """
+        height, width = frame_shape[:2]
+        mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+        points = cv2.findNonZero(mask)
+        boxes = self._reference_detections.boxes
+        if points is not None:
+            x, y, w, h = cv2.boundingRect(points)
+            boxes = np.vstack([boxes, [[x / scale, y / scale, (x + w) / scale, (y + h) / scale]]])
+        if not len(boxes):
+            return None
+        x1 = int(max(0, boxes[:, 0].min() - MOTION_ROI_PADDING))
+        y1 = int(max(0, boxes[:, 1].min() - MOTION_ROI_PADDING))
+        x2 = int(min(width, math.ceil(boxes[:, 2].max() + MOTION_ROI_PADDING)))
+        y2 = int(min(height, math.ceil(boxes[:, 3].max() + MOTION_ROI_PADDING)))
+        if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) > self.roi_max_area_fraction * width * height:
+            return None
+        return x1, y1, x2, y2
+
+    @staticmethod
+    def _detect_roi(frame, roi_box, model):
+        """Runs the model on a crop at full-frame scale and maps boxes back to frame coordinates."""
+        x1, y1, x2, y2 = roi_box
+        crop = frame[y1:y2, x1:x2]
+        # Keep the pixels-per-model-input ratio of full-frame inference, so birds
+        # are seen at the same size; a smaller input is what makes the crop cheaper.
+        full_scale = model_imgsz(model) / max(frame.shape[:2])
+        imgsz = max(32, int(math.ceil(max(crop.shape[:2]) * full_scale / 32)) * 32)
+        return run_detection_on_frame(crop, model, imgsz=imgsz).shifted(x1, y1)
+
+    def stats(self):
+        """Returns how many frames got full, ROI and no inference."""
+        stats = dict(self.counters)
+        total = sum(self.counters.values())
+        stats['inference_saved'] = stats[GATE_SKIPPED] / total if total else 0.0
+        return stats
@@ -0,0 +1,279 @@
+# parallel_analysis.py
+# Whole-video analysis on a process pool. The frame range is split into
+# segments that are analysed in parallel, each worker with its own model,
+# decoder and tracker. Every segment starts PARALLEL_OVERLAP_FRAMES early so
+# its tracker has settled by the time its own frames begin; track IDs are then
+# stitched across the overlap by class and IoU, and the per-class report is
+# built over the stitched timeline exactly as a sequential pass would.
+#
+# Workers are started with the 'spawn' method: forking a process that already
+# runs PyTorch/OpenMP or Flask threads can deadlock. A spawned worker imports
+# this module and the detector, plus the main script if there is one, so
+# serve the app with gunicorn rather than `python app.py` when using it.
+import multiprocessing
+import os
+import queue
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+from analysis import AnalysisAccumulator
+from decoder_pool import DecoderPool
+from detector import (
+    TRACKING_FRAMES_TO_LOOK_BACK,
+    analyze_video_chunk,
+    calculate_iou,
+    get_video_total_frames,
+    load_wingspans,
+    new_tracking_state,
+)
+
+# --- Configuration Parameters ---
+PARALLEL_ANALYSIS_WORKERS = os.cpu_count() or 1   # Worker processes per analysis
+PARALLEL_SEGMENTS_PER_WORKER = 2      # Extra segments even out uneven segment costs; each adds an overlap
+PARALLEL_MIN_SEGMENT_FRAMES = 250     # Ranges are never split into segments shorter than this
+# Frames re-analysed before each segment: half to let the tracker settle, half to match tracks in.
+PARALLEL_OVERLAP_FRAMES = 2 * (TRACKING_FRAMES_TO_LOOK_BACK + 1)
+STITCH_WINDOW_FRAMES = TRACKING_FRAMES_TO_LOOK_BACK + 1   # Last overlap frames used to match tracks
+STITCH_IOU_THRESHOLD = 0.5            # Minimum IoU of two boxes of the same track in both segments
+PARALLEL_PROGRESS_EVERY = 25          # Frames between progress messages from a worker
+
+# State of a worker process, set up once by _init_worker.
+_worker = {}
+
+
+def plan_segments(start_frame, end_frame, workers, overlap=PARALLEL_OVERLAP_FRAMES,
+                  min_segment_frames=PARALLEL_MIN_SEGMENT_FRAMES):
+    """
+    Splits [start_frame, end_frame) into contiguous segments. Returns a list of
+    (analysis_start, core_start, core_end): each segment reports the frames of
+    [core_start, core_end) but is analysed from analysis_start, up to overlap
+    frames earlier.
+    """
+    frames = end_frame - start_frame
+    count = max(1, min(workers * PARALLEL_SEGMENTS_PER_WORKER, frames // max(min_segment_frames, overlap + 1)))
+    bounds = [start_frame + round(i * frames / count) for i in range(count + 1)]
+    return [(max(start_frame, core_start - overlap), core_start, core_end)
+            for core_start, core_end in zip(bounds, bounds[1:])]
+
+
+def _init_worker(model_factory, wingspans_file, detection_cache_factory, progress_queue, cancel_event, threads):
+    # Each worker gets an equal share of the cores instead of every library
+    # starting one thread per core.
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker.update(
+        model=model_factory(),
+        average_wingspans_m=load_wingspans(wingspans_file),
+        detection_cache=detection_cache_factory() if detection_cache_factory is not None else None,
+        decoder_pool=DecoderPool(),
+        progress_queue=progress_queue,
+        cancel_event=cancel_event,
+    )
+
+
+def _analyze_segment(segment_index, video_path, analysis_start, core_start, core_end):
+    """
+    Runs in a worker: analyses one segment with a fresh tracker. Returns the
+    (track ID, class) lists of the core frames, and the boxes of the frames
+    used to stitch it to its neighbours.
+    """
+    model = _worker['model']
+    if model is None:
+        raise RuntimeError("The worker could not load the model.")
+    progress_queue, cancel_event = _worker['progress_queue'], _worker['cancel_event']
+    stitch_frames = set(range(max(analysis_start, core_start - STITCH_WINDOW_FRAMES), core_start))
+    stitch_frames.update(range(max(core_start, core_end - STITCH_WINDOW_FRAMES), core_end))
+    frames = []
+    boxes = {}
+    done = [0]
+
+    def on_frame(frame_index, frame_detections):
+        if frame_index >= core_start:
+            frames.append((frame_index, [(det['tracked_id'], det['class']) for det in frame_detections]))
+        if frame_index in stitch_frames:
+            boxes[frame_index] = [(det['tracked_id'], det['class'], det['box']) for det in frame_detections]
+        done[0] += 1
+        if done[0] % PARALLEL_PROGRESS_EVERY == 0:
+            progress_queue.put((segment_index, done[0]))
+        return not cancel_event.is_set()
+
+    counts, _ = analyze_video_chunk(
+        video_path, analysis_start, core_end - analysis_start, model, _worker['average_wingspans_m'],
+        new_tracking_state(), decoder_pool=_worker['decoder_pool'], on_frame=on_frame,
+        detection_cache=_worker['detection_cache']
+    )
+    if 'error' in counts:
+        raise IOError(counts['error'])
+    progress_queue.put((segment_index, done[0]))
+    return {'frames': frames, 'boxes': boxes}
+
+
+def match_tracks(previous_boxes, boxes, iou_threshold=STITCH_IOU_THRESHOLD):
+    """
+    Matches the track IDs of two segments over the frames both analysed. A
+    pair gets one vote per frame where both tracks have the same class and
+    boxes overlapping by at least iou_threshold; pairs are then taken one to
+    one, most votes first. Returns {track ID in boxes: track ID in previous_boxes}.
+    """
+    votes = {}
+    for frame_index, detections in boxes.items():
+        for previous_id, previous_class, previous_box in previous_boxes.get(frame_index, ()):
+            for track_id, class_name, box in detections:
+                if class_name != previous_class:
+                    continue
+                iou = calculate_iou(previous_box, box)
+                if iou >= iou_threshold:
+                    count, total = votes.get((track_id, previous_id), (0, 0.0))
+                    votes[(track_id, previous_id)] = (count + 1, total + iou)
+    mapping = {}
+    used = set()
+    for (track_id, previous_id), _ in sorted(votes.items(), key=lambda item: (-item[1][0], -item[1][1], item[0])):
+        if track_id not in mapping and previous_id not in used:
+            mapping[track_id] = previous_id
+            used.add(previous_id)
+    return mapping
+
+
+class _TrackIdAllocator:
+    """
+    Hands out IDs for new tracks the way the tracker does: one more than the
+    largest ID still held, where a track is held until it has been unseen for
+    more than TRACKING_FRAMES_TO_LOOK_BACK frames. IDs of the stitched timeline
+    therefore match those of a sequential pass, including reused IDs.
+    """
+
+    def __init__(self):
+        self._last_seen = {}
+
+    def begin_frame(self, frame_index):
+        held_since = frame_index - 1 - TRACKING_FRAMES_TO_LOOK_BACK
+        for track_id in [t for t, seen in self._last_seen.items() if seen < held_since]:
+            del self._last_seen[track_id]
+
+    def allocate(self):
+        track_id = max(self._last_seen, default=0) + 1
+        self._last_seen[track_id] = None
+        return track_id
+
+    def seen(self, track_id, frame_index):
+        self._last_seen[track_id] = frame_index
+
+
+def stitch_segments(segment_results):
+    """
+    Builds the analysis report from the segment results in order, mapping each
+    segment's track IDs to timeline-wide ones. Returns (accumulator, number of
+    tracks continued across a segment boundary).
+    """
+    accumulator = AnalysisAccumulator()
+    allocator = _TrackIdAllocator()
+    stitched = 0
+    previous_ids, previous_boxes = {}, {}
+    for result in segment_results:
+        ids = {track_id: previous_ids[previous_id]
+               for track_id, previous_id in match_tracks(previous_boxes, result['boxes']).items()
+               if previous_id in previous_ids}
+        stitched += len(ids)
+        # The tracker reuses the ID of a dropped track, so a local ID unseen for
+        # longer than the look-back window names a new track.
+        last_seen = {}
+        for frame_index in sorted(result['boxes']):
+            for track_id, _, _ in result['boxes'][frame_index]:
+                last_seen[track_id] = frame_index
+        for frame_index, detections in result['frames']:
+            allocator.begin_frame(frame_index)
+            held_since = frame_index - 1 - TRACKING_FRAMES_TO_LOOK_BACK
+            for track_id, _ in detections:
+                if last_seen.get(track_id, frame_index) < held_since:
+                    ids.pop(track_id, None)
+                last_seen[track_id] = frame_index
+            # New tracks get their IDs in creation order, which is ascending local ID.
+            for track_id in sorted(t for t, _ in detections if t not in ids):
+                ids[track_id] = allocator.allocate()
+            frame_detections = []
+            for track_id, class_name in detections:
+                allocator.seen(ids[track_id], frame_index)
+                frame_detections.append({'tracked_id': ids[track_id], 'class': class_name})
+            accumulator.add_frame(frame_detections)
+        previous_ids, previous_boxes = ids, result['boxes']
+    return accumulator, stitched
+
+
+def analyze_video_parallel(video_path, start_frame, num_frames, model_factory, wingspans_file,
+                           workers=PARALLEL_ANALYSIS_WORKERS, on_progress=None, cancel_event=None,
+                           detection_cache_factory=None, overlap=PARALLEL_OVERLAP_FRAMES):
+    """
+    Analyses [start_frame, start_frame + num_frames) (to the end of the video if
+    num_frames is None) from a fresh tracker on a pool of worker processes.
+    model_factory() and detection_cache_factory() build each worker's model and
+    detection cache; both must be picklable, e.g. a functools.partial of
+    load_model. on_progress(frames_done, frames_total) and cancel_event work as
+    in analysis.analyze_video_range, and the result has the same format.
+    Returns (result, error_message).
+    """
+    total_frames = get_video_total_frames(video_path)
+    if total_frames is None:
+        return None, "Could not open video file."
+    start_frame = max(0, min(int(start_frame), total_frames - 1))
+    end_frame = total_frames if num_frames is None else min(start_frame + int(num_frames), total_frames)
+    frames_total = end_frame - start_frame
+    segments = plan_segments(start_frame, end_frame, workers, overlap)
+    workers = max(1, min(workers, len(segments)))
+    work_total = sum(core_end - analysis_start for analysis_start, _, core_end in segments)
+
+    context = multiprocessing.get_context('spawn')
+    progress_queue = context.Queue()
+    worker_cancel = context.Event()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_worker,
+        initargs=(model_factory, wingspans_file, detection_cache_factory, progress_queue, worker_cancel, threads)
+    )
+    futures = {
+        executor.submit(_analyze_segment, i, video_path, *segment): i for i, segment in enumerate(segments)
+    }
+    done_per_segment = [0] * len(segments)
+    try:
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future.exception() is not None:
+                    raise future.exception()
+            if cancel_event is not None and cancel_event.is_set():
+                worker_cancel.set()
+            while True:
+                try:
+                    segment_index, done = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                done_per_segment[segment_index] = done
+            if on_progress is not None:
+                on_progress(sum(done_per_segment) * frames_total // work_total, frames_total)
+        segment_results = [future.result() for future in sorted(futures, key=futures.get)]
+    except Exception as e:
+        worker_cancel.set()
+        return None, f"Parallel analysis failed: {e}"
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    accumulator, stitched = stitch_segments(segment_results)
+    return {
+        "analysis": accumulator.report(),
+        "counts": dict(accumulator.counts),
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "frames_analyzed": accumulator.frames_analyzed,
+        "cancelled": bool(cancel_event is not None and cancel_event.is_set()),
+        "parallel": {
+            "workers": workers,
+            "segments": len(segments),
+            "overlap_frames": overlap,
+            "stitched_tracks": stitched,
+        },
+    }, None
@@ -0,0 +1,229 @@
+# prefetch.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from detector import read_video_frame, run_detection_on_frame, run_detection_with_cache
+
+# --- Configuration Parameters ---
+PREFETCH_DEPTH = 4                 # Frames decoded and detected ahead of the viewer
+PREFETCH_SEQUENTIAL_TRIGGER = 2    # Consecutive next-frame requests before read-ahead starts
+PREFETCH_MAX_WORKERS = 2           # Background threads shared by all sessions
+PREFETCH_WAIT_TIMEOUT_S = 10.0     # Longest a request waits for a frame the worker is producing
+PREFETCH_IDLE_TTL_S = 60.0         # Sessions without requests for this long are dropped
+
+
+def decode_only(frame_index):
+    """A should_detect predicate for read-ahead that never runs inference."""
+    return False
+
+
+class _SessionPrefetcher:
+    """Read-ahead state for one (session, video) pair."""
+
+    def __init__(self, video_path, session_key):
+        self.video_path = video_path
+        # The worker gets its own capture so it never moves the viewer's decoder.
+        self.decoder_key = (session_key, 'prefetch')
+        self.cond = threading.Condition()
+        self.buffer = {}            # frame_index -> (frame, raw_detections or None if only decoded)
+        self.should_detect = None   # Predicate for frames worth detecting ahead; None detects all
+        self.next_index = None      # Next frame the worker will produce
+        self.in_flight = None       # Frame the worker is producing right now
+        self.end_index = None       # First unreadable frame, once the worker hits it
+        self.generation = 0         # Bumped on every cancel; stale workers check it
+        self.worker_running = False
+        self.last_request = None
+        self.sequential_run = 0
+        self.last_used = time.monotonic()
+
+
+class PrefetchManager:
+    """
+    Notices sequential /process_frame access and decodes and runs detection on
+    the next frames in a background worker. Only decoding and raw inference are
+    done ahead of time; swarm logic and tracking stay on the request path, so
+    track IDs are identical to processing without prefetch. Frames a caller's
+    should_detect predicate rejects (e.g. under a motion gate, which decides on
+    the request path whether a frame needs inference) are only decoded.
+    """
+
+    def __init__(self, model, decoder_pool, depth=PREFETCH_DEPTH, max_workers=PREFETCH_MAX_WORKERS,
+                 detection_cache=None):
+        self.model = model
+        self.decoder_pool = decoder_pool
+        self.detection_cache = detection_cache
+        self.depth = depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'served': 0,      # Requests answered from the buffer
+            'waited': 0,      # Requests that waited for an in-flight frame
+            'missed': 0,      # Sequential requests processed inline
+            'produced': 0,    # Frames decoded (and detected, unless decode-only) by the worker
+            'decode_only': 0, # Produced frames that were not sent to the model
+            'discarded': 0,   # Worker results thrown away after a cancel or skip
+            'cancelled': 0,   # Read-ahead cancelled by a seek or tracker reset
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _get(self, video_path, session_key):
+        """Returns the prefetcher for (session, video), dropping idle ones on the way."""
+        key = (session_key, video_path)
+        deadline = time.monotonic() - PREFETCH_IDLE_TTL_S
+        with self._lock:
+            expired = [k for k, p in self._sessions.items() if k != key and p.last_used < deadline]
+            stale = [self._sessions.pop(k) for k in expired]
+            prefetcher = self._sessions.get(key)
+            if prefetcher is None:
+                prefetcher = _SessionPrefetcher(video_path, session_key)
+                self._sessions[key] = prefetcher
+        for p in stale:
+            with p.cond:
+                self._cancel_locked(p)
+            self.decoder_pool.close(video_path=p.video_path, session_key=p.decoder_key)
+        return prefetcher
+
+    def _cancel_locked(self, p):
+        """Drops buffered frames and invalidates the running worker. Caller holds p.cond."""
+        if p.buffer or p.worker_running:
+            self._count('cancelled')
+        p.generation += 1
+        p.buffer.clear()
+        p.next_index = None
+        p.in_flight = None
+        p.end_index = None
+        p.worker_running = False
+        p.cond.notify_all()
+
+    def fetch(self, video_path, frame_index, session_key, reset=False, should_detect=None):
+        """
+        Records a request for frame_index and returns its prefetched
+        (frame, raw_detections), or None if the frame must be processed inline.
+        raw_detections is None for a frame that was only decoded. Any access
+        that is not the next frame, and any tracker reset, cancels outstanding
+        read-ahead. If given, should_detect(frame_index) tells the worker which
+        upcoming frames to run inference on; the others are only decoded.
+        """
+        if self.model is None:
+            return None
+        p = self._get(video_path, session_key)
+        with p.cond:
+            p.last_used = time.monotonic()
+            p.should_detect = should_detect
+            sequential = not reset and p.last_request is not None and frame_index == p.last_request + 1
+            p.last_request = frame_index
+
+            if not sequential:
+                self._cancel_locked(p)
+                p.sequential_run = 0
+                return None
+            p.sequential_run += 1
+
+            generation = p.generation
+            deadline = time.monotonic() + PREFETCH_WAIT_TIMEOUT_S
+            waited = False
+            while (frame_index not in p.buffer and p.worker_running and p.generation == generation and
+                   p.in_flight is not None and p.in_flight <= frame_index):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waited = True
+                p.cond.wait(remaining)
+
+            result = p.buffer.pop(frame_index, None)
+            for index in [i for i in p.buffer if i < frame_index]:
+                del p.buffer[index]
+            if result is None and (p.next_index is None or p.next_index <= frame_index):
+                # This frame is processed inline, so the worker continues after it.
+                p.next_index = frame_index + 1
+
+            if p.sequential_run >= PREFETCH_SEQUENTIAL_TRIGGER and not p.worker_running:
+                p.worker_running = True
+                self._executor.submit(self._run, p, p.generation)
+
+        if result is not None:
+            self._count('served')
+            if waited:
+                self._count('waited')
+        else:
+            self._count('missed')
+        return result
+
+    def _run(self, p, generation):
+        """Worker loop: fills the session buffer up to `depth` frames ahead of the viewer."""
+        try:
+            while True:
+                with p.cond:
+                    if p.generation != generation:
+                        return
+                    if p.next_index is None:
+                        p.next_index = p.last_request + 1
+                    if (p.next_index > p.last_request + self.depth or
+                            (p.end_index is not None and p.next_index >= p.end_index)):
+                        return
+                    index = p.next_index
+                    p.next_index += 1
+                    p.in_flight = index
+                    should_detect = p.should_detect
+
+                frame, error = read_video_frame(p.video_path, index, self.decoder_pool, p.decoder_key)
+                detect = error is None and (should_detect is None or should_detect(index))
+                raw_detections = self._detect(p.video_path, index, frame) if detect else None
+
+                with p.cond:
+                    if p.generation != generation:
+                        self._count('discarded')
+                        return
+                    p.in_flight = None
+                    if error:
+                        p.end_index = index
+                        p.cond.notify_all()
+                        return
+                    if index > p.last_request:
+                        p.buffer[index] = (frame, raw_detections)
+                        self._count('produced')
+                        if not detect:
+                            self._count('decode_only')
+                    else:
+                        self._count('discarded')
+                    p.cond.notify_all()
+        except Exception as e:
+            print(f"Error in prefetch worker for {p.video_path}: {e}")
+        finally:
+            with p.cond:
+                if p.generation == generation:
+                    p.worker_running = False
+                    p.in_flight = None
+                    p.cond.notify_all()
+
+    def _detect(self, video_path, frame_index, frame):
+        """Raw detections for a prefetched frame, from the detection cache when possible."""
+        if self.detection_cache is None:
+            return run_detection_on_frame(frame, self.model)
+        raw_detections = self.detection_cache.get(video_path, frame_index, self.model.names)
+        if raw_detections is None:
+            raw_detections = run_detection_with_cache(video_path, [frame_index], [frame], self.model,
+                                                      self.detection_cache)[0]
+        return raw_detections
+
+    def cancel(self, video_path, session_key):
+        """Cancels read-ahead for one session and video."""
+        with self._lock:
+            p = self._sessions.get((session_key, video_path))
+        if p is not None:
+            with p.cond:
+                self._cancel_locked(p)
+
+    def stats(self):
+        """Returns prefetch counters and the number of buffered frames."""
+        with self._lock:
+            stats = dict(self._counters)
+            sessions = list(self._sessions.values())
+        stats['sessions'] = len(sessions)
+        stats['buffered_frames'] = sum(len(p.buffer) for p in sessions)
+        return stats
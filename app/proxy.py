@@ -0,0 +1,355 @@
+# proxy.py
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- Configuration Parameters ---
+PROXY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'proxies')
+PROXY_WORKERS = 1                  # Transcodes that run at the same time; each one keeps a CPU core busy
+PROXY_MAX_HEIGHT = 480             # Proxies are downscaled to at most this height
+PROXY_GOP = 12                     # Keyframe interval of the H.264 proxy; a seek decodes at most this many frames
+PROXY_CRF = 28                     # H.264 quality of the proxy; it is only ever shown as a preview
+PROXY_MJPEG_QUALITY = 80           # JPEG quality of the all-intra fallback proxy
+PROXY_FFMPEG_TIMEOUT_S = 3600
+THUMBNAIL_COUNT = 100              # Thumbnails in the slider strip, evenly spaced over the video
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_JPEG_QUALITY = 70
+
+PROXY_MISSING = 'missing'
+PROXY_QUEUED = 'queued'
+PROXY_RUNNING = 'running'
+PROXY_READY = 'ready'
+PROXY_FAILED = 'failed'
+
+_PROXY_INFO_FILE = 'proxy.json'
+_THUMBNAILS_FILE = 'thumbnails.jpg'
+_TRANSCODE_SHARE = 0.9             # Share of the progress bar taken by the transcode; thumbnails take the rest
+
+
+def _proxy_size(width, height):
+    """Proxy resolution for a source resolution: at most PROXY_MAX_HEIGHT high, even dimensions."""
+    scale = min(1.0, PROXY_MAX_HEIGHT / height) if height else 1.0
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+def _source_identity(video_path):
+    stat = os.stat(video_path)
+    return {'source_mtime_ns': stat.st_mtime_ns, 'source_size': stat.st_size}
+
+
+def _video_properties(video_path):
+    """(frame count, fps, width, height) of a video, or None if it cannot be opened."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        return (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS) or 0.0,
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+
+
+def _transcode_ffmpeg(video_path, output_path, size, frame_count, on_progress):
+    """
+    Short-GOP H.264 proxy with ffmpeg: a fixed keyframe interval without scene-cut
+    keyframes, every source frame kept (no frame rate conversion) so frame indices
+    match the original, and the index at the front so browsers can seek at once.
+    """
+    command = [
+        'ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', video_path,
+        '-map', '0:v:0', '-an', '-sn', '-vf', f'scale={size[0]}:{size[1]}', '-vsync', 'passthrough',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(PROXY_CRF), '-pix_fmt', 'yuv420p',
+        '-g', str(PROXY_GOP), '-keyint_min', str(PROXY_GOP), '-sc_threshold', '0', '-movflags', '+faststart',
+        '-progress', 'pipe:1', '-nostats', output_path,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    timer = threading.Timer(PROXY_FFMPEG_TIMEOUT_S, process.kill)
+    timer.start()
+    try:
+        # -progress writes key=value blocks; frame= is the number of frames encoded so far.
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'frame' and value.isdigit() and frame_count:
+                on_progress(min(1.0, int(value) / frame_count))
+        error_output = process.stderr.read()
+        process.wait()
+    finally:
+        timer.cancel()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({process.returncode}): {error_output.strip()[-500:]}")
+
+
+def _transcode_opencv(video_path, output_path, size, fps, frame_count, on_progress):
+    """All-intra Motion JPEG proxy written with OpenCV, for hosts without ffmpeg."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open {video_path}.")
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'MJPG'), fps or 25.0, size)
+    if not writer.isOpened():
+        cap.release()
+        raise IOError("Could not create the MJPEG proxy writer.")
+    writer.set(cv2.VIDEOWRITER_PROP_QUALITY, PROXY_MJPEG_QUALITY)
+    frames_written = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+            frames_written += 1
+            if frame_count and frames_written % 25 == 0:
+                on_progress(min(1.0, frames_written / frame_count))
+    finally:
+        writer.release()
+        cap.release()
+    if frames_written == 0:
+        raise IOError(f"No frames could be read from {video_path}.")
+
+
+def build_thumbnail_strip(video_path, output_path, count=THUMBNAIL_COUNT, width=THUMBNAIL_WIDTH,
+                          on_progress=None):
+    """
+    Writes evenly spaced thumbnails of a video side by side into one JPEG
+    sprite, so the slider preview is a single download. Meant to run on the
+    proxy, where each seek is cheap. Returns the strip layout.
+    """
+    properties = _video_properties(video_path)
+    if properties is None:
+        raise IOError(f"Could not open {video_path}.")
+    frame_count, _, video_width, video_height = properties
+    count = max(1, min(count, frame_count))
+    height = max(2, int(round(video_height * width / video_width)))
+    frame_indices = [int(i) for i in np.linspace(0, max(0, frame_count - 1), count).round()]
+    strip = np.zeros((height, width * count, 3), np.uint8)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for position, frame_index in enumerate(frame_indices):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = cap.read()
+            if ret:
+                strip[:, position * width:(position + 1) * width] = cv2.resize(frame, (width, height),
+                                                                                interpolation=cv2.INTER_AREA)
+            if on_progress is not None:
+                on_progress((position + 1) / count)
+    finally:
+        cap.release()
+    cv2.imwrite(output_path, strip, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+    return {'count': count, 'width': width, 'height': height, 'frame_indices': frame_indices}
+
+
+def create_proxy(video_path, target_dir, on_progress=None):
+    """
+    Transcodes video_path into a low-resolution proxy in target_dir: short-GOP
+    H.264 when ffmpeg is installed, all-intra Motion JPEG otherwise. Then
+    builds the thumbnail strip from the proxy. Writes into a private directory
+    that is moved into place when complete. Returns the proxy info dict.
+    """
+    on_progress = on_progress or (lambda fraction: None)
+    identity = _source_identity(video_path)
+    properties = _video_properties(video_path)
+    if properties is None:
+        raise IOError(f"Could not open {video_path}.")
+    frame_count, fps, width, height = properties
+    size = _proxy_size(width, height)
+
+    work_dir = f"{target_dir}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(work_dir)
+    try:
+        start = time.time()
+        if shutil.which('ffmpeg'):
+            proxy_file, encoder = 'proxy.mp4', 'h264'
+            _transcode_ffmpeg(video_path, os.path.join(work_dir, proxy_file), size, frame_count,
+                              lambda fraction: on_progress(fraction * _TRANSCODE_SHARE))
+        else:
+            proxy_file, encoder = 'proxy.avi', 'mjpeg'
+            _transcode_opencv(video_path, os.path.join(work_dir, proxy_file), size, fps, frame_count,
+                              lambda fraction: on_progress(fraction * _TRANSCODE_SHARE))
+        proxy_properties = _video_properties(os.path.join(work_dir, proxy_file))
+        if proxy_properties is None:
+            raise IOError("The proxy could not be read back.")
+        thumbnails = build_thumbnail_strip(
+            os.path.join(work_dir, proxy_file), os.path.join(work_dir, _THUMBNAILS_FILE),
+            on_progress=lambda fraction: on_progress(_TRANSCODE_SHARE + fraction * (1 - _TRANSCODE_SHARE))
+        )
+        info = {
+            **identity,
+            'proxy_file': proxy_file,
+            'encoder': encoder,
+            # Browsers play H.264 MP4 but not Motion JPEG AVI.
+            'browser_playable': encoder == 'h264',
+            'width': size[0],
+            'height': size[1],
+            'frame_count': proxy_properties[0],
+            'source_width': width,
+            'source_height': height,
+            'source_frame_count': frame_count,
+            'fps': fps,
+            'thumbnails': thumbnails,
+            'transcode_seconds': time.time() - start,
+        }
+        with open(os.path.join(work_dir, _PROXY_INFO_FILE), 'w') as f:
+            json.dump(info, f, indent=2)
+        shutil.rmtree(target_dir, ignore_errors=True)  # A stale proxy of an older version of the file
+        os.rename(work_dir, target_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    return info
+
+
+def proxy_frame_index(info, frame_index):
+    """
+    Maps a frame index of the original to the proxy. Both normally have the
+    same frames; if a transcode dropped or added some, the index is scaled.
+    """
+    source_count, proxy_count = info['source_frame_count'], info['frame_count']
+    if source_count == proxy_count or source_count <= 1 or proxy_count <= 0:
+        return frame_index
+    return min(proxy_count - 1, int(round(frame_index * (proxy_count - 1) / (source_count - 1))))
+
+
+class _ProxyJob:
+    __slots__ = ('status', 'progress', 'error', 'future')
+
+    def __init__(self):
+        self.status = PROXY_QUEUED
+        self.progress = 0.0
+        self.error = None
+        self.future = None
+
+
+class ProxyManager:
+    """
+    Creates low-resolution proxies and thumbnail strips of videos on a small
+    background pool, for scrubbing and previews. Detection always runs on the
+    original. Proxies are stored under cache_dir per video path and are
+    rebuilt when the video's mtime or size changes.
+    """
+
+    def __init__(self, cache_dir=PROXY_DIR, max_workers=PROXY_WORKERS):
+        self.cache_dir = cache_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='proxy')
+        self._jobs = {}    # video path -> _ProxyJob of a queued, running or failed transcode
+        self._info = {}    # video path -> info of a finished proxy
+        self._missing = {}  # video path -> source identity known to have no stored proxy
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'failed': 0, 'transcode_seconds': 0.0}
+
+    def _target_dir(self, video_path):
+        return os.path.join(self.cache_dir, hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:16])
+
+    def _load_info(self, video_path):
+        """
+        Info of the stored proxy if it matches the current file. The manifest is
+        read from disk once per version of the file; after that only the file
+        is stat'ed. Caller holds self._lock.
+        """
+        try:
+            identity = _source_identity(video_path)
+        except OSError:
+            return None
+        info = self._info.get(video_path)
+        if info is None:
+            if self._missing.get(video_path) == identity:
+                return None
+            try:
+                with open(os.path.join(self._target_dir(video_path), _PROXY_INFO_FILE)) as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                self._missing[video_path] = identity
+                return None
+        if {key: info[key] for key in ('source_mtime_ns', 'source_size')} != identity:
+            self._info.pop(video_path, None)
+            self._missing[video_path] = identity
+            return None
+        self._info[video_path] = info
+        return info
+
+    def request(self, video_path):
+        """Starts creating the proxy unless it exists or is in progress. Returns status()."""
+        with self._lock:
+            job = self._jobs.get(video_path)
+            if self._load_info(video_path) is None and (job is None or job.status == PROXY_FAILED):
+                job = _ProxyJob()
+                self._jobs[video_path] = job
+                job.future = self._executor.submit(self._run, video_path, job)
+        return self.status(video_path)
+
+    def _run(self, video_path, job):
+        with self._lock:
+            job.status = PROXY_RUNNING
+
+        def on_progress(fraction):
+            job.progress = fraction
+
+        try:
+            info = create_proxy(video_path, self._target_dir(video_path), on_progress)
+        except Exception as e:
+            print(f"Proxy for {video_path} failed: {e}")
+            with self._lock:
+                job.status, job.error = PROXY_FAILED, str(e)
+                self._counters['failed'] += 1
+            return
+        print(f"Created {info['encoder']} proxy for {video_path} in {info['transcode_seconds']:.1f}s.")
+        with self._lock:
+            self._info[video_path] = info
+            self._missing.pop(video_path, None)
+            self._jobs.pop(video_path, None)
+            self._counters['created'] += 1
+            self._counters['transcode_seconds'] += info['transcode_seconds']
+
+    def status(self, video_path):
+        """JSON-friendly proxy state: status, progress and, once ready, the proxy and thumbnail layout."""
+        with self._lock:
+            info = self._load_info(video_path)
+            job = self._jobs.get(video_path)
+            if info is not None:
+                return {
+                    'status': PROXY_READY,
+                    'progress': 1.0,
+                    'encoder': info['encoder'],
+                    'browser_playable': info['browser_playable'],
+                    'width': info['width'],
+                    'height': info['height'],
+                    'source_width': info['source_width'],
+                    'source_height': info['source_height'],
+                    'thumbnails': info['thumbnails'],
+                }
+            if job is None:
+                return {'status': PROXY_MISSING, 'progress': 0.0}
+            return {'status': job.status, 'progress': job.progress, 'error': job.error}
+
+    def proxy_info(self, video_path):
+        """Info of the finished proxy of video_path, or None."""
+        with self._lock:
+            return self._load_info(video_path)
+
+    def proxy_path(self, video_path):
+        """Path of the finished proxy video, or None."""
+        info = self.proxy_info(video_path)
+        return os.path.join(self._target_dir(video_path), info['proxy_file']) if info else None
+
+    def thumbnails_path(self, video_path):
+        """Path of the finished thumbnail strip, or None."""
+        info = self.proxy_info(video_path)
+        return os.path.join(self._target_dir(video_path), _THUMBNAILS_FILE) if info else None
+
+    def stats(self):
+        """Returns the number of proxies created, failed and in progress."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['ready'] = len(self._info)
+            for state in (PROXY_QUEUED, PROXY_RUNNING):
+                stats[state] = sum(1 for job in self._jobs.values() if job.status == state)
+        return stats
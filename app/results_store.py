@@ -0,0 +1,411 @@
+# results_store.py
+import os
+import sqlite3
+import threading
+
+# --- Configuration Parameters ---
+RESULTS_BATCH_FRAMES = 256         # Pending frames that trigger a write
+RESULTS_FLUSH_INTERVAL_S = 1.0     # Pending frames are written at least this often
+RESULTS_TIME_BIN_S = 60            # Width of the timeline bins, in seconds of video
+RESULTS_GRID_SIZE = 16             # Density grid cells per side, over the normalized frame
+RESULTS_DEFAULT_FPS = 30.0         # Used to place frames in time bins when a video's fps is unknown
+RESULTS_MAX_DETECTION_ROWS = 10000  # Upper limit on rows returned by detections()
+
+_SCHEMA = (
+    # One row per (file version, model); a changed file or model starts a new video_id.
+    'CREATE TABLE IF NOT EXISTS videos ('
+    ' video_id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL, model_key TEXT NOT NULL, fps REAL NOT NULL, width INTEGER, height INTEGER,'
+    ' recorded_at REAL NOT NULL, frames INTEGER NOT NULL DEFAULT 0,'
+    ' UNIQUE (path, mtime_ns, size, model_key))',
+    'CREATE INDEX IF NOT EXISTS videos_recorded_at ON videos (recorded_at)',
+    # canonical: the track IDs are those of an uninterrupted pass from frame 0.
+    'CREATE TABLE IF NOT EXISTS frames ('
+    ' video_id INTEGER NOT NULL, frame_index INTEGER NOT NULL, canonical INTEGER NOT NULL,'
+    ' PRIMARY KEY (video_id, frame_index)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS detections ('
+    ' video_id INTEGER NOT NULL, frame_index INTEGER NOT NULL, class TEXT NOT NULL, track_id INTEGER,'
+    ' x1 REAL, y1 REAL, x2 REAL, y2 REAL, confidence REAL, distance_m REAL)',
+    'CREATE INDEX IF NOT EXISTS detections_video_frame ON detections (video_id, frame_index)',
+    'CREATE INDEX IF NOT EXISTS detections_class_video ON detections (class, video_id, frame_index)',
+    # Aggregates, updated with every written batch.
+    'CREATE TABLE IF NOT EXISTS class_totals ('
+    ' video_id INTEGER NOT NULL, class TEXT NOT NULL, detections INTEGER NOT NULL,'
+    ' PRIMARY KEY (video_id, class)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS tracks ('
+    ' video_id INTEGER NOT NULL, track_id INTEGER NOT NULL, class TEXT NOT NULL, first_frame INTEGER NOT NULL,'
+    ' last_frame INTEGER NOT NULL, frames INTEGER NOT NULL,'
+    ' PRIMARY KEY (video_id, track_id, class)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS frame_bins ('
+    ' video_id INTEGER NOT NULL, bin INTEGER NOT NULL, frames INTEGER NOT NULL,'
+    ' PRIMARY KEY (video_id, bin)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS class_bins ('
+    ' video_id INTEGER NOT NULL, bin INTEGER NOT NULL, class TEXT NOT NULL, detections INTEGER NOT NULL,'
+    ' new_tracks INTEGER NOT NULL, PRIMARY KEY (video_id, bin, class)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS density ('
+    ' video_id INTEGER NOT NULL, class TEXT NOT NULL, cell INTEGER NOT NULL, detections INTEGER NOT NULL,'
+    ' PRIMARY KEY (video_id, class, cell)) WITHOUT ROWID',
+)
+
+
+class ResultsStore:
+    """
+    Tracked detections of every processed frame (class, track ID, box,
+    confidence, distance) in SQLite, indexed by video, frame and class, with
+    per-class totals, unique tracks, per-minute timelines and spatial density
+    grids maintained incrementally as frames are written. record() only
+    queues a frame; a writer thread appends the queue in batches.
+
+    Each frame is stored once per video version and model. Frames recorded
+    with non-canonical track IDs (after a seek the tracker could not restore)
+    count as detections but not as tracks, and are replaced when the frame is
+    later seen as part of an uninterrupted pass.
+    """
+
+    def __init__(self, db_path, model_key='', metadata_lookup=None, batch_frames=RESULTS_BATCH_FRAMES,
+                 flush_interval_s=RESULTS_FLUSH_INTERVAL_S):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.model_key = model_key
+        self.metadata_lookup = metadata_lookup  # video_path -> dict with fps, width, height, or None
+        self.batch_frames = batch_frames
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()          # Guards the connection
+        self._pending_lock = threading.Lock()  # Guards _pending
+        self._flush_lock = threading.Lock()    # One batch written at a time, in order
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._pending = []
+        self._videos = {}  # path -> (mtime_ns, size, video_id, fps, width, height)
+        self._counters = {'frames_recorded': 0, 'frames_skipped': 0, 'frames_replaced': 0,
+                          'detections_recorded': 0, 'batches': 0}
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='results-writer', daemon=True)
+        self._writer.start()
+
+    # --- Writing ---
+
+    def record(self, video_path, frame_index, detections, canonical=True):
+        """
+        Queues the tracked detections of one frame, as returned to the frontend
+        (class, tracked_id, box, confidence, distance_m). With canonical=False
+        the track IDs are not trusted.
+        """
+        rows = [
+            (det.get('class'), det.get('tracked_id') if canonical else None, *(det.get('box') or (None,) * 4),
+             det.get('confidence'), det.get('distance_m'))
+            for det in detections
+        ]
+        with self._pending_lock:
+            self._pending.append((video_path, int(frame_index), bool(canonical), rows))
+            full = len(self._pending) >= self.batch_frames
+        if full:
+            self._wake.set()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Could not write detection results: {e}")
+
+    def flush(self):
+        """Writes all queued frames now."""
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            videos = {}
+            for video_path, _, _, _ in batch:
+                if video_path not in videos:
+                    videos[video_path] = self._video(video_path)
+            with self._lock:
+                try:
+                    self._write_batch_locked(batch, videos)
+                    self._conn.commit()
+                except Exception:
+                    self._conn.rollback()
+                    raise
+
+    def _video(self, video_path):
+        """(video_id, fps, width, height) of the current version of a file, registered on first use."""
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        cached = self._videos.get(video_path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2:]
+        metadata = self.metadata_lookup(video_path) if self.metadata_lookup is not None else None
+        metadata = metadata or {}
+        fps = metadata.get('fps') or RESULTS_DEFAULT_FPS
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO videos (path, mtime_ns, size, model_key, fps, width, height, recorded_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (video_path, stat.st_mtime_ns, stat.st_size, self.model_key, fps, metadata.get('width'),
+                 metadata.get('height'), stat.st_mtime)
+            )
+            row = self._conn.execute(
+                'SELECT video_id, fps, width, height FROM videos'
+                ' WHERE path = ? AND mtime_ns = ? AND size = ? AND model_key = ?',
+                (video_path, stat.st_mtime_ns, stat.st_size, self.model_key)
+            ).fetchone()
+            self._conn.commit()
+        self._videos[video_path] = (stat.st_mtime_ns, stat.st_size, *row)
+        return row
+
+    def _grid_cell(self, box, width, height):
+        if not width or not height or box[0] is None:
+            return None
+        cx = min(max((box[0] + box[2]) / 2 / width, 0.0), 0.999999)
+        cy = min(max((box[1] + box[3]) / 2 / height, 0.0), 0.999999)
+        return int(cy * RESULTS_GRID_SIZE) * RESULTS_GRID_SIZE + int(cx * RESULTS_GRID_SIZE)
+
+    def _write_batch_locked(self, batch, videos):
+        conn = self._conn
+        class_totals, frame_bins, class_bins, density, tracks = {}, {}, {}, {}, {}  # Increments
+        frame_rows, detection_rows, frame_counts = [], [], {}
+        seen = set()
+
+        def add(counter, key, amount=1):
+            counter[key] = counter.get(key, 0) + amount
+
+        for video_path, frame_index, canonical, rows in batch:
+            video = videos.get(video_path)
+            if video is None:
+                continue
+            video_id, fps, width, height = video
+            existing = conn.execute('SELECT canonical FROM frames WHERE video_id = ? AND frame_index = ?',
+                                    (video_id, frame_index)).fetchone()
+            if (video_id, frame_index) in seen or (existing is not None and (existing[0] or not canonical)):
+                self._counters['frames_skipped'] += 1
+                continue
+            seen.add((video_id, frame_index))
+            time_bin = int(frame_index / fps // RESULTS_TIME_BIN_S)
+            if existing is not None:
+                # A canonical pass replaces the frame's earlier, untracked detections.
+                for class_name, x1, y1, x2, y2 in conn.execute(
+                        'SELECT class, x1, y1, x2, y2 FROM detections WHERE video_id = ? AND frame_index = ?',
+                        (video_id, frame_index)).fetchall():
+                    add(class_totals, (video_id, class_name), -1)
+                    add(class_bins, (video_id, time_bin, class_name), -1)
+                    cell = self._grid_cell((x1, y1, x2, y2), width, height)
+                    if cell is not None:
+                        add(density, (video_id, class_name, cell), -1)
+                conn.execute('DELETE FROM detections WHERE video_id = ? AND frame_index = ?', (video_id, frame_index))
+                add(frame_bins, (video_id, time_bin), -1)
+                add(frame_counts, video_id, -1)
+                self._counters['frames_replaced'] += 1
+            frame_rows.append((video_id, frame_index, int(canonical)))
+            add(frame_bins, (video_id, time_bin))
+            add(frame_counts, video_id)
+            for class_name, track_id, x1, y1, x2, y2, confidence, distance_m in rows:
+                detection_rows.append((video_id, frame_index, class_name, track_id, x1, y1, x2, y2, confidence,
+                                       distance_m))
+                add(class_totals, (video_id, class_name))
+                add(class_bins, (video_id, time_bin, class_name))
+                cell = self._grid_cell((x1, y1, x2, y2), width, height)
+                if cell is not None:
+                    add(density, (video_id, class_name, cell))
+                if track_id is not None:
+                    key = (video_id, track_id, class_name)
+                    first, last, frames, first_bin = tracks.get(key, (frame_index, frame_index, 0, time_bin))
+                    if frame_index < first:
+                        first, first_bin = frame_index, time_bin
+                    tracks[key] = (first, max(last, frame_index), frames + 1, first_bin)
+            self._counters['frames_recorded'] += 1
+            self._counters['detections_recorded'] += len(rows)
+
+        # Tracks seen for the first time count as new in the bin they start in.
+        new_tracks = {}
+        for (video_id, track_id, class_name), (_, _, _, first_bin) in tracks.items():
+            known = conn.execute('SELECT 1 FROM tracks WHERE video_id = ? AND track_id = ? AND class = ?',
+                                 (video_id, track_id, class_name)).fetchone()
+            if known is None:
+                add(new_tracks, (video_id, first_bin, class_name))
+
+        conn.executemany('INSERT OR REPLACE INTO frames (video_id, frame_index, canonical) VALUES (?, ?, ?)',
+                         frame_rows)
+        conn.executemany(
+            'INSERT INTO detections (video_id, frame_index, class, track_id, x1, y1, x2, y2, confidence, distance_m)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', detection_rows
+        )
+        conn.executemany(
+            'INSERT INTO class_totals (video_id, class, detections) VALUES (?, ?, ?)'
+            ' ON CONFLICT (video_id, class) DO UPDATE SET detections = detections + excluded.detections',
+            [(*key, count) for key, count in class_totals.items()]
+        )
+        conn.executemany(
+            'INSERT INTO frame_bins (video_id, bin, frames) VALUES (?, ?, ?)'
+            ' ON CONFLICT (video_id, bin) DO UPDATE SET frames = frames + excluded.frames',
+            [(*key, count) for key, count in frame_bins.items()]
+        )
+        conn.executemany(
+            'INSERT INTO class_bins (video_id, bin, class, detections, new_tracks) VALUES (?, ?, ?, ?, ?)'
+            ' ON CONFLICT (video_id, bin, class) DO UPDATE SET detections = detections + excluded.detections,'
+            ' new_tracks = new_tracks + excluded.new_tracks',
+            [(*key, class_bins.get(key, 0), new_tracks.get(key, 0)) for key in set(class_bins) | set(new_tracks)]
+        )
+        conn.executemany(
+            'INSERT INTO density (video_id, class, cell, detections) VALUES (?, ?, ?, ?)'
+            ' ON CONFLICT (video_id, class, cell) DO UPDATE SET detections = detections + excluded.detections',
+            [(*key, count) for key, count in density.items()]
+        )
+        conn.executemany(
+            'INSERT INTO tracks (video_id, track_id, class, first_frame, last_frame, frames) VALUES (?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (video_id, track_id, class) DO UPDATE SET'
+            ' first_frame = MIN(first_frame, excluded.first_frame), last_frame = MAX(last_frame, excluded.last_frame),'
+            ' frames = frames + excluded.frames',
+            [(*key, first, last, frames) for key, (first, last, frames, _) in tracks.items()]
+        )
+        conn.executemany('UPDATE videos SET frames = frames + ? WHERE video_id = ?',
+                         [(count, video_id) for video_id, count in frame_counts.items()])
+        self._counters['batches'] += 1
+
+    # --- Queries ---
+
+    def _video_ids_locked(self, video_path=None, since=None, until=None):
+        """Ids of the stored videos of the current model matching the filters."""
+        query = 'SELECT video_id FROM videos WHERE model_key = ?'
+        params = [self.model_key]
+        if video_path is not None:
+            query += ' AND path = ?'
+            params.append(video_path)
+        if since is not None:
+            query += ' AND recorded_at >= ?'
+            params.append(since)
+        if until is not None:
+            query += ' AND recorded_at < ?'
+            params.append(until)
+        return [row[0] for row in self._conn.execute(query, params)]
+
+    @staticmethod
+    def _filter(column, values):
+        placeholders = ','.join('?' * len(values))
+        return f'{column} IN ({placeholders})', list(values)
+
+    def summary(self, video_path=None, since=None, until=None, class_name=None):
+        """
+        Per-class detections, unique tracks and their rates per minute of
+        processed video, over the videos matching the filters. since/until
+        are Unix times compared with the file's modification time.
+        """
+        self.flush()
+        with self._lock:
+            video_ids = self._video_ids_locked(video_path, since, until)
+            videos_filter, params = self._filter('video_id', video_ids)
+            frames_row = self._conn.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(frames), 0), COALESCE(SUM(frames / fps), 0.0) FROM videos'
+                f' WHERE {videos_filter} AND frames > 0', params
+            ).fetchone()
+            class_filter = ' AND class = ?' if class_name is not None else ''
+            class_params = [class_name] if class_name is not None else []
+            detections = self._conn.execute(
+                f'SELECT class, SUM(detections) FROM class_totals WHERE {videos_filter}{class_filter} GROUP BY class',
+                params + class_params
+            ).fetchall()
+            tracks = dict(self._conn.execute(
+                f'SELECT class, COUNT(*) FROM tracks WHERE {videos_filter}{class_filter} GROUP BY class',
+                params + class_params
+            ).fetchall())
+        videos, frames, seconds = frames_row
+        minutes = seconds / 60
+        classes = {}
+        for name, count in detections:
+            if not count:
+                continue
+            unique_tracks = tracks.get(name, 0)
+            classes[name] = {
+                'detections': count,
+                'unique_tracks': unique_tracks,
+                'detections_per_minute': round(count / minutes, 3) if minutes else None,
+                'tracks_per_minute': round(unique_tracks / minutes, 3) if minutes else None,
+            }
+        return {'videos': videos, 'frames': frames, 'duration_s': round(seconds, 3), 'classes': classes}
+
+    def timeline(self, video_path=None, since=None, until=None, class_name=None):
+        """Frames, detections and new tracks per RESULTS_TIME_BIN_S of video, summed over matching videos."""
+        self.flush()
+        with self._lock:
+            videos_filter, params = self._filter('video_id', self._video_ids_locked(video_path, since, until))
+            frame_bins = self._conn.execute(
+                f'SELECT bin, SUM(frames) FROM frame_bins WHERE {videos_filter} GROUP BY bin ORDER BY bin', params
+            ).fetchall()
+            class_filter = ' AND class = ?' if class_name is not None else ''
+            class_bins = self._conn.execute(
+                f'SELECT bin, class, SUM(detections), SUM(new_tracks) FROM class_bins'
+                f' WHERE {videos_filter}{class_filter} GROUP BY bin, class',
+                params + ([class_name] if class_name is not None else [])
+            ).fetchall()
+        bins = {time_bin: {'start_s': time_bin * RESULTS_TIME_BIN_S, 'frames': frames, 'classes': {}}
+                for time_bin, frames in frame_bins if frames}
+        for time_bin, name, count, new_tracks in class_bins:
+            if time_bin in bins and (count or new_tracks):
+                bins[time_bin]['classes'][name] = {'detections': count, 'new_tracks': new_tracks}
+        return {'bin_s': RESULTS_TIME_BIN_S, 'bins': [bins[time_bin] for time_bin in sorted(bins)]}
+
+    def density(self, video_path=None, since=None, until=None, class_name=None):
+        """Detection counts on a RESULTS_GRID_SIZE square grid over the frame, by box centre."""
+        self.flush()
+        with self._lock:
+            videos_filter, params = self._filter('video_id', self._video_ids_locked(video_path, since, until))
+            class_filter = ' AND class = ?' if class_name is not None else ''
+            cells = self._conn.execute(
+                f'SELECT cell, SUM(detections) FROM density WHERE {videos_filter}{class_filter} GROUP BY cell',
+                params + ([class_name] if class_name is not None else [])
+            ).fetchall()
+        grid = [[0] * RESULTS_GRID_SIZE for _ in range(RESULTS_GRID_SIZE)]
+        for cell, count in cells:
+            grid[cell // RESULTS_GRID_SIZE][cell % RESULTS_GRID_SIZE] = count
+        return {'grid_size': RESULTS_GRID_SIZE, 'grid': grid}
+
+    def detections(self, video_path, start_frame=0, end_frame=None, class_name=None,
+                   limit=RESULTS_MAX_DETECTION_ROWS):
+        """Stored detections of one video in [start_frame, end_frame), in frame order."""
+        self.flush()
+        query = ('SELECT frame_index, class, track_id, x1, y1, x2, y2, confidence, distance_m FROM detections'
+                 ' WHERE video_id = ? AND frame_index >= ?')
+        with self._lock:
+            video_ids = self._video_ids_locked(video_path)
+            if not video_ids:
+                return []
+            params = [video_ids[-1], start_frame]
+            if end_frame is not None:
+                query += ' AND frame_index < ?'
+                params.append(end_frame)
+            if class_name is not None:
+                query += ' AND class = ?'
+                params.append(class_name)
+            query += ' ORDER BY frame_index LIMIT ?'
+            params.append(min(limit, RESULTS_MAX_DETECTION_ROWS))
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {'frame_index': frame_index, 'class': name, 'tracked_id': track_id,
+             'box': [x1, y1, x2, y2] if x1 is not None else None, 'confidence': confidence,
+             'distance_m': distance_m}
+            for frame_index, name, track_id, x1, y1, x2, y2, confidence, distance_m in rows
+        ]
+
+    def close(self):
+        """Writes what is queued and stops the writer thread."""
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        """Returns write counters and the number of queued frames."""
+        with self._pending_lock:
+            pending = len(self._pending)
+        with self._lock:
+            stats = dict(self._counters)
+        stats['pending_frames'] = pending
+        return stats
@@ -18,6 +18,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const analyzeVideoBtn = document.getElementById('analyze-video-btn');
     const analysisResults = document.getElementById('analysis-results');
     const analysisSpinner = document.getElementById('analysis-spinner');
+    const analyzeFullBtn = document.getElementById('analyze-full-btn');
+    const cancelAnalysisBtn = document.getElementById('cancel-analysis-btn');
+    const analysisProgress = document.getElementById('analysis-progress');
+    const clientOverlayToggle = document.getElementById('client-overlay-toggle');
+    const clientOverlayContainer = document.getElementById('client-overlay-container');
+    const sourceVideo = document.getElementById('source-video');
+    const overlayCanvas = document.getElementById('overlay-canvas');
+    const proxyStatusDisplay = document.getElementById('proxy-status');
+    const sliderPreview = document.getElementById('slider-preview');
+    const sliderPreviewLabel = document.getElementById('slider-preview-label');
 
     let currentVideo = null;
     let totalFrames = 0;
@@ -26,6 +36,23 @@ document.addEventListener('DOMContentLoaded', () => {
     let isPlaying = false;
     let playbackIntervalId = null;
     let isCurrentVideoSessionFile = false; // Track if the current video is a session file
+    const ANALYSIS_NUM_FRAMES = 30; // Frames analysed per "Analyze" click
+    // Frames arrive as binary multipart parts instead of base64 inside JSON.
+    const FRAME_IMAGE_FORMAT = 'jpeg'; // 'jpeg' or 'webp'
+    const FRAME_IMAGE_QUALITY = 80;
+    let frameObjectUrl = null;
+    let currentFps = 0;
+    let lastDetections = [];
+    let analysisJobId = null;
+    let analysisEvents = null;
+    // Low-resolution proxy of the current video (see /proxy): thumbnails for the
+    // slider, cheap preview frames while scrubbing and a fast-seeking <video> source.
+    let proxyStatus = null;
+    let proxyPollId = null;
+    let isScrubbing = false;
+    let previewInFlight = false;
+    const PROXY_POLL_MS = 1000;
+    const UPLOAD_MAX_RETRIES = 5; // Attempts to resume an upload after network errors, with growing delays
 
     // --- Video List Management ---
 
@@ -50,7 +77,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 li.dataset.filename = video.filename; // Use the actual filename
                 li.dataset.totalFrames = video.total_frames;
                 li.dataset.isSessionFile = video.is_session_file;
-                li.addEventListener('click', () => selectVideo(video.filename, video.total_frames, video.is_session_file));
+                li.addEventListener('click', () => selectVideo(video.filename, video.total_frames, video.is_session_file, video.fps));
                 videoList.appendChild(li);
             }
         } catch (error) {
@@ -59,10 +86,13 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
-    function selectVideo(filename, frames, isSessionFile) {
+    function selectVideo(filename, frames, isSessionFile, fps) {
         currentVideo = filename;
         totalFrames = frames;
         isCurrentVideoSessionFile = isSessionFile;
+        currentFps = fps || 0;
+        sourceVideo.removeAttribute('src');
+        lastDetections = [];
 
         document.querySelectorAll('#video-list li').forEach(li => {
             li.classList.toggle('active', li.dataset.filename === filename && (li.dataset.isSessionFile === String(isSessionFile)));
@@ -79,11 +109,106 @@ document.addEventListener('DOMContentLoaded', () => {
         playBtn.disabled = false;
         resetTrackerBtn.disabled = false;
         analyzeVideoBtn.disabled = false;
+        analyzeFullBtn.disabled = false;
 
         currentFrameIndex = 0;
+        proxyStatus = null;
+        sliderPreview.style.display = 'none';
+        loadProxyStatus();
+        applyOverlayMode();
         processFrame(currentFrameIndex, true); // Process first frame and reset tracker
     }
 
+    // --- Scrubbing Proxy ---
+
+    function videoParams(extra = {}) {
+        return new URLSearchParams({
+            video_filename: currentVideo,
+            is_session_file: isCurrentVideoSessionFile,
+            ...extra
+        });
+    }
+
+    async function loadProxyStatus() {
+        const video = currentVideo;
+        try {
+            const response = await fetch(`/proxy?${videoParams()}`);
+            if (!response.ok || video !== currentVideo) return;
+            applyProxyStatus(await response.json());
+        } catch (error) {
+            console.error('Error loading proxy status:', error);
+        }
+    }
+
+    function applyProxyStatus(status) {
+        proxyStatus = status;
+        if (status.status === 'ready') {
+            const { width, height } = status.thumbnails;
+            sliderPreview.style.width = `${width}px`;
+            sliderPreview.style.height = `${height}px`;
+            sliderPreview.style.backgroundImage = `url("/thumbnails?${videoParams()}")`;
+        }
+    }
+
+    function watchProxy(filename, isSessionFile) {
+        // Shows the progress of a proxy created after upload until it is ready.
+        clearInterval(proxyPollId);
+        const params = new URLSearchParams({ video_filename: filename, is_session_file: isSessionFile });
+        proxyPollId = setInterval(async () => {
+            try {
+                const response = await fetch(`/proxy?${params}`);
+                const status = await response.json();
+                if (!response.ok) throw new Error(status.message);
+                const isCurrent = filename === currentVideo && isSessionFile === isCurrentVideoSessionFile;
+                if (status.status === 'queued' || status.status === 'running') {
+                    proxyStatusDisplay.textContent = `Preparing scrubbing preview: ${Math.round(status.progress * 100)}%`;
+                    return;
+                }
+                clearInterval(proxyPollId);
+                proxyStatusDisplay.textContent = status.status === 'failed'
+                    ? `Scrubbing preview unavailable: ${status.error}` : '';
+                if (isCurrent) applyProxyStatus(status);
+            } catch (error) {
+                clearInterval(proxyPollId);
+                proxyStatusDisplay.textContent = '';
+                console.error('Error polling proxy status:', error);
+            }
+        }, PROXY_POLL_MS);
+    }
+
+    function proxyReady() {
+        return proxyStatus !== null && proxyStatus.status === 'ready';
+    }
+
+    function showSliderPreview(frameIndex) {
+        if (!proxyReady()) return;
+        const { count, width } = proxyStatus.thumbnails;
+        const fraction = totalFrames > 1 ? frameIndex / (totalFrames - 1) : 0;
+        const thumbnail = Math.round(fraction * (count - 1));
+        sliderPreview.style.backgroundPosition = `-${thumbnail * width}px 0`;
+        sliderPreview.style.left = `${fraction * frameSlider.clientWidth}px`;
+        sliderPreviewLabel.textContent = frameIndex + 1;
+        sliderPreview.style.display = 'block';
+    }
+
+    async function showPreviewFrame(frameIndex) {
+        // A plain frame from the proxy while the slider is dragged; detection
+        // runs once the slider is released.
+        if (previewInFlight || useClientOverlay()) return;
+        previewInFlight = true;
+        try {
+            const extra = { frame_index: frameIndex };
+            const width = previewWidth();
+            if (width) extra.max_width = width;
+            const response = await fetch(`/preview_frame?${videoParams(extra)}`);
+            if (response.ok && isScrubbing) showFrameImage(await response.blob());
+        } catch (error) {
+            console.error('Error loading preview frame:', error);
+        } finally {
+            previewInFlight = false;
+        }
+    }
+
     // --- Frame Processing ---
 
     async function processFrame(frameIndex, resetTracker = false) {
@@ -94,6 +219,12 @@ document.addEventListener('DOMContentLoaded', () => {
         loadingSpinner.style.display = 'block';
         annotatedFrame.style.opacity = 0.5;
 
+        // In browser-overlay mode the server only runs detection; the frame itself
+        // is decoded by the <video> element while the request is in flight.
+        const clientOverlay = useClientOverlay();
+        const seekPromise = clientOverlay ? seekSourceVideo(frameIndex) : null;
+        if (seekPromise) seekPromise.catch(() => {}); // Awaited below; avoids an unhandled rejection if the fetch fails first
+
         try {
             const response = await fetch('/process_frame', {
                 method: 'POST',
@@ -102,7 +233,11 @@ document.addEventListener('DOMContentLoaded', () => {
                     video_filename: currentVideo,
                     frame_index: frameIndex,
                     reset_tracker: resetTracker,
-                    is_session_file: isCurrentVideoSessionFile // Send the session flag
+                    is_session_file: isCurrentVideoSessionFile, // Send the session flag
+                    response_format: clientOverlay ? 'detections' : 'multipart',
+                    image_format: FRAME_IMAGE_FORMAT,
+                    image_quality: FRAME_IMAGE_QUALITY,
+                    max_width: previewWidth()
                 })
             });
 
@@ -115,9 +250,18 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(`Server returned an error: ${response.status} ${response.statusText}`);
             }
 
-            const data = await response.json();
+            let data;
+            if (clientOverlay) {
+                data = await response.json();
+                await seekPromise;
+            } else {
+                const form = await response.formData();
+                data = JSON.parse(await form.get('metadata').text());
+                if (data.status === 'success') showFrameImage(form.get('frame'));
+            }
             if (data.status === 'success') {
-                annotatedFrame.src = `data:image/jpeg;base64,${data.annotated_frame}`;
+                lastDetections = data.detections;
+                if (clientOverlay) drawOverlay(data.detections);
                 updateDetections(data.detections);
                 updateControls(frameIndex);
             } else {
@@ -133,6 +277,113 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Browser-side Overlay ---
+
+    function useClientOverlay() {
+        return clientOverlayToggle.checked && currentFps > 0;
+    }
+
+    function useProxyVideo() {
+        return proxyReady() && proxyStatus.browser_playable;
+    }
+
+    function videoFileUrl() {
+        return `/video_file?${videoParams(useProxyVideo() ? { proxy: true } : {})}`;
+    }
+
+    function waitForEvent(target, eventName) {
+        return new Promise((resolve, reject) => {
+            const onEvent = () => { cleanup(); resolve(); };
+            const onError = () => { cleanup(); reject(new Error('The browser could not decode this video.')); };
+            const cleanup = () => {
+                target.removeEventListener(eventName, onEvent);
+                target.removeEventListener('error', onError);
+            };
+            target.addEventListener(eventName, onEvent);
+            target.addEventListener('error', onError);
+        });
+    }
+
+    async function seekSourceVideo(frameIndex) {
+        const url = videoFileUrl();
+        if (sourceVideo.dataset.url !== url) {
+            sourceVideo.dataset.url = url;
+            sourceVideo.dataset.sourceWidth = useProxyVideo() ? proxyStatus.source_width : '';
+            sourceVideo.src = url;
+        }
+        if (sourceVideo.readyState < HTMLMediaElement.HAVE_METADATA) {
+            await waitForEvent(sourceVideo, 'loadedmetadata');
+        }
+        // Aim at the middle of the frame so rounding never lands on its neighbour.
+        const seeked = waitForEvent(sourceVideo, 'seeked');
+        sourceVideo.currentTime = (frameIndex + 0.5) / currentFps;
+        await seeked;
+    }
+
+    function drawOverlay(detections) {
+        const ratio = window.devicePixelRatio || 1;
+        overlayCanvas.width = Math.round(sourceVideo.clientWidth * ratio);
+        overlayCanvas.height = Math.round(sourceVideo.clientHeight * ratio);
+        const ctx = overlayCanvas.getContext('2d');
+        ctx.clearRect(0, 0, overlayCanvas.width, overlayCanvas.height);
+        if (!sourceVideo.videoWidth) return;
+
+        // Boxes are in original-video pixels; scale them to the displayed size.
+        // The proxy is smaller than the original, so use the original's width.
+        const scale = overlayCanvas.width / (Number(sourceVideo.dataset.sourceWidth) || sourceVideo.videoWidth);
+        const fontSize = Math.round(13 * ratio);
+        const lineHeight = fontSize + 4;
+        ctx.lineWidth = 2 * ratio;
+        ctx.strokeStyle = 'rgb(0, 0, 255)';
+        ctx.fillStyle = 'rgb(255, 255, 255)';
+        ctx.font = `${fontSize}px sans-serif`;
+        ctx.textBaseline = 'top';
+
+        detections.forEach(det => {
+            const [x1, y1, x2, y2] = det.box.map(v => v * scale);
+            ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+
+            const labelLines = [`ID ${det.tracked_id}: ${det.class} (${det.confidence.toFixed(2)})`];
+            if (det.distance_m != null) labelLines.push(`Dist: ${det.distance_m.toFixed(2)}m`);
+            if (det.visibility_count != null) labelLines.push(`Visible: ${det.visibility_count}`);
+
+            let textY = y1 - lineHeight * labelLines.length - 5;
+            if (textY < 0) textY = y2 + 5;
+            labelLines.forEach((line, i) => ctx.fillText(line, x1, textY + i * lineHeight));
+        });
+    }
+
+    function applyOverlayMode() {
+        const clientOverlay = useClientOverlay();
+        clientOverlayContainer.style.display = clientOverlay ? 'inline-block' : 'none';
+        annotatedFrame.style.display = clientOverlay ? 'none' : '';
+        if (clientOverlay && currentVideo) {
+            // Show the current frame with its last detections without re-running the tracker.
+            seekSourceVideo(currentFrameIndex)
+                .then(() => drawOverlay(lastDetections))
+                .catch(error => console.error('Error showing video overlay:', error));
+        }
+    }
+
+    clientOverlayToggle.addEventListener('change', applyOverlayMode);
+    window.addEventListener('resize', () => {
+        if (useClientOverlay()) drawOverlay(lastDetections);
+    });
+
+    function previewWidth() {
+        // Ask for an image no wider than it is displayed, in device pixels.
+        const container = annotatedFrame.parentElement;
+        const width = Math.round(container.clientWidth * (window.devicePixelRatio || 1));
+        return width >= 16 ? width : null;
+    }
+
+    function showFrameImage(blob) {
+        const previousUrl = frameObjectUrl;
+        frameObjectUrl = URL.createObjectURL(blob);
+        annotatedFrame.src = frameObjectUrl;
+        if (previousUrl) URL.revokeObjectURL(previousUrl);
+    }
+
     function updateControls(frameIndex) {
         frameSlider.value = frameIndex;
         frameInput.value = frameIndex + 1;
@@ -168,24 +419,19 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        const formData = new FormData();
-        formData.append('video', videoFileInput.files[0]);
-
         showUploadStatus('Uploading...', 'info');
 
         try {
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
+            const result = await uploadInChunks(videoFileInput.files[0]);
 
-            const result = await response.json();
-
-            if (response.ok && result.status === 'success') {
+            if (result.status === 'success') {
                 showUploadStatus(result.message, 'success');
                 uploadForm.reset();
                 fetchVideos(); // Refresh the list to show the new video
-                selectVideo(result.filename, result.total_frames, result.is_session_file);
+                selectVideo(result.filename, result.total_frames, result.is_session_file, result.fps);
+                if (result.proxy && (result.proxy.status === 'queued' || result.proxy.status === 'running')) {
+                    watchProxy(result.filename, result.is_session_file);
+                }
             } else {
                 throw new Error(result.message || 'Upload failed. The server responded, but the operation was not successful.');
             }
@@ -194,10 +440,59 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Sends the file in chunks to /uploads. After a network error the upload
+    // continues from the offset the server confirmed, and choosing the same
+    // file again after a reload resumes it as well.
+    async function uploadInChunks(file) {
+        const response = await fetch('/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        const upload = await response.json();
+        if (!response.ok) {
+            throw new Error(upload.message || 'Could not start the upload.');
+        }
+
+        let offset = upload.received_bytes;
+        let retries = 0;
+        while (true) {
+            let result;
+            try {
+                const chunkResponse = await fetch(`/uploads/${upload.upload_id}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(offset, Math.min(offset + upload.chunk_bytes, file.size))
+                });
+                result = await chunkResponse.json();
+                if (!chunkResponse.ok && result.received_bytes === undefined) {
+                    throw new Error(result.message || 'Upload failed.');
+                }
+            } catch (error) {
+                if (++retries > UPLOAD_MAX_RETRIES) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+                const statusResponse = await fetch(`/uploads/${upload.upload_id}`);
+                if (!statusResponse.ok) throw error;
+                offset = (await statusResponse.json()).received_bytes;
+                continue;
+            }
+            if (result.upload_status === 'complete') {
+                return result;
+            }
+            // Also after a refused chunk (wrong offset): continue where the server is.
+            offset = result.received_bytes;
+            retries = 0;
+            showUploadStatus(`Uploading... ${Math.floor(100 * offset / file.size)}%`, 'info');
+        }
+    }
+
+    let uploadStatusTimer = null;
+
     function showUploadStatus(message, type) {
         uploadStatus.textContent = message;
         uploadStatus.className = type;
-        setTimeout(() => {
+        clearTimeout(uploadStatusTimer);
+        uploadStatusTimer = setTimeout(() => {
             uploadStatus.textContent = '';
             uploadStatus.className = '';
         }, 5000);
@@ -232,12 +527,17 @@ document.addEventListener('DOMContentLoaded', () => {
 
     frameSlider.addEventListener('input', (e) => {
         const frameIndex = parseInt(e.target.value, 10);
+        isScrubbing = true;
         updateControls(frameIndex);
         frameInput.value = frameIndex + 1;
+        showSliderPreview(frameIndex);
+        showPreviewFrame(frameIndex);
     });
 
     frameSlider.addEventListener('change', (e) => {
         const frameIndex = parseInt(e.target.value, 10);
+        isScrubbing = false;
+        sliderPreview.style.display = 'none';
         pause();
         processFrame(frameIndex);
     });
@@ -295,7 +595,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     video_filename: currentVideo,
                     // Also tell the analyzer if it's a session file
                     is_session_file: isCurrentVideoSessionFile,
-                    start_frame_index: currentFrameIndex // Send the starting frame
+                    start_frame_index: currentFrameIndex, // Send the starting frame
+                    num_frames: ANALYSIS_NUM_FRAMES
                 })
             });
 
@@ -323,6 +624,93 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // --- Background Analysis Jobs ---
+
+    analyzeFullBtn.addEventListener('click', async () => {
+        if (!currentVideo || analysisJobId) return;
+
+        analyzeFullBtn.disabled = true;
+        analyzeVideoBtn.disabled = true;
+        analysisSpinner.style.display = 'block';
+        analysisProgress.textContent = 'Queued...';
+        analysisResults.innerHTML = '<p>Analyzing the rest of the video in the background.</p>';
+
+        try {
+            const response = await fetch('/analysis_jobs', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    video_filename: currentVideo,
+                    is_session_file: isCurrentVideoSessionFile,
+                    start_frame_index: currentFrameIndex
+                })
+            });
+            const data = await response.json();
+            if (!response.ok || data.status !== 'success') {
+                throw new Error(data.message || 'Could not start analysis');
+            }
+
+            analysisJobId = data.job.job_id;
+            cancelAnalysisBtn.style.display = 'inline-block';
+            analysisEvents = new EventSource(`/analysis_jobs/${analysisJobId}/events`);
+            analysisEvents.addEventListener('progress', (e) => {
+                const job = JSON.parse(e.data);
+                const percent = Math.round(job.progress * 100);
+                analysisProgress.textContent = job.frames_total
+                    ? `${job.frames_done} / ${job.frames_total} frames (${percent}%)`
+                    : 'Starting...';
+            });
+            analysisEvents.addEventListener('done', (e) => {
+                const job = JSON.parse(e.data);
+                if (job.status === 'failed') {
+                    analysisResults.innerHTML = `<p style="color: var(--error-color);">Error: ${job.error}</p>`;
+                } else if (job.result) {
+                    displayAnalysisResults(job.result.analysis);
+                } else {
+                    analysisResults.innerHTML = '<p>Analysis cancelled.</p>';
+                }
+                analysisProgress.textContent = job.status === 'cancelled'
+                    ? `Cancelled after ${job.frames_done} frames.`
+                    : `${job.frames_done} frames analysed.`;
+                finishAnalysisJob();
+            });
+            analysisEvents.onerror = () => {
+                // The browser reconnects on its own; only give up once the stream is closed.
+                if (analysisEvents && analysisEvents.readyState === EventSource.CLOSED) {
+                    analysisProgress.textContent = 'Lost connection to the analysis job.';
+                    finishAnalysisJob();
+                }
+            };
+        } catch (error) {
+            analysisResults.innerHTML = `<p style="color: var(--error-color);">Error: ${error.message}</p>`;
+            analysisProgress.textContent = '';
+            finishAnalysisJob();
+        }
+    });
+
+    cancelAnalysisBtn.addEventListener('click', async () => {
+        if (!analysisJobId) return;
+        cancelAnalysisBtn.disabled = true;
+        try {
+            await fetch(`/analysis_jobs/${analysisJobId}`, { method: 'DELETE' });
+        } catch (error) {
+            console.error('Error cancelling analysis job:', error);
+        }
+    });
+
+    function finishAnalysisJob() {
+        if (analysisEvents) {
+            analysisEvents.close();
+            analysisEvents = null;
+        }
+        analysisJobId = null;
+        analysisSpinner.style.display = 'none';
+        cancelAnalysisBtn.style.display = 'none';
+        cancelAnalysisBtn.disabled = false;
+        analyzeFullBtn.disabled = !currentVideo;
+        analyzeVideoBtn.disabled = !currentVideo;
+    }
+
     function displayAnalysisResults(analysisData) {
         if (!analysisData || Object.keys(analysisData).length === 0) {
             analysisResults.innerHTML = '<p>Analysis complete. No objects were tracked.</p>';
@@ -335,6 +723,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     <tr>
                         <th>Bird Class</th>
                         <th>Total Unique Birds</th>
+                        <th>Detections</th>
                         <th>Longest Track (ID)</th>
                         <th>Longest Track (Frames)</th>
                     </tr>
@@ -348,6 +737,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 <tr>
                     <td>${birdClass.charAt(0).toUpperCase() + birdClass.slice(1)}</td>
                     <td>${data.total_unique_birds}</td>
+                    <td>${data.total_detections}</td>
                     <td>${data.longest_tracking.track_id}</td>
                     <td>${data.longest_tracking.frames}</td>
                 </tr>`;
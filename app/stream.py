@@ -0,0 +1,363 @@
+# stream.py
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+import numpy as np
+
+from detector import (
+    apply_swarm_logic,
+    build_frontend_detections,
+    estimate_distances,
+    new_tracking_state,
+    render_annotated_frame,
+    run_detection_on_frame,
+    update_tracking_state,
+)
+
+# --- Configuration Parameters ---
+STREAM_FRAME_QUEUE_SIZE = 2          # Captured frames waiting for inference; older ones are dropped
+STREAM_RENDER_QUEUE_SIZE = 2         # Tracked frames waiting for annotation; older ones are dropped
+STREAM_LATENCY_WINDOW = 500          # Recent end-to-end latencies kept for percentiles
+STREAM_RECONNECT_DELAY_S = 2.0       # Pause before reopening a live source that stopped delivering
+STREAM_MAX_ACTIVE = 4                # Streams running at the same time
+STREAM_IMAGE_QUALITY = 80            # JPEG quality of published frames
+STREAM_MAX_WIDTH = 1280              # Published frames are downscaled to this width
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO that never blocks the producer: when it is full, the oldest
+    item is discarded so consumers always work on the most recent frames.
+    """
+
+    def __init__(self, maxsize):
+        self._items = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """Adds item, dropping the oldest one if full. Returns the dropped item or None."""
+        with self._cond:
+            dropped = None
+            if len(self._items) >= self._maxsize:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest item; None on timeout or once closed and empty."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            return self._items.popleft() if self._items else None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        """Wakes up consumers; get() returns None once the queue is drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamResult:
+    """The outcome of one processed frame, as published to viewers."""
+    __slots__ = ('sequence', 'frame_index', 'captured_at', 'published_at', 'detections', 'image')
+
+    def __init__(self, sequence, frame_index, captured_at, published_at, detections, image):
+        self.sequence = sequence
+        self.frame_index = frame_index
+        self.captured_at = captured_at
+        self.published_at = published_at
+        self.detections = detections
+        self.image = image
+
+    def metadata(self):
+        return {
+            'sequence': self.sequence,
+            'frame_index': self.frame_index,
+            'latency_ms': (self.published_at - self.captured_at) * 1000,
+            'detections': self.detections,
+        }
+
+
+class LiveStream:
+    """
+    Runs the detect -> swarm filter -> track -> distance pipeline on a live
+    source (camera URL, device or a file replayed at its own frame rate) as a
+    chain of threads connected by drop-oldest queues:
+
+        capture -> [frames] -> inference + tracking -> [tracked] -> annotate + encode -> latest
+
+    When inference falls behind, the capture thread keeps going and the oldest
+    queued frames are dropped, so latency stays bounded. Tracking uses capture
+    indices, so dropped frames count towards the look-back window. Viewers read
+    only the most recent result.
+    """
+
+    def __init__(self, source, model, average_wingspans_m, realtime=False, loop=False, render=True,
+                 frame_queue_size=STREAM_FRAME_QUEUE_SIZE, render_queue_size=STREAM_RENDER_QUEUE_SIZE,
+                 motion_gate=None):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.model = model
+        self.average_wingspans_m = average_wingspans_m
+        self.realtime = realtime      # Pace a file source at its fps, as a camera would deliver it
+        self.loop = loop              # Restart a file source at its end
+        self.render = render          # Annotate and encode published frames
+        self.motion_gate = motion_gate  # Optional motion.MotionGate for static scenes
+        # Camera devices and network URLs are reconnected when they stop; files end.
+        self.live = str(source).isdigit() or '://' in str(source)
+        self.started_at = None
+        self.error = None
+        self._frames = DropOldestQueue(frame_queue_size)
+        self._tracked = DropOldestQueue(render_queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+        self._latest = None
+        self._latest_cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=STREAM_LATENCY_WINDOW)
+        self._counters = {'captured': 0, 'processed': 0, 'published': 0, 'reconnects': 0}
+        self._tracking_state = new_tracking_state()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Starts the pipeline threads."""
+        self.started_at = time.time()
+        for name, target in (('capture', self._capture_loop), ('infer', self._infer_loop),
+                             ('publish', self._publish_loop)):
+            thread = threading.Thread(target=target, name=f'stream-{name}-{self.id[:8]}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stops capturing and waits for the queued frames to drain."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._latest_cond:
+            self._latest_cond.notify_all()
+
+    def join(self, timeout=None):
+        """Waits until a finite source has been fully processed."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _open(self):
+        # A digit-only source is a local camera device index.
+        source = int(self.source) if str(self.source).isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _capture_loop(self):
+        frame_index = 0
+        try:
+            while not self._stop.is_set():
+                cap = self._open()
+                if cap is None:
+                    if not self.live:
+                        self.error = f"Could not open stream source {self.source}."
+                        return
+                    self._count('reconnects')
+                    self._stop.wait(STREAM_RECONNECT_DELAY_S)
+                    continue
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                interval = 1.0 / fps if self.realtime and fps and fps > 0 else 0.0
+                next_due = time.monotonic()
+                try:
+                    while not self._stop.is_set():
+                        if interval:
+                            # Replay at the source frame rate; a slow pipeline never slows capture down.
+                            next_due += interval
+                            delay = next_due - time.monotonic()
+                            if delay > 0:
+                                time.sleep(delay)
+                        ret, frame = cap.read()
+                        if not ret:
+                            break
+                        self._frames.put((frame_index, time.monotonic(), frame))
+                        self._count('captured')
+                        frame_index += 1
+                finally:
+                    cap.release()
+                if self.live:
+                    # A camera or network feed that stopped delivering is reopened.
+                    self._count('reconnects')
+                    self._stop.wait(STREAM_RECONNECT_DELAY_S)
+                elif not self.loop:
+                    return
+        finally:
+            self._frames.close()
+
+    def _infer_loop(self):
+        processed = 0
+        try:
+            while True:
+                item = self._frames.get()
+                if item is None:
+                    return
+                frame_index, captured_at, frame = item
+                if self.motion_gate is not None:
+                    # Processed frames are consecutive for the gate even when some were dropped.
+                    raw_detections, _ = self.motion_gate.detect(frame, processed, self.model)
+                else:
+                    raw_detections = run_detection_on_frame(frame, self.model)
+                processed += 1
+                detections_for_tracking = apply_swarm_logic(raw_detections)
+                detections_for_annotation = update_tracking_state(detections_for_tracking, self._tracking_state,
+                                                                  frame_index)
+                estimate_distances(detections_for_annotation, self.average_wingspans_m)
+                self._count('processed')
+                self._tracked.put((frame_index, captured_at, frame, detections_for_annotation))
+        except Exception as e:
+            self.error = f"Stream inference failed: {e}"
+            print(f"Error in stream {self.id}: {e}")
+        finally:
+            self._tracked.close()
+
+    def _publish_loop(self):
+        try:
+            self._publish_results()
+        finally:
+            # Wake up viewers waiting for a result that will never come.
+            with self._latest_cond:
+                self._latest_cond.notify_all()
+
+    def _publish_results(self):
+        sequence = 0
+        while True:
+            item = self._tracked.get()
+            if item is None:
+                return
+            frame_index, captured_at, frame, detections_for_annotation = item
+            image = None
+            if self.render:
+                image = render_annotated_frame(frame, detections_for_annotation, 'jpeg', STREAM_IMAGE_QUALITY,
+                                               STREAM_MAX_WIDTH)
+            sequence += 1
+            published_at = time.monotonic()
+            result = StreamResult(sequence, frame_index, captured_at, published_at,
+                                  build_frontend_detections(detections_for_annotation), image)
+            with self._lock:
+                self._counters['published'] += 1
+                self._latencies.append(published_at - captured_at)
+            with self._latest_cond:
+                self._latest = result
+                self._latest_cond.notify_all()
+
+    def latest(self, after_sequence=None, timeout=None):
+        """
+        Returns the most recent StreamResult. With after_sequence, waits up to
+        timeout for a newer one. Returns None if nothing newer was published.
+        """
+        with self._latest_cond:
+            if after_sequence is not None:
+                self._latest_cond.wait_for(
+                    lambda: (self._latest is not None and self._latest.sequence > after_sequence) or
+                                    self._stop.is_set() or not self._threads[-1].is_alive(),
+                    timeout
+                )
+                if self._latest is None or self._latest.sequence <= after_sequence:
+                    return None
+            return self._latest
+
+    def stats(self):
+        """Returns frame counters, drop rate and end-to-end latency percentiles."""
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = np.array(self._latencies) * 1000
+        dropped = self._frames.dropped + self._tracked.dropped
+        stats.update({
+            'stream_id': self.id,
+            'running': self.running,
+            'error': self.error,
+            'dropped_before_inference': self._frames.dropped,
+            'dropped_before_publish': self._tracked.dropped,
+            'frame_queue_depth': len(self._frames),
+            'render_queue_depth': len(self._tracked),
+            'drop_rate': dropped / stats['captured'] if stats['captured'] else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'latency_ms_max': float(latencies.max()) if len(latencies) else None,
+        })
+        if self.motion_gate is not None:
+            stats['motion_gate'] = self.motion_gate.stats()
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        stats['published_fps'] = stats['published'] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+
+class StreamRegistry:
+    """The live streams of this process, each owned by the session that started it."""
+
+    def __init__(self, max_active=STREAM_MAX_ACTIVE):
+        self.max_active = max_active
+        self._streams = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def start(self, owner, stream):
+        """Starts and registers stream. Returns None if too many streams are running."""
+        with self._lock:
+            for stream_id in [i for i, s in self._streams.items() if not s.running]:
+                del self._streams[stream_id]
+                del self._owners[stream_id]
+            if len(self._streams) >= self.max_active:
+                return None
+            self._streams[stream.id] = stream
+            self._owners[stream.id] = owner
+        return stream.start()
+
+    def get(self, stream_id, owner=None):
+        """Returns the stream, or None if it does not exist or belongs to another owner."""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None or (owner is not None and self._owners[stream_id] != owner):
+                return None
+            return stream
+
+    def stats(self):
+        """Returns the number of running streams and their summed queue depths and counters."""
+        with self._lock:
+            streams = [stream for stream in self._streams.values() if stream.running]
+        stats = {'active': len(streams), 'frame_queue_depth': 0, 'render_queue_depth': 0, 'captured': 0,
+                 'published': 0, 'dropped': 0}
+        for stream in streams:
+            stream_stats = stream.stats()
+            stats['frame_queue_depth'] += stream_stats['frame_queue_depth']
+            stats['render_queue_depth'] += stream_stats['render_queue_depth']
+            stats['captured'] += stream_stats['captured']
+            stats['published'] += stream_stats['published']
+            stats['dropped'] += stream_stats['dropped_before_inference'] + stream_stats['dropped_before_publish']
+        return stats
+
+    def stop(self, stream_id, owner=None):
+        """Stops and forgets a stream. Returns it, or None if not found."""
+        stream = self.get(stream_id, owner)
+        if stream is None:
+            return None
+        stream.stop()
+        with self._lock:
+            self._streams.pop(stream_id, None)
+            self._owners.pop(stream_id, None)
+        return stream
@@ -0,0 +1,462 @@
+# tracker.py
+import numpy as np
+
+from detections import Detections
+
+# Matching strategies:
+#   'compat'    - reproduces the original per-detection greedy loop exactly (same IDs),
+#                 including its quirk that several detections may claim the same track.
+#   'greedy'    - one-to-one matching, highest IoU pairs first.
+#   'hungarian' - one-to-one matching maximizing total IoU (uses `lap`).
+MATCHING_MODES = ('compat', 'greedy', 'hungarian')
+
+# Weight of the newest measurement in the smoothed per-track box velocity.
+VELOCITY_SMOOTHING = 0.5
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Computes the IoU of every box in boxes_a (N, 4) against every box in
+    boxes_b (M, 4), both in xyxy format. Returns an (N, M) float64 array.
+    The arithmetic follows calculate_iou so results are bit-identical.
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.maximum(0, np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]))
+    inter_h = np.maximum(0, np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]))
+    inter_area = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union_area = area_a + area_b - inter_area
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(union_area > 0, inter_area / union_area, 0.0)
+    return iou
+
+
+class TrackedDetection:
+    """
+    One tracked object as seen in the current frame. Supports the dict-style
+    access (det['bbox'], det.get('distance_m')) the rest of the pipeline uses.
+    """
+    __slots__ = ('id', 'class_name', 'bbox', 'confidence', 'visibility_count', 'last_visible_frame',
+                 'max_bbox_geometric_mean', 'is_visible', 'distance_m')
+
+    _KEY_TO_ATTR = {'class': 'class_name'}
+
+    def __init__(self, id, class_name, bbox, confidence, visibility_count, last_visible_frame,
+                 max_bbox_geometric_mean, is_visible=True, distance_m=None):
+        self.id = id
+        self.class_name = class_name
+        self.bbox = bbox
+        self.confidence = confidence
+        self.visibility_count = visibility_count
+        self.last_visible_frame = last_visible_frame
+        self.max_bbox_geometric_mean = max_bbox_geometric_mean
+        self.is_visible = is_visible
+        self.distance_m = distance_m
+
+    def _attr(self, key):
+        attr = self._KEY_TO_ATTR.get(key, key)
+        if attr not in self.__slots__:
+            raise KeyError(key)
+        return attr
+
+    def __getitem__(self, key):
+        return getattr(self, self._attr(key))
+
+    def __setitem__(self, key, value):
+        setattr(self, self._attr(key), value)
+
+    def __contains__(self, key):
+        return self._KEY_TO_ATTR.get(key, key) in self.__slots__
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+
+class TrackedFrame:
+    """
+    The tracked detections of one frame as columns copied from the tracker's
+    arrays. It is a sequence of TrackedDetection for code that reads them one
+    by one (e.g. drawing), but those are only built when first indexed or
+    iterated; distance estimation and the frontend list work on the columns.
+    """
+    __slots__ = ('ids', 'boxes', 'class_codes', 'class_table', 'confidence', 'visibility', 'last_visible',
+                 'max_gm', 'visible', 'distance', '_records')
+
+    def __init__(self, ids, boxes, class_codes, class_table, confidence, visibility, last_visible, max_gm, visible):
+        self.ids = ids
+        self.boxes = boxes
+        self.class_codes = class_codes
+        self.class_table = class_table  # Class name of every code
+        self.confidence = confidence
+        self.visibility = visibility
+        self.last_visible = last_visible
+        self.max_gm = max_gm
+        self.visible = visible
+        self.distance = np.full(len(ids), np.nan)  # NaN where no distance is estimated
+        self._records = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self._build_records())
+
+    def __getitem__(self, index):
+        return self._build_records()[index]
+
+    def class_name_list(self):
+        """The class name of every tracked detection."""
+        return [self.class_table[code] for code in self.class_codes.tolist()]
+
+    def distance_list(self):
+        """The distance of every tracked detection, None where it was not estimated."""
+        return [None if distance != distance else distance for distance in self.distance.tolist()]
+
+    def set_distances(self, distance):
+        """Sets the distance column (NaN for no estimate), also on records already built."""
+        self.distance = distance
+        if self._records is not None:
+            for record, distance_m in zip(self._records, self.distance_list()):
+                record.distance_m = distance_m
+
+    def _build_records(self):
+        if self._records is None:
+            self._records = [
+                TrackedDetection(*columns) for columns in zip(
+                    self.ids.tolist(), self.class_name_list(), self.boxes.tolist(), self.confidence.tolist(),
+                    self.visibility.tolist(), self.last_visible.tolist(), self.max_gm.tolist(),
+                    self.visible.tolist(), self.distance_list())
+            ]
+        return self._records
+
+
+class Tracker:
+    """
+    IoU tracker that stores its active tracks as a struct of NumPy arrays
+    (ids, boxes, classes, visibility, sizes, and a fixed-size ring buffer of
+    recent box sizes), so a frame's detections are scored against all tracks
+    with one vectorized IoU matrix. Snapshots share the arrays and copy them
+    only when either side is next updated. Every track also keeps the box of
+    its last detection and a smoothed constant-velocity estimate, so predict()
+    can carry tracks through frames that were not sent to the model.
+    """
+
+    _ARRAYS = ('_ids', '_boxes', '_classes', '_last_visible', '_visibility', '_confidence',
+               '_max_gm', '_visible', '_history', '_history_count', '_anchor', '_velocity', '_last_detected')
+
+    def __init__(self, iou_threshold, frames_to_look_back, matching='compat', history_length=30):
+        if matching not in MATCHING_MODES:
+            raise ValueError(f"Unknown tracker matching mode: {matching}")
+        self.iou_threshold = iou_threshold
+        self.frames_to_look_back = frames_to_look_back
+        self.matching = matching
+        self.history_length = history_length
+        self._class_names = []
+        self._class_codes = {}
+        # Rows are kept in ascending track ID order, which is also the order the
+        # original dict iterated in, so ties are broken the same way.
+        self._ids = np.empty(0, dtype=np.int64)
+        self._boxes = np.empty((0, 4), dtype=np.float64)
+        self._classes = np.empty(0, dtype=np.int32)
+        self._last_visible = np.empty(0, dtype=np.int64)
+        self._visibility = np.empty(0, dtype=np.int64)
+        self._confidence = np.empty(0, dtype=np.float64)
+        self._max_gm = np.empty(0, dtype=np.float64)
+        self._visible = np.empty(0, dtype=bool)
+        self._history = np.empty((0, history_length), dtype=np.float32)
+        self._history_count = np.empty(0, dtype=np.int64)
+        self._anchor = np.empty((0, 4), dtype=np.float64)      # Box of the last detection
+        self._velocity = np.empty((0, 4), dtype=np.float64)    # Box change per frame
+        self._last_detected = np.empty(0, dtype=np.int64)
+        self._shared = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, track_id):
+        return bool(np.any(self._ids == track_id))
+
+    def track_ids(self):
+        """Returns the IDs of all active tracks, ascending."""
+        return [int(track_id) for track_id in self._ids]
+
+    def snapshot(self):
+        """
+        Returns an independent copy of the tracking state. The arrays are shared
+        until either tracker is updated, so taking a snapshot is O(1).
+        """
+        clone = Tracker.__new__(Tracker)
+        clone.__dict__.update(self.__dict__)
+        clone._class_names = list(self._class_names)
+        clone._class_codes = dict(self._class_codes)
+        clone._shared = True
+        self._shared = True
+        return clone
+
+    def state_dict(self):
+        """The complete tracking state as a dict of NumPy arrays, e.g. for np.savez."""
+        state = {name.lstrip('_'): getattr(self, name) for name in self._ARRAYS}
+        state['class_names'] = np.array(self._class_names, dtype=str)
+        state['params'] = np.array([self.iou_threshold, self.frames_to_look_back, self.history_length],
+                                   dtype=np.float64)
+        state['matching'] = np.array(self.matching)
+        return state
+
+    @classmethod
+    def from_state_dict(cls, state):
+        """Rebuilds a Tracker from state_dict() output."""
+        iou_threshold, frames_to_look_back, history_length = state['params'].tolist()
+        tracker = cls(iou_threshold, int(frames_to_look_back), matching=str(state['matching']),
+                      history_length=int(history_length))
+        for name in cls._ARRAYS:
+            setattr(tracker, name, np.array(state[name.lstrip('_')]))
+        tracker._class_names = [str(name) for name in state['class_names']]
+        tracker._class_codes = {name: code for code, name in enumerate(tracker._class_names)}
+        return tracker
+
+    def _ensure_owned(self):
+        """Copies shared arrays before the first in-place write after a snapshot."""
+        if self._shared:
+            for name in self._ARRAYS:
+                setattr(self, name, getattr(self, name).copy())
+            self._shared = False
+
+    def memory_bytes(self):
+        """Approximate memory held by the track arrays."""
+        return sum(getattr(self, name).nbytes for name in self._ARRAYS)
+
+    def size_history(self, track_id):
+        """Returns the most recent box sizes of a track, oldest first."""
+        rows = np.nonzero(self._ids == track_id)[0]
+        if not len(rows):
+            return []
+        row = rows[0]
+        count = int(self._history_count[row])
+        length = min(count, self.history_length)
+        positions = [(count - length + k) % self.history_length for k in range(length)]
+        return [float(v) for v in self._history[row, positions]]
+
+    def _class_code(self, class_name):
+        code = self._class_codes.get(class_name)
+        if code is None:
+            code = len(self._class_names)
+            self._class_codes[class_name] = code
+            self._class_names.append(class_name)
+        return code
+
+    def _candidate_mask(self, det_classes, frame_index):
+        """(N, M) mask of detection/track pairs with equal class and a recent enough track."""
+        recent = self._last_visible >= frame_index - self.frames_to_look_back
+        return (det_classes[:, None] == self._classes[None, :]) & recent[None, :]
+
+    def _match_compat(self, det_boxes, det_classes, frame_index):
+        """Replicates the original loop: each detection, in order, takes its best track."""
+        ious = iou_matrix(det_boxes, self._boxes)
+        candidates = self._candidate_mask(det_classes, frame_index)
+        # A track matched earlier in this frame already carries that detection's box,
+        # so later detections are scored against it through the detection-pair IoUs.
+        det_ious = iou_matrix(det_boxes, det_boxes)
+        source = np.full(len(self._ids), -1, dtype=np.int64)
+        any_moved = False
+        matches = []
+        for i in range(len(det_boxes)):
+            row = ious[i]
+            if any_moved:
+                row = np.where(source >= 0, det_ious[i, source], row)
+            scores = np.where(candidates[i] & (row > self.iou_threshold), row, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] >= 0:
+                matches.append((i, best))
+                source[best] = i
+                any_moved = True
+        return matches
+
+    def _match_greedy(self, det_boxes, det_classes, frame_index):
+        """One-to-one matching that takes the highest-IoU pairs first."""
+        ious = iou_matrix(det_boxes, self._boxes)
+        valid = self._candidate_mask(det_classes, frame_index) & (ious > self.iou_threshold)
+        det_idx, track_idx = np.nonzero(valid)
+        order = np.argsort(-ious[det_idx, track_idx], kind='stable')
+        used_dets = set()
+        used_tracks = set()
+        matches = []
+        for k in order:
+            i, j = int(det_idx[k]), int(track_idx[k])
+            if i in used_dets or j in used_tracks:
+                continue
+            used_dets.add(i)
+            used_tracks.add(j)
+            matches.append((i, j))
+        matches.sort()
+        return matches
+
+    def _match_hungarian(self, det_boxes, det_classes, frame_index):
+        """One-to-one matching maximizing the summed IoU of the matched pairs."""
+        import lap
+
+        ious = iou_matrix(det_boxes, self._boxes)
+        valid = self._candidate_mask(det_classes, frame_index) & (ious > self.iou_threshold)
+        if not valid.any():
+            return []
+        cost = np.where(valid, 1.0 - ious, 1.0 + 1e-6)
+        _, det_to_track, _ = lap.lapjv(cost, extend_cost=True, cost_limit=1.0 - self.iou_threshold)
+        return [(i, int(j)) for i, j in enumerate(det_to_track) if j >= 0 and valid[i, j]]
+
+    def _frame(self, rows):
+        """The per-frame view of the tracks stored at rows, in that order."""
+        return TrackedFrame(self._ids[rows], self._boxes[rows], self._classes[rows], self._class_names,
+                            self._confidence[rows], self._visibility[rows], self._last_visible[rows],
+                            self._max_gm[rows], self._visible[rows])
+
+    def update(self, detections_for_tracking, frame_index):
+        """
+        Matches the frame's detections (Detections, or dicts that carry a
+        'geometric_mean') against the active tracks, creates new tracks, drops stale ones, and
+        returns the tracked detections visible in this frame as a TrackedFrame.
+        """
+        self._ensure_owned()
+        num_dets = len(detections_for_tracking)
+        if isinstance(detections_for_tracking, Detections):
+            det_boxes = detections_for_tracking.boxes
+            # Class codes are assigned to the classes present only, in class ID order.
+            class_lookup = np.zeros(len(detections_for_tracking.names), dtype=np.int32)
+            present = np.bincount(detections_for_tracking.class_ids, minlength=len(class_lookup))
+            for class_id in np.nonzero(present)[0].tolist():
+                class_lookup[class_id] = self._class_code(detections_for_tracking.names[class_id])
+            det_classes = class_lookup[detections_for_tracking.class_ids]
+            det_conf = detections_for_tracking.confidence
+            det_gm = detections_for_tracking.geometric_mean
+        else:
+            det_boxes = np.array([det['bbox'] for det in detections_for_tracking],
+                                 dtype=np.float64).reshape(num_dets, 4)
+            det_classes = np.array([self._class_code(det['class']) for det in detections_for_tracking],
+                                   dtype=np.int32)
+            det_conf = np.array([det['confidence'] for det in detections_for_tracking], dtype=np.float64)
+            det_gm = np.array([det['geometric_mean'] for det in detections_for_tracking], dtype=np.float64)
+
+        if num_dets and len(self._ids):
+            if self.matching == 'hungarian':
+                matches = self._match_hungarian(det_boxes, det_classes, frame_index)
+            elif self.matching == 'greedy':
+                matches = self._match_greedy(det_boxes, det_classes, frame_index)
+            else:
+                matches = self._match_compat(det_boxes, det_classes, frame_index)
+        else:
+            matches = []
+
+        # Rows updated this frame, in the order they were first touched.
+        updated_rows = {}
+        matched = np.zeros(num_dets, dtype=bool)
+
+        # Matches are applied one after another; in compat mode the same track can
+        # be matched twice and the second match then sees the first one's update.
+        for i, row in matches:
+            matched[i] = True
+            updated_rows.setdefault(row, None)
+            if self._last_visible[row] == frame_index - 1:
+                self._visibility[row] += 1
+            else:
+                self._visibility[row] = 1
+            gap = frame_index - self._last_detected[row]
+            if gap > 0:
+                measured = (det_boxes[i] - self._anchor[row]) / gap
+                self._velocity[row] = VELOCITY_SMOOTHING * measured + (1 - VELOCITY_SMOOTHING) * self._velocity[row]
+            self._anchor[row] = det_boxes[i]
+            self._last_detected[row] = frame_index
+            self._boxes[row] = det_boxes[i]
+            self._confidence[row] = det_conf[i]
+            self._last_visible[row] = frame_index
+            self._visible[row] = True
+            self._max_gm[row] = max(self._max_gm[row], det_gm[i])
+            self._history[row, self._history_count[row] % self.history_length] = det_gm[i]
+            self._history_count[row] += 1
+
+        # Tracks that were not matched are no longer visible.
+        not_updated = np.ones(len(self._ids), dtype=bool)
+        not_updated[list(updated_rows)] = False
+        self._visible[not_updated] = False
+
+        # Add new detections
+        new_rows = np.nonzero(~matched)[0]
+        first_new_row = len(self._ids)
+        if len(new_rows):
+            next_id = int(self._ids.max()) + 1 if len(self._ids) else 1
+            count = len(new_rows)
+            history = np.zeros((count, self.history_length), dtype=np.float32)
+            history[:, 0] = det_gm[new_rows]
+            self._ids = np.concatenate([self._ids, np.arange(next_id, next_id + count, dtype=np.int64)])
+            self._boxes = np.concatenate([self._boxes, det_boxes[new_rows]])
+            self._classes = np.concatenate([self._classes, det_classes[new_rows]])
+            self._last_visible = np.concatenate([self._last_visible, np.full(count, frame_index, dtype=np.int64)])
+            self._visibility = np.concatenate([self._visibility, np.ones(count, dtype=np.int64)])
+            self._confidence = np.concatenate([self._confidence, det_conf[new_rows]])
+            self._max_gm = np.concatenate([self._max_gm, det_gm[new_rows]])
+            self._visible = np.concatenate([self._visible, np.ones(count, dtype=bool)])
+            self._history = np.concatenate([self._history, history])
+            self._history_count = np.concatenate([self._history_count, np.ones(count, dtype=np.int64)])
+            self._anchor = np.concatenate([self._anchor, det_boxes[new_rows]])
+            self._velocity = np.concatenate([self._velocity, np.zeros((count, 4), dtype=np.float64)])
+            self._last_detected = np.concatenate([self._last_detected, np.full(count, frame_index, dtype=np.int64)])
+
+        visible_rows = np.array(list(updated_rows) + list(range(first_new_row, len(self._ids))), dtype=np.int64)
+        detections_for_annotation = self._frame(visible_rows)
+
+        self._drop_stale(frame_index)
+        return detections_for_annotation
+
+    def _drop_stale(self, frame_index):
+        """Removes tracks that have not been seen within the look-back window."""
+        keep = frame_index - self._last_visible <= self.frames_to_look_back
+        if not keep.all():
+            for name in self._ARRAYS:
+                setattr(self, name, getattr(self, name)[keep])
+
+    def predict(self, frame_index):
+        """
+        Advances the tracks that were visible in the last frame to frame_index
+        without detections, moving each box along its constant-velocity
+        estimate from its last detection. Visibility counts keep increasing;
+        confidence, size history and max_bbox_geometric_mean keep their values
+        from real detections. Returns the predicted tracked detections as a
+        TrackedFrame.
+        """
+        self._ensure_owned()
+        rows = np.nonzero(self._visible & (self._last_visible == frame_index - 1))[0]
+        if len(rows):
+            steps = (frame_index - self._last_detected[rows])[:, None]
+            boxes = self._anchor[rows] + self._velocity[rows] * steps
+            # A shrinking box must not collapse or turn inside out.
+            boxes[:, 2] = np.maximum(boxes[:, 2], boxes[:, 0] + 1)
+            boxes[:, 3] = np.maximum(boxes[:, 3], boxes[:, 1] + 1)
+            self._boxes[rows] = boxes
+            self._visibility[rows] += 1
+            self._last_visible[rows] = frame_index
+        not_predicted = np.ones(len(self._ids), dtype=bool)
+        not_predicted[rows] = False
+        self._visible[not_predicted] = False
+
+        detections_for_annotation = self._frame(rows)
+        self._drop_stale(frame_index)
+        return detections_for_annotation
+
+    def max_relative_speed(self):
+        """
+        Largest per-frame movement of a visible track's box center, relative to
+        the box size. 0.0 when nothing is visible.
+        """
+        rows = np.nonzero(self._visible)[0]
+        if not len(rows):
+            return 0.0
+        velocity = self._velocity[rows]
+        center_speed = np.hypot((velocity[:, 0] + velocity[:, 2]) / 2, (velocity[:, 1] + velocity[:, 3]) / 2)
+        boxes = self._anchor[rows]
+        size = np.sqrt(np.maximum(boxes[:, 2] - boxes[:, 0], 1) * np.maximum(boxes[:, 3] - boxes[:, 1], 1))
+        return float((center_speed / size).max())
@@ -0,0 +1,171 @@
+# tracking_store.py
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Configuration Parameters ---
+TRACKING_STORE_MAX_ENTRIES = 256                  # Tracking states kept across all sessions
+TRACKING_STORE_IDLE_TTL_S = 1800.0                # States unused for this long are dropped
+TRACKING_STORE_MAX_BYTES = 256 * 1024 * 1024      # Total tracker memory before LRU eviction
+TRACKING_STORE_ENTRY_OVERHEAD_BYTES = 4096        # Fixed cost charged per state on top of its arrays
+
+
+class _StoreEntry:
+    """A tracking state, the lock serializing requests on it, and its bookkeeping."""
+    __slots__ = ('state', 'motion_gate', 'detection_schedule', 'detect_every', 'next_frame', 'canonical', 'lock',
+                 'last_used', 'nbytes', 'users')
+
+    def __init__(self, state):
+        self.state = state
+        self.motion_gate = None  # Per-viewer motion.MotionGate, if motion gating is used
+        self.detection_schedule = None  # Per-viewer detection_schedule.DetectionSchedule, if detect_every is used
+        self.detect_every = None  # The detect_every setting detection_schedule was created for
+        self.next_frame = 0  # The frame state expects next
+        self.canonical = True  # state is that of every frame from 0 up to next_frame (see checkpoints.py)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.nbytes = 0
+        self.users = 0  # Requests holding or waiting for the lock; such entries are never evicted
+
+
+class TrackingStore:
+    """
+    Tracking states keyed by (session, video), so viewers of the same file
+    never share a tracker. Requests on one key are serialized by a per-key
+    lock while different keys proceed in parallel. States are evicted by
+    LRU, idle TTL and a cap on the total tracker memory.
+    """
+
+    def __init__(self, factory, max_entries=TRACKING_STORE_MAX_ENTRIES, idle_ttl_s=TRACKING_STORE_IDLE_TTL_S,
+                 max_bytes=TRACKING_STORE_MAX_BYTES):
+        self.factory = factory  # Creates an empty tracking state
+        self.max_entries = max_entries
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,               # Request found an existing state
+            'misses': 0,             # A new state had to be created
+            'resets': 0,             # State replaced on request
+            'contended': 0,          # Request had to wait for another request on the same key
+            'evicted_lru': 0,
+            'evicted_ttl': 0,
+            'evicted_memory': 0,
+        }
+
+    @staticmethod
+    def _state_bytes(state):
+        memory_bytes = getattr(state, 'memory_bytes', None)
+        return TRACKING_STORE_ENTRY_OVERHEAD_BYTES + (memory_bytes() if memory_bytes is not None else 0)
+
+    @contextmanager
+    def checkout(self, session_key, video_key, reset=False):
+        """
+        Locks the tracking state of (session_key, video_key) for the duration of
+        the with-block and yields its entry. The caller reads entry.state and may
+        assign an updated state to it. A missing state is created; reset=True
+        replaces it with an empty one.
+        """
+        key = (session_key, video_key)
+        with self._lock:
+            self._expire_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _StoreEntry(self.factory())
+                entry.nbytes = self._state_bytes(entry.state)
+                self._entries[key] = entry
+                self._total_bytes += entry.nbytes
+                self._counters['misses'] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+            entry.users += 1
+
+        if not entry.lock.acquire(blocking=False):
+            self._count('contended')
+            entry.lock.acquire()
+        try:
+            if reset:
+                entry.state = self.factory()
+                entry.motion_gate = None
+                entry.detection_schedule = None
+                entry.next_frame = 0
+                entry.canonical = True
+                self._count('resets')
+            yield entry
+        finally:
+            nbytes = self._state_bytes(entry.state)
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+            with self._lock:
+                entry.users -= 1
+                if self._entries.get(key) is entry:
+                    self._total_bytes += nbytes - entry.nbytes
+                entry.nbytes = nbytes
+                self._evict_locked()
+
+    def snapshot(self, session_key, video_key):
+        """
+        Returns a private copy of the state for (session_key, video_key), or None
+        if there is none. The live state keeps being updated independently.
+        """
+        with self._lock:
+            entry = self._entries.get((session_key, video_key))
+        if entry is None:
+            return None
+        with entry.lock:
+            state = entry.state
+            if hasattr(state, 'snapshot'):
+                return state.snapshot()
+            import copy
+            return copy.deepcopy(state)
+
+    def discard(self, session_key=None, video_key=None):
+        """Drops every state matching the given session and/or video."""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (session_key is None or key[0] == session_key) and (video_key is None or key[1] == video_key)
+            ]
+            for key in keys:
+                self._total_bytes -= self._entries.pop(key).nbytes
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _pop_locked(self, key, reason):
+        self._total_bytes -= self._entries.pop(key).nbytes
+        self._counters[reason] += 1
+
+    def _expire_locked(self):
+        deadline = time.monotonic() - self.idle_ttl_s
+        expired = [key for key, entry in self._entries.items() if not entry.users and entry.last_used < deadline]
+        for key in expired:
+            self._pop_locked(key, 'evicted_ttl')
+
+    def _evict_locked(self):
+        """Drops least recently used idle states until both limits hold. Caller holds self._lock."""
+        for key, entry in list(self._entries.items()):
+            over_entries = len(self._entries) > self.max_entries
+            over_bytes = self._total_bytes > self.max_bytes
+            if not over_entries and not over_bytes:
+                break
+            if entry.users:
+                continue
+            self._pop_locked(key, 'evicted_lru' if over_entries else 'evicted_memory')
+
+    def stats(self):
+        """Returns hit/miss/eviction counters, the number of states and tracks, and their memory."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['tracks'] = sum(len(entry.state) for entry in self._entries.values())
+            stats['bytes'] = self._total_bytes
+            stats['sessions'] = len({key[0] for key in self._entries})
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
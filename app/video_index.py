@@ -0,0 +1,214 @@
+# video_index.py
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# --- Configuration Parameters ---
+KEYFRAME_PROBE_TIMEOUT_S = 300     # ffprobe packet scans longer than this are abandoned
+KEYFRAME_PROBE_WORKERS = 1         # Background ffprobe processes
+
+
+def probe_video(video_path):
+    """Opens a video once and reads its container metadata. Returns a dict or None."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ') if fourcc else None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return {
+            'frame_count': frame_count,
+            'fps': fps,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'codec': codec or None,
+            'duration_s': frame_count / fps if fps > 0 else None,
+        }
+    finally:
+        cap.release()
+
+
+def probe_keyframes(video_path, fps):
+    """
+    Returns the sorted frame indices of the video's keyframes using ffprobe's
+    packet flags (no decoding), or None when ffprobe is unavailable or fails.
+    """
+    if not fps or shutil.which('ffprobe') is None:
+        return None
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True,
+                                timeout=KEYFRAME_PROBE_TIMEOUT_S).stdout
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"Could not probe keyframes of {video_path}: {e}")
+        return None
+
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(int(round(float(pts_time) * fps)))
+    return sorted(keyframes)
+
+
+class VideoIndex:
+    """
+    Persistent video metadata (frame count, fps, resolution, codec, keyframe
+    positions) stored in SQLite. Entries are keyed by path and are only valid
+    for the file's mtime and size, so a changed file is probed again. Keyframe
+    positions are filled in by a background ffprobe scan; a failed scan is
+    stored as an empty list and only retried once the file changes.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS videos ('
+            ' path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,'
+            ' metadata TEXT NOT NULL, keyframes TEXT)'
+        )
+        self._conn.commit()
+        self._memory = {}  # path -> (mtime_ns, size, metadata); avoids SQLite reads on hot paths
+        self._keyframe_executor = ThreadPoolExecutor(max_workers=KEYFRAME_PROBE_WORKERS,
+                                                     thread_name_prefix='keyframe-probe')
+        self._keyframe_pending = set()
+        self._counters = {'hits': 0, 'misses': 0, 'probe_failures': 0, 'keyframe_probe_failures': 0}
+
+    def _lookup_locked(self, video_path, mtime_ns, size):
+        cached = self._memory.get(video_path)
+        if cached is not None and cached[0] == mtime_ns and cached[1] == size:
+            return cached[2]
+        row = self._conn.execute(
+            'SELECT mtime_ns, size, metadata, keyframes FROM videos WHERE path = ?', (video_path,)
+        ).fetchone()
+        if row is None or row[0] != mtime_ns or row[1] != size:
+            return None
+        metadata = json.loads(row[2])
+        metadata['keyframes'] = json.loads(row[3]) if row[3] is not None else None
+        self._memory[video_path] = (mtime_ns, size, metadata)
+        return metadata
+
+    def get(self, video_path, probe=True):
+        """
+        Returns the metadata dict for video_path. On a miss (new or changed file)
+        the video is probed and stored, unless probe is False. Returns None if
+        the file is missing or cannot be opened.
+        """
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        with self._lock:
+            metadata = self._lookup_locked(video_path, stat.st_mtime_ns, stat.st_size)
+            self._counters['hits' if metadata is not None else 'misses'] += 1
+        if metadata is not None:
+            if metadata.get('keyframes') is None:
+                self._schedule_keyframes(video_path, stat, metadata)
+            return metadata
+        if not probe:
+            return None
+
+        metadata = probe_video(video_path)
+        if metadata is None:
+            with self._lock:
+                self._counters['probe_failures'] += 1
+            return None
+        metadata['keyframes'] = None
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO videos (path, mtime_ns, size, metadata, keyframes) VALUES (?, ?, ?, ?, NULL)',
+                (video_path, stat.st_mtime_ns, stat.st_size,
+                 json.dumps({k: v for k, v in metadata.items() if k != 'keyframes'}))
+            )
+            self._conn.commit()
+            self._memory[video_path] = (stat.st_mtime_ns, stat.st_size, metadata)
+        self._schedule_keyframes(video_path, stat, metadata)
+        return metadata
+
+    def put(self, video_path, metadata):
+        """
+        Stores metadata probed elsewhere (e.g. while the file was still being
+        uploaded) for the current version of video_path, so get() does not
+        open the file again. Returns the stored metadata, or None if the file is missing.
+        """
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        metadata = {k: v for k, v in metadata.items() if k != 'keyframes'}
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO videos (path, mtime_ns, size, metadata, keyframes) VALUES (?, ?, ?, ?, NULL)',
+                (video_path, stat.st_mtime_ns, stat.st_size, json.dumps(metadata))
+            )
+            self._conn.commit()
+            metadata['keyframes'] = None
+            self._memory[video_path] = (stat.st_mtime_ns, stat.st_size, metadata)
+        self._schedule_keyframes(video_path, stat, metadata)
+        return metadata
+
+    def keyframes(self, video_path):
+        """Returns the cached keyframe indices of a video, or None if not known (yet)."""
+        cached = self._memory.get(video_path)
+        return cached[2].get('keyframes') if cached is not None else None
+
+    def _schedule_keyframes(self, video_path, stat, metadata):
+        if shutil.which('ffprobe') is None:
+            return
+        with self._lock:
+            if video_path in self._keyframe_pending:
+                return
+            self._keyframe_pending.add(video_path)
+        self._keyframe_executor.submit(self._probe_keyframes, video_path, stat.st_mtime_ns, stat.st_size,
+                                       metadata.get('fps'))
+
+    def _probe_keyframes(self, video_path, mtime_ns, size, fps):
+        try:
+            keyframes = probe_keyframes(video_path, fps)
+            with self._lock:
+                if keyframes is None:
+                    # Store the failure as an empty list so listings do not scan the file again;
+                    # seeking then falls back to sequential decoding. A changed file is re-probed.
+                    self._counters['keyframe_probe_failures'] += 1
+                    keyframes = []
+                # Only store the result if the file did not change while it was scanned.
+                cursor = self._conn.execute(
+                    'UPDATE videos SET keyframes = ? WHERE path = ? AND mtime_ns = ? AND size = ?',
+                    (json.dumps(keyframes), video_path, mtime_ns, size)
+                )
+                self._conn.commit()
+                cached = self._memory.get(video_path)
+                if cursor.rowcount and cached is not None and cached[0] == mtime_ns and cached[1] == size:
+                    cached[2]['keyframes'] = keyframes
+        finally:
+            with self._lock:
+                self._keyframe_pending.discard(video_path)
+
+    def invalidate(self, video_path):
+        """Forgets a video, e.g. after it was deleted or replaced."""
+        with self._lock:
+            self._memory.pop(video_path, None)
+            self._conn.execute('DELETE FROM videos WHERE path = ?', (video_path,))
+            self._conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the number of indexed videos."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['indexed_videos'] = self._conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+        return stats